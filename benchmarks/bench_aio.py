@@ -0,0 +1,64 @@
+'''connections per second of GIF uploads parsed with asyncio
+
+a local server parses every connection with `areadfrom` while
+clients upload the same synthetic GIF concurrently. run from the
+repository root::
+
+    python -m benchmarks.bench_aio --connections 2000 --concurrency 200
+'''
+
+import argparse
+import asyncio
+import time
+
+from formats.streams import areadfrom
+from giraffes.gif import GIF
+
+from benchmarks.corpus import gif
+
+
+async def serve(reader, writer):
+    await areadfrom(GIF(), reader)
+    writer.write(b'\x01')
+    await writer.drain()
+    writer.close()
+
+
+async def upload(host, port, data):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(data)
+    await writer.drain()
+    await reader.readexactly(1)
+    writer.close()
+
+
+async def main(connections, concurrency, frames):
+    data = gif(frames=frames)
+    server = await asyncio.start_server(serve, '127.0.0.1', 0)
+    host, port = server.sockets[0].getsockname()[:2]
+
+    sem = asyncio.Semaphore(concurrency)
+    async def client():
+        async with sem:
+            await upload(host, port, data)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+
+    server.close()
+    await server.wait_closed()
+
+    print(f'{connections} connections of {len(data)} bytes, '
+          f'{concurrency} at a time')
+    print(f'{connections / elapsed:.0f} connections/s, '
+          f'{connections * len(data) / elapsed / 1e6:.1f} MB/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--frames', type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.connections, args.concurrency, args.frames))
@@ -0,0 +1,78 @@
+'''the ctypes and struct backends of structclasses
+
+reads, accesses and writes records of the fixed-size gif headers
+with both backends and reports records per second. the struct
+classes are made from the annotations of the ones of `giraffes.gif`.
+run from the repository root::
+
+    python -m benchmarks.bench_backends --count 100000
+'''
+
+import argparse
+
+from formats.structclasses import (structclass, readfrom, writeinto,
+                                   iter_records, sizeof)
+from giraffes.gif import (LogicalScreenDescriptor, ImageDescriptor,
+                          GraphicsControlExtension, ColorTableEntry)
+
+from benchmarks.corpus import records
+from benchmarks.timing import measure
+
+
+def struct_backend(cls):
+    # the same fields with the struct backend
+    plain = type(cls.__name__, (), {
+        '__annotations__': dict(cls.__annotations__),
+        '__module__': cls.__module__,
+    })
+    return structclass(plain, byteorder='<', backend='struct')
+
+
+def read(cls, buf, count, size):
+    record = cls()
+    for offset in range(0, size * count, size):
+        readfrom(record, buf, offset)
+
+
+def access(seq, fields):
+    for record in seq:
+        for field in fields:
+            getattr(record, field)
+
+
+def write(seq, buf):
+    offset = 0
+    for record in seq:
+        offset += writeinto(record, buf, offset)
+
+
+def main(count, repeat):
+    for cls in (LogicalScreenDescriptor, ImageDescriptor,
+                GraphicsControlExtension, ColorTableEntry):
+        buf = records(cls, count)
+        out = bytearray(len(buf))
+        fields = list(cls.__annotations__)
+        print(f'{count} {cls.__name__}')
+
+        for name, atype in [('ctypes', cls), ('struct', struct_backend(cls))]:
+            seq = list(iter_records(atype, buf))
+            cases = [
+                ('readfrom', read, atype, buf, count, sizeof(cls)),
+                ('iter_records', lambda: list(iter_records(atype, buf))),
+                ('fields', access, seq, fields),
+                ('writeinto', write, seq, out),
+            ]
+            results = []
+            for case, func, *args in cases:
+                elapsed = measure(func, *args, repeat=repeat)
+                results.append(f'{case} {count / elapsed / 1e6:6.2f}')
+            assert out == buf
+            print(f'    {name:>6}: {", ".join(results)} M records/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    main(args.count, args.repeat)
@@ -0,0 +1,48 @@
+'''scaling of `decode_frames` with the number of processes
+
+decodes every frame of a synthetic animation (see
+`benchmarks.corpus.animation`) with pools of 1 to N processes and
+reports frames per second and the speedup over decoding in a single
+process. run from the repository root::
+
+    python -m benchmarks.bench_frames --frames 64 --workers 8
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import os
+
+from formats.blockclasses import readfrom
+from giraffes.frames import decode_frames
+from giraffes.gif import GIF
+
+from benchmarks.corpus import animation
+from benchmarks.timing import measure
+
+
+def main(frames, size, workers, repeat):
+    gif = GIF()
+    readfrom(gif, animation(frames=frames, width=size, height=size))
+
+    serial = measure(decode_frames, gif, repeat=repeat, workers=1)
+    print(f'{frames} frames of {size}x{size}')
+    print(f'{"serial":>10}: {frames / serial:8.1f} frames/s')
+
+    for count in range(1, workers + 1):
+        # started and warmed up outside of the measure
+        with ProcessPoolExecutor(count) as executor:
+            decode_frames(gif, executor, workers=count)
+            elapsed = measure(decode_frames, gif, executor,
+                              repeat=repeat, workers=count)
+        print(f'{count:>4} procs: {frames / elapsed:8.1f} frames/s, '
+              f'x{serial / elapsed:.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--frames', type=int, default=32)
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    main(args.frames, args.size, args.workers, args.repeat)
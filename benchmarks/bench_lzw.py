@@ -0,0 +1,86 @@
+'''throughput of the gif lzw decoder and encoder
+
+decodes and encodes synthetic frames (see `benchmarks.corpus.pixels`)
+and reports megabytes of pixels per second. run from the repository
+root::
+
+    python -m benchmarks.bench_lzw --size 512
+
+the decoder this one replaced read codes one at a time from a
+`bitstring.BitStream`. it does not decode real streams (its table
+never grows), so it is represented by its code reader alone: a
+lower bound of what it costs, printing every code aside. it needs
+a `bitstring` older than 5.0 and is skipped without one.
+'''
+
+import argparse
+
+from giraffes.lzw import lzw_decode, _decode_loop, _decode_vector, lzw_encode
+
+from benchmarks.corpus import pixels, lzw
+from benchmarks.timing import measure
+
+
+def bitstring_codes(data, minsize):
+    # the code reader of the previous `lzw_decode`, widths as the
+    # new decoder computes them so that it reads the same codes
+    from bitstring import BitStream
+
+    size = minsize + 1
+    avail = (1 << minsize) + 2
+    bits = BitStream()
+    for byte in data:
+        bits.append(bytes([byte]))
+        while len(bits) > bits.pos + size:
+            binn = bits.read(f'bits:{size}').bin[::-1]
+            int(binn, 2)
+            avail += 1
+            if avail > 1 << size and size < 12:
+                size += 1
+
+
+def main(size, repeat, reference):
+    try:
+        from bitstring import BitStream
+    except ImportError:
+        reference = False
+
+    for colors, run in [(16, 1), (16, 4), (256, 4), (256, 16), (4, 64)]:
+        minsize = max(2, (colors - 1).bit_length())
+        data = pixels(size, size, colors=colors, run=run)
+        stream = lzw(data, minsize)
+        out = bytearray(len(data))
+
+        print(f'{colors} colors, runs of {run}: '
+              f'{len(stream)} bytes for {len(data)} pixels')
+        decoders = [
+            ('lzw_decode', lzw_decode),
+            ('code by code', _decode_loop),
+            ('vector', _decode_vector),
+        ]
+        for name, decode in decoders:
+            elapsed = measure(decode, stream, minsize, out, repeat=repeat)
+            assert out == data
+            print(f'    {name:>16}: {len(data) / elapsed / 1e6:8.2f} MB/s')
+
+        if reference:
+            elapsed = measure(bitstring_codes, stream, minsize, repeat=1)
+            print(f'    {"bitstring codes":>16}: '
+                  f'{len(data) / elapsed / 1e6:8.2f} MB/s')
+
+        elapsed = measure(lzw_encode, data, minsize, repeat=repeat)
+        ratio = len(lzw_encode(data, minsize)) / len(data)
+        print(f'    {"lzw_encode":>16}: '
+              f'{len(data) / elapsed / 1e6:8.2f} MB/s, '
+              f'{ratio:.2f} bytes/pixel')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-reference', dest='reference',
+                        action='store_false',
+                        help='skip the (slow) bitstring code reader')
+    args = parser.parse_args()
+    main(args.size, args.repeat, args.reference)
@@ -0,0 +1,66 @@
+'''memory held by parsed gifs
+
+parses an animated gif (see `benchmarks.corpus.gif`) in every mode
+and reports, with `tracemalloc`, the memory the parsed objects keep
+alive once every block has been accessed and the peak during
+parsing. run from the repository root::
+
+    python -m benchmarks.bench_memory --frames 2000
+'''
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from formats.blockclasses import readfrom
+from giraffes.gif import GIF
+
+from benchmarks.corpus import gif
+
+
+MODES = [
+    ('copy', {}),
+    ('view', {'view': True}),
+    ('lazy', {'lazy': True}),
+    ('view + lazy', {'view': True, 'lazy': True}),
+]
+
+
+def measure(buf, **kwargs):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    parsed = GIF()
+    readfrom(parsed, buf, **kwargs)
+    # lazy fields are decoded on access: get every block and image
+    for block in parsed.blocks:
+        getattr(block.block, 'block', None)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del parsed
+    return current, peak, elapsed
+
+
+def main(frames, width, height):
+    # views alias writable buffers only, bytes would be copied
+    buf = bytearray(gif(frames, width, height))
+    print(f'{frames} frames of {width}x{height}, {len(buf) / 1e6:.1f} MB')
+    for name, kwargs in MODES:
+        current, peak, elapsed = measure(buf, **kwargs)
+        print((
+            f'    {name:>11}: {current / 1e6:7.2f} MB kept, '
+            f'{peak / 1e6:7.2f} MB peak, '
+            f'{current / frames:7.0f} B/frame '
+            f'(parsed in {elapsed * 1e3:.0f} ms, traced)'
+        ))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--width', type=int, default=16)
+    parser.add_argument('--height', type=int, default=16)
+    args = parser.parse_args()
+    main(args.frames, args.width, args.height)
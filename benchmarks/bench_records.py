@@ -0,0 +1,63 @@
+'''bulk reads and writes of structclass records
+
+reads and writes files of fixed-size records (see
+`benchmarks.corpus.records`) with `readmany`, `iter_records` and
+`writemany`, and with a `readfrom`/`writeinto` call per record.
+reports records per second. run from the repository root::
+
+    python -m benchmarks.bench_records --count 1000000
+'''
+
+import argparse
+
+from formats.structclasses import (readfrom, writeinto, readmany,
+                                   iter_records, writemany, sizeof)
+from giraffes.gif import ColorTableEntry, ImageDescriptor
+from giraffes.index import IndexEntry
+
+from benchmarks.corpus import records
+from benchmarks.timing import measure
+
+
+def loop_read(cls, buf, count):
+    out, offset = [], 0
+    for _ in range(count):
+        record = cls()
+        offset += readfrom(record, buf, offset)
+        out.append(record)
+    return out
+
+
+def loop_write(seq, buf):
+    offset = 0
+    for record in seq:
+        offset += writeinto(record, buf, offset)
+
+
+def main(count, repeat):
+    for cls in (ColorTableEntry, ImageDescriptor, IndexEntry):
+        buf = records(cls, count)
+        out = bytearray(len(buf))
+        seq = list(readmany(cls, buf, count))
+        assert bytes(readmany(cls, buf, count)) == buf
+
+        print(f'{count} {cls.__name__} of {sizeof(cls)} bytes')
+        cases = [
+            ('readfrom loop', loop_read, cls, buf, count),
+            ('readmany', readmany, cls, buf, count),
+            ('iter_records', lambda: sum(1 for _ in iter_records(cls, buf))),
+            ('writeinto loop', loop_write, seq, out),
+            ('writemany', writemany, seq, out),
+        ]
+        for name, func, *args in cases:
+            elapsed = measure(func, *args, repeat=repeat)
+            print(f'    {name:>14}: {count / elapsed / 1e6:8.2f} M records/s')
+        assert out == buf
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    main(args.count, args.repeat)
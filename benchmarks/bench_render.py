@@ -0,0 +1,54 @@
+'''random access to the composited frames of a gif
+
+renders frames of a synthetic animation (see
+`benchmarks.corpus.animation`) in a random order with
+`giraffes.render.Renderer`, with and without its cache, and reports
+frames per second and the statistics of the cache. run from the
+repository root::
+
+    python -m benchmarks.bench_render --frames 64 --size 256
+'''
+
+import argparse
+import random
+import time
+
+from formats.blockclasses import readfrom
+from giraffes.gif import GIF
+from giraffes.render import Renderer
+
+from benchmarks.corpus import animation
+
+
+def main(frames, size, reads, maxbytes, keyframes):
+    gif = GIF()
+    readfrom(gif, animation(frames=frames, width=size, height=size))
+    rand = random.Random(0)
+    order = [rand.randrange(frames) for _ in range(reads)]
+
+    print(f'{reads} random reads of {frames} frames of {size}x{size}')
+    for name, kwargs in [
+        ('no cache', dict(maxbytes=0)),
+        ('cache', dict(maxbytes=maxbytes, keyframes=keyframes)),
+    ]:
+        renderer = Renderer(gif, **kwargs)
+        start = time.perf_counter()
+        for n in order:
+            renderer[n]
+        elapsed = time.perf_counter() - start
+        info = renderer.cache_info()
+        print(f'{name:>10}: {reads / elapsed:8.1f} frames/s, '
+              f'{info.replayed} images drawn, '
+              f'{info.hits} hits, {info.misses} misses, '
+              f'{info.nbytes / 1e6:.1f} MB cached')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--frames', type=int, default=32)
+    parser.add_argument('--size', type=int, default=128)
+    parser.add_argument('--reads', type=int, default=64)
+    parser.add_argument('--maxbytes', type=int, default=64 << 20)
+    parser.add_argument('--keyframes', type=int, default=8)
+    args = parser.parse_args()
+    main(args.frames, args.size, args.reads, args.maxbytes, args.keyframes)
@@ -0,0 +1,151 @@
+'''deterministic synthetic inputs for the benchmarks
+
+every generator takes a seed so that the same arguments always give
+the same bytes.
+'''
+
+import random
+import struct
+
+
+def _subblocks(data, size=255):
+    # a sub-block chain: length prefixed chunks and a terminator
+    out = bytearray()
+    for i in range(0, len(data), size):
+        chunk = data[i:i+size]
+        out.append(len(chunk))
+        out += chunk
+    out.append(0)
+    return out
+
+
+def gif(frames=16, width=64, height=64, seed=0, chunk=255, lct=False,
+        extensions=0):
+    '''an animated GIF with `frames` frames of random pixel data
+
+    the image data is random bytes, not a valid LZW stream: it is
+    meant for the parsers, not for decoders.
+
+    :param chunk: the size of the sub-blocks of the image data, 1
+        for as many sub-blocks as pixels
+    :param lct: whether every frame has its own 256 colors table
+    :param extensions: the number of comment and application
+        extensions before every frame
+    '''
+
+    rand = random.Random(seed)
+    out = bytearray(b'GIF89a')
+    out += struct.pack('<HHBBB', width, height, 0xF7, 0, 0)
+    out += bytes(rand.getrandbits(8) for _ in range(3 * 256))
+    out += b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00'
+
+    for _ in range(frames):
+        for i in range(extensions):
+            if i % 2:
+                out += b'\x21\xff\x0bXMP DataXMP'
+            else:
+                out += b'\x21\xfe'
+            out += _subblocks(rand.randbytes(rand.randrange(1, 64)))
+        out += b'\x21\xf9\x04\x04' + struct.pack('<H', 10) + b'\x00\x00'
+        packed = 0x87 if lct else 0
+        out += b'\x2c' + struct.pack('<HHHHB', 0, 0, width, height, packed)
+        if lct:
+            out += rand.randbytes(3 * 256)
+        out += b'\x08'
+        pixels = bytes(rand.getrandbits(8) for _ in range(width * height))
+        out += _subblocks(pixels, chunk)
+    out += b'\x3b'
+    return bytes(out)
+
+
+def pixels(width=256, height=256, colors=16, run=4, seed=0):
+    '''color indices made of random runs of average length `run`
+
+    random indices barely compress: runs make the LZW streams look
+    more like the ones of real images.
+    '''
+
+    rand = random.Random(seed)
+    out = bytearray()
+    while len(out) < width * height:
+        out += bytes([rand.randrange(colors)]) * rand.randint(1, 2 * run - 1)
+    return bytes(out[:width * height])
+
+
+def lzw(data, minsize=8):
+    '''the gif lzw stream of `data`, clearing the table when full
+
+    a plain dictionary based encoder: slow but simple enough to be
+    trusted.
+    '''
+
+    clear, eoi = 1 << minsize, (1 << minsize) + 1
+    codes = [(clear, minsize + 1)]
+    table = {bytes([i]): i for i in range(clear)}
+    size, avail = minsize + 1, eoi + 1
+
+    prefix = b''
+    for byte in data:
+        string = prefix + bytes([byte])
+        if string in table:
+            prefix = string
+            continue
+        codes.append((table[prefix], size))
+        if avail < 4096:
+            table[string] = avail
+            avail += 1
+            if avail > 1 << size and size < 12:
+                size += 1
+        else:
+            codes.append((clear, size))
+            table = {bytes([i]): i for i in range(clear)}
+            size, avail = minsize + 1, eoi + 1
+        prefix = bytes([byte])
+    if prefix:
+        codes.append((table[prefix], size))
+    codes.append((eoi, size))
+
+    out = bytearray()
+    bits = nbits = 0
+    for code, size in codes:
+        bits |= code << nbits
+        nbits += size
+        while nbits >= 8:
+            out.append(bits & 0xFF)
+            bits >>= 8
+            nbits -= 8
+    if nbits:
+        out.append(bits)
+    return bytes(out)
+
+
+def animation(frames=16, width=128, height=128, colors=256, run=8, seed=0):
+    '''an animated GIF whose frames are real LZW streams
+
+    the frames are `pixels` encoded with `giraffes.lzw.lzw_encode`.
+    '''
+
+    from giraffes.lzw import lzw_encode
+
+    minsize = max(2, (colors - 1).bit_length())
+    rand = random.Random(seed)
+    out = bytearray(b'GIF89a')
+    out += struct.pack('<HHBBB', width, height, 0xF7, 0, 0)
+    out += bytes(rand.getrandbits(8) for _ in range(3 * 256))
+
+    for i in range(frames):
+        data = pixels(width, height, colors=colors, run=run, seed=seed + i)
+        out += b'\x21\xf9\x04\x04' + struct.pack('<H', 10) + b'\x00\x00'
+        out += b'\x2c' + struct.pack('<HHHHB', 0, 0, width, height, 0)
+        out += bytes([minsize]) + lzw_encode(data, minsize)
+    out += b'\x3b'
+    return bytes(out)
+
+
+def records(cls, count=100000, seed=0):
+    '''`count` records of the structclass `cls` of random bytes'''
+
+    from formats.structclasses import sizeof
+
+    rand = random.Random(seed)
+    return rand.randbytes(sizeof(cls) * count)
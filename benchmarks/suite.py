@@ -0,0 +1,213 @@
+'''the benchmark suite: parse, serialize and lzw throughput
+
+runs every case on deterministic synthetic corpora (see
+`benchmarks.corpus`) and reports megabytes and objects per second:
+blocks for gifs, records for record files and pixels for lzw. run
+from the repository root::
+
+    python -m benchmarks.suite --save results.json
+    python -m benchmarks.suite --baseline results.json
+
+with `--baseline` every case is compared to the same case of an
+earlier run, and the ones slower by more than `--threshold` are
+flagged. the exit status is 1 when there is any. timings are the
+best of `--repeat` runs: compare runs of the same machine only, and
+expect a few percents of noise.
+'''
+
+import argparse
+import json
+import platform
+import sys
+
+from formats.blockclasses import readfrom, writeinto
+from formats.structclasses import readmany, writemany, sizeof
+from formats import structclasses
+from giraffes.gif import GIF, ColorTableEntry
+from giraffes.index import IndexEntry
+from giraffes.lzw import lzw_decode, lzw_encode
+
+from benchmarks import corpus
+from benchmarks.timing import measure
+
+
+# name -> keyword arguments of `corpus.gif`, at scale 1
+GIFS = {
+    'frames': dict(frames=2000, width=16, height=16),
+    'tiny subblocks': dict(frames=16, width=64, height=64, chunk=1),
+    'color tables': dict(frames=500, width=8, height=8, lct=True),
+    'extension chains': dict(frames=50, width=8, height=8, extensions=64),
+}
+
+RECORDS = {
+    'color table entries': (ColorTableEntry, 300000),
+    'index entries': (IndexEntry, 100000),
+}
+
+
+def _wanted(names, only):
+    # whether to build the corpus of these cases at all
+    return not only or any(only in name for name in names)
+
+
+def _gif_cases(scale, only=None):
+    for name, kwargs in GIFS.items():
+        names = [f'parse {name}', f'parse view {name}', f'serialize {name}']
+        if not _wanted(names, only):
+            continue
+        kwargs = dict(kwargs, frames=max(1, int(kwargs['frames'] * scale)))
+        buf = corpus.gif(**kwargs)
+        # views alias writable buffers only, bytes would be copied
+        writable = bytearray(buf)
+        parsed = GIF()
+        readfrom(parsed, buf)
+        count = len(parsed.blocks)
+        out = bytearray(len(buf))
+
+        def parse(buf=buf):
+            readfrom(GIF(), buf)
+
+        def parse_view(buf=writable):
+            readfrom(GIF(), buf, view=True)
+
+        def serialize(parsed=parsed, out=out):
+            writeinto(parsed, out)
+
+        for case, func in zip(names, [parse, parse_view, serialize]):
+            yield case, func, len(buf), count
+
+
+def _record_cases(scale, only=None):
+    for name, (cls, count) in RECORDS.items():
+        names = [f'parse {name}', f'readmany {name}', f'writemany {name}']
+        if not _wanted(names, only):
+            continue
+        count = max(1, int(count * scale))
+        buf = corpus.records(cls, count)
+        seq = readmany(cls, buf, count)
+        out = bytearray(len(buf))
+
+        def loop(cls=cls, buf=buf, count=count):
+            size = sizeof(cls)
+            for offset in range(0, size * count, size):
+                structclasses.readfrom(cls(), buf, offset)
+
+        def read(cls=cls, buf=buf, count=count):
+            readmany(cls, buf, count)
+
+        def write(seq=seq, out=out):
+            writemany(seq, out)
+
+        for case, func in zip(names, [loop, read, write]):
+            yield case, func, len(buf), count
+
+
+def _lzw_cases(scale, only=None):
+    size = max(16, int(512 * scale ** .5))
+    for colors, run in [(256, 4), (16, 16)]:
+        name = f'{colors} colors, runs of {run}'
+        names = [f'lzw decode {name}', f'lzw encode {name}']
+        if not _wanted(names, only):
+            continue
+        minsize = max(2, (colors - 1).bit_length())
+        data = corpus.pixels(size, size, colors=colors, run=run)
+        stream = corpus.lzw(data, minsize)
+        out = bytearray(len(data))
+
+        def decode(stream=stream, minsize=minsize, out=out):
+            lzw_decode(stream, minsize, out)
+
+        def encode(data=data, minsize=minsize):
+            lzw_encode(data, minsize)
+
+        for case, func in zip(names, [decode, encode]):
+            yield case, func, len(data), len(data)
+
+
+def cases(scale=1.0, only=None):
+    '''every case as ``(name, function, bytes, objects)``
+
+    the corpora are built as they are needed: with `only` set, the
+    ones of cases without it in their name are not built at all
+    '''
+    yield from _gif_cases(scale, only)
+    yield from _record_cases(scale, only)
+    yield from _lzw_cases(scale, only)
+
+
+def run(scale=1.0, repeat=3, only=None):
+    '''run the suite, returns its results as a dict'''
+
+    results = {}
+    for name, func, nbytes, count in cases(scale, only):
+        if only and only not in name:
+            continue
+        elapsed = measure(func, repeat=repeat)
+        results[name] = {
+            'seconds': elapsed,
+            'MB/s': nbytes / elapsed / 1e6,
+            'objects/s': count / elapsed,
+        }
+        print(f'{name:>42}: {nbytes / elapsed / 1e6:9.2f} MB/s '
+              f'{count / elapsed:12.0f} objects/s')
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'scale': scale,
+        'results': results,
+    }
+
+
+def compare(results, baseline, threshold=0.15):
+    '''the cases of `results` slower than in `baseline` by more than
+    `threshold`, as ``(name, ratio)`` pairs. the ratio is the new
+    throughput over the old one
+    '''
+
+    if results['scale'] != baseline['scale']:
+        print(f'warning: scale {results["scale"]} compared to '
+              f'{baseline["scale"]}', file=sys.stderr)
+
+    slower = []
+    for name, new in results['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        ratio = new['MB/s'] / old['MB/s']
+        flag = '  REGRESSION' if ratio < 1 - threshold else ''
+        print(f'{name:>42}: {ratio:6.2f}x{flag}')
+        if flag:
+            slower.append((name, ratio))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='size of the corpora, 1 by default')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', help='run the cases with this in '
+                        'their name')
+    parser.add_argument('--save', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare to these results')
+    parser.add_argument('--threshold', type=float, default=0.15)
+    args = parser.parse_args()
+
+    results = run(args.scale, args.repeat, args.only)
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        print()
+        slower = compare(results, baseline, args.threshold)
+        if slower:
+            print(f'{len(slower)} regressions', file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
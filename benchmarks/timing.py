@@ -0,0 +1,14 @@
+'''timing helpers shared by the benchmarks'''
+
+import time
+
+
+def measure(func, *args, repeat=1, **kwargs):
+    '''the best wall time of `repeat` calls of `func(*args, **kwargs)`'''
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
@@ -1,2 +1,4 @@
 from . import structclasses
 from . import blockclasses
+from . import streams
+from . import profiling
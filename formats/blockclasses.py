@@ -2,26 +2,98 @@ from __future__ import annotations
 import ctypes
 import sys
 import abc
+import os
+import ast
+import types
+import collections
+import contextlib
+import functools
+import mmap
+import io
+import traceback
+from array import array
 
 from . import structclasses as stc
+from .exceptions import BlockClassError
 
 
 # don't tell anyone i wrote this
 _CData = ctypes.c_ubyte.__mro__[2]
+_SimpleCData = ctypes.c_ubyte.__mro__[1]
 
+# the recursion leaves: ctypes objects and the records of the
+# ``backend='struct'`` structclasses
+_Leaf = (_CData, stc._Record)
 
-def blockclass(cls):
-    # maybe doing the same as structclasses (making
-    # a dataclass out of cls) would be of benefit
+# set to True to parse with the annotation evaluating coroutine
+# (and write by walking annotations) instead of using the generated
+# functions. it is a lot slower but much easier to step through
+# with a debugger
+interpreted = False
 
-    # pre-compile type annotation code
+
+def blockclass(cls=None, *, skip=()):
+    '''make a class with annotated fields a binary block
+
+    annotations are python expressions giving the type of each
+    field, and they may refer to earlier fields (see
+    :func:`readfrom`). like structclasses, the class is made anew
+    with a ``__slots__`` entry per field: instances have no
+    ``__dict__``. it gets an ``__init__`` taking the fields as
+    arguments, and an ``__eq__`` and a ``__repr__``, unless it
+    defines them itself. fields which are not given are unset
+    until the instance is parsed.
+
+    .. code-block:: python
+
+        @blockclass
+        class SubBlock:
+            header: SubBlockHeader
+            data:   ubyte * header.size
+
+        block = SubBlock(SubBlockHeader(3), (ubyte * 3)(*b'gif'))
+
+    `skip` are types which are skipped, not parsed, wherever they
+    appear in the class or the blocks it is made of, as if they
+    were given to every :func:`readfrom` call (see there).
+
+    :param skip: types to skip
+    '''
+
+    if cls is None:
+        return lambda cls: blockclass(cls, skip=skip)
+
+    # pre-compile type annotation code. the source is kept
+    # around for the function generators (see `_compile_parser`)
     annot = getattr(cls, '__annotations__', {})
+    fields = []
     for attr, code in annot.items():
+        tree = _ArrayTransformer().visit(ast.parse(code, mode='eval'))
+        tree = ast.fix_missing_locations(tree)
+        fields.append((attr, ast.unparse(tree)))
+
         bytecode = compile(
-            code,
+            tree,
             filename=sys.modules[cls.__module__].__file__,
             mode='eval')
         annot[attr] = bytecode
+    names = tuple(attr for attr, _ in fields)
+
+    # deferred fields of lazy parsers go in `_blocklazy_`
+    dct = {k: v for k, v in cls.__dict__.items()
+           if k not in ('__dict__', '__weakref__')}
+    dct.update({
+        '__slots__': names + ('_blocklazy_',),
+        '__qualname__': cls.__qualname__,
+        '_blockfields_': fields,
+        '_blockskip_': frozenset(skip),
+    })
+    methods = {'__eq__': _block_eq, '__repr__': _block_repr}
+    for name, method in methods.items():
+        dct.setdefault(name, method)
+    cls = _rebind(cls, type(cls)(cls.__name__, cls.__bases__, dct))
+    if '__init__' not in dct:
+        cls.__init__ = _make_init(cls, names)
 
     # we are debug friendly and also nice
     def __str__(self):
@@ -34,27 +106,145 @@ def blockclass(cls):
         return f'{cls.__name__}({attrs})'
     cls.__str__ = __str__
 
+    # only called when normal lookup fails: decodes lazy fields
+    cls.__getattr__ = _decode
+
     return cls
 
 
+# the value of fields which were not given to `__init__`
+_missing = object()
+
+
+def _make_init(cls, names):
+    # a field which is not given stays unset, as `_decode` expects
+    params = ''.join(f', {attr}=__missing' for attr in names)
+    lines = []
+    for attr in names:
+        lines.append(f'if {attr} is not __missing:')
+        lines.append(f'    __self.{attr} = {attr}')
+    return _make_fn(cls, '__init__', f'__self{params}', lines or ['pass'],
+                    {'__missing': _missing})
+
+
+def _rebind(old, new):
+    # methods using `super()` or `__class__` refer to the class in a
+    # closure cell: point it at the new class, like dataclasses does
+    # for its slots classes
+    for member in new.__dict__.values():
+        if isinstance(member, (classmethod, staticmethod)):
+            funcs = [member.__func__]
+        elif isinstance(member, property):
+            funcs = [member.fget, member.fset, member.fdel]
+        else:
+            funcs = [member]
+        for func in funcs:
+            while hasattr(func, '__wrapped__'):
+                func = func.__wrapped__
+            if not isinstance(func, types.FunctionType) or \
+                    '__class__' not in func.__code__.co_freevars:
+                continue
+            cell = func.__closure__[
+                func.__code__.co_freevars.index('__class__')]
+            if cell.cell_contents is old:
+                cell.cell_contents = new
+    return new
+
+
+def _same(a, b):
+    # ctypes objects have no equality of their own: compare bytes
+    if isinstance(a, _CData) and isinstance(b, _CData):
+        return bytes(a) == bytes(b)
+    return a == b
+
+
+def _block_eq(self, other):
+    if type(other) is not type(self):
+        return NotImplemented
+    return all(_same(getattr(self, attr, _missing),
+                     getattr(other, attr, _missing))
+               for attr, _ in self._blockfields_)
+
+
+def _block_repr(self):
+    # unset fields are left out
+    values = ((attr, getattr(self, attr, _missing))
+              for attr, _ in self._blockfields_)
+    fields = ', '.join(f'{attr}={val!r}' for attr, val in values
+                       if val is not _missing)
+    return f'{type(self).__qualname__}({fields})'
+
+
+def _array(atype, length):
+    if isinstance(atype, type) and issubclass(atype, _CData):
+        return stc.array_type(atype, length)
+    if isinstance(atype, type) and issubclass(atype, stc._Record):
+        # records do not multiply
+        return _counted(atype, length)
+    return atype * length
+
+
+class _ArrayTransformer(ast.NodeTransformer):
+    # ``ubyte * header.size`` makes a new array type for each size
+    # so every multiplication in an annotation is turned into a call
+    # to `_array` which goes through the array type cache
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if not isinstance(node.op, ast.Mult):
+            return node
+        func = ast.Name(id='__array', ctx=ast.Load())
+        return ast.copy_location(
+            ast.Call(func=func, args=[node.left, node.right], keywords=[]),
+            node)
+
+
+# names the rewritten annotations need besides their module's globals
+_annotationns = {'__array': _array}
+
+
 class _BlockBase(abc.ABC):
     # maybe this should inherit from `array.array` so
     # that memoryview(_BlockBase) would be the binary
     # representation of the object (the output of writeinto)
     # or maybe this would be a huge mistake
+    __slots__ = ()
 
     @abc.abstractmethod
-    def _frombuffer(self, buf, offset=0):
+    def _frombuffer(self, buf, offset=0, view=False, lazy=False, skip=()):
         raise NotImplementedError()
+
+    @classmethod
+    def _measure(cls, buf, offset=0, view=False):
+        # the size of the value at `offset`, see `_measure`
+        return cls()._frombuffer(buf, offset, view=view, lazy='measure')
     
     @abc.abstractmethod
     def _tobuffer(self, buf, offset=0):
         raise NotImplementedError()
 
+    def _fromstream(self, emit=False, keep=True):
+        # a streaming parser, see `_stream`. `emit` and `keep` are
+        # for top-level fields, see `streams.StreamParser`
+        raise BlockClassError(f'{type(self).__name__} cannot be streamed')
+
+    def _packedsize(self):
+        # see `packed_size`. measured by writing it by default
+        out = bytearray()
+        return self._tobuffer(out)
+
+    def _dump(self, out):
+        # see `dump`, in a single piece by default
+        out.put(memoryview(tobytes(self)))
+
+
+# a single type for every missing optional field: `optional` is
+# evaluated for every block parsed and making types is expensive
+_empty = type('empty', (ctypes.Structure,), dict())
+
 
 def optional(on, atype):
-    empty = type('empty', (ctypes.Structure,), dict())
-    return atype if on else empty
+    return atype if on else _empty
 
 
 def dispatch(on, branches, default=None):
@@ -63,50 +253,1185 @@ def dispatch(on, branches, default=None):
     return branches[on]
 
 
-def repeat(atype, until):
-    class repeat(list, _BlockBase):
+class _Repeat(list, _BlockBase):
+    # what every repeat does: a list of elements of type `_type`
+    __slots__ = ()
+
+    def _tobuffer(self, buf, offset=0):
+        off = offset
+        for block in self:
+            off += writeinto(block, buf, offset=off)
+        return off - offset
+
+    def _packedsize(self):
+        size = _field_size(self._type)
+        if size is not None:
+            return size * len(self)
+        return sum(map(packed_size, self))
+
+    def _dump(self, out):
+        for block in self:
+            _dump(block, out)
+
+
+def repeat(atype, until=None, count=None):
+    '''elements of type `atype` up to one `until` is true for, or
+    `count` of them
+
+    .. code-block:: python
+
+        @blockclass
+        class GIF:
+            ...
+            blocks: repeat(Block, until=lambda b: b.introducer.value == 0x3B)
+
+        @blockclass
+        class Table:
+            header: TableHeader
+            rows: repeat(Row, count=header.nrows)
+
+    with a `count` the result is :func:`array_of` `atype`.
+
+    :param atype: the type of the elements
+    :param until: a function of an element, true for the last one
+    :param count: the number of elements
+    '''
+
+    if (until is None) == (count is None):
+        raise BlockClassError('repeat takes either until or count')
+    if count is not None:
+        return array_of(atype, count)
+
+    class repeat(_Repeat):
+        __slots__ = ()
         _type = staticmethod(atype)
         _until = staticmethod(until)
 
-        def _frombuffer(self, buf, offset=0):
+        def _frombuffer(self, buf, offset=0, view=False, lazy=False,
+                        skip=()):
+            atype = self._type
+            parse = None
+            if hasattr(atype, '_blockfields_') and not interpreted:
+                # spare `readfrom`'s dispatch for every element
+                parse = _parser(atype, view, lazy, skip)
+
             off = offset
-            block = self._type()
-            off += readfrom(block, buf, offset=off)
-            self.append(block)
+            while True:
+                if parse is None:
+                    block, size = _read(atype, buf, off, view, lazy, skip)
+                else:
+                    block = atype()
+                    size = parse(block, buf, off)
+                try:
+                    done = self._until(block)
+                except AttributeError:
+                    # a measured block only has the fields annotations
+                    # refer to. `until` wants another one
+                    if lazy != 'measure':
+                        raise
+                    block, size = _read(atype, buf, off, view, True)
+                    done = self._until(block)
+                off += size
+                self.append(block)
+                if done:
+                    return off - offset
 
-            while not self._until(self[-1]):
-                self.append(self._type())
-                off += readfrom(self[-1], buf, offset=off)
-            return off - offset
-        
-        def _tobuffer(self, buf, offset=0):
+        def _fromstream(self, emit=False, keep=True):
+            while True:
+                block = yield from _stream_whole(self._type)
+                if emit:
+                    yield _Element(block)
+                done = self._until(block)
+                if keep or not emit:
+                    self.append(block)
+                if done:
+                    return
+    return repeat
+
+
+class _Counted(_Repeat):
+    # `count` elements of a type which is not fixed size
+    __slots__ = ()
+
+    def _frombuffer(self, buf, offset=0, view=False, lazy=False, skip=()):
+        atype, count = self._type, self._count
+        size = _field_size(atype)
+        if lazy == 'measure' and size is not None:
+            return size * count
+
+        if not hasattr(atype, '_blockfields_') or interpreted:
             off = offset
-            for block in self:
-                off += writeinto(block, buf, offset=off)
+            for _ in range(count):
+                block, size = _read(atype, buf, off, view, lazy, skip)
+                off += size
+                self.append(block)
             return off - offset
-    return repeat
 
+        # the loop of `repeat` without `until`, every name local
+        parse = _parser(atype, view, lazy, skip)
+        new, append = atype, self.append
+        off = offset
+        for _ in range(count):
+            block = new()
+            off += parse(block, buf, off)
+            append(block)
+        return off - offset
+
+    def _fromstream(self, emit=False, keep=True):
+        for _ in range(self._count):
+            block = yield from _stream_whole(self._type)
+            if emit:
+                yield _Element(block)
+            if keep or not emit:
+                self.append(block)
+
+
+@functools.lru_cache(maxsize=1024)
+def _counted(atype, count):
+    return type('array_of', (_Counted,), {
+        '__slots__': (),
+        '_type': staticmethod(atype),
+        '_count': count,
+    })
+
+
+def array_of(atype, count):
+    '''`count` consecutive elements of type `atype`
+
+    for ctypes types (but char arrays) this is the array type
+    ``atype * count``: it is read in a single copy, or as a single
+    view, and its elements are not python objects until they are
+    accessed. other types, such as blockclasses, are parsed one
+    element after another in a list, without the `until` call of
+    :func:`repeat`. types are cached: annotations such as
+    ``array_of(Row, header.nrows)`` do not make a type per block.
+
+    :param atype: the type of the elements
+    :param count: the number of elements
+    '''
+
+    if _fixed(atype):
+        return _array(atype, count)
+    return _counted(atype, count)
+
+
+class subblocks(_BlockBase):
+    '''a chain of sub-blocks: chunks of at most 255 bytes, each
+    prefixed with its length, up to an empty one
+
+    parsing only hops from length byte to length byte: the offset
+    and length of every chunk go in two arrays and no object is
+    made per chunk. with `view` the chain aliases the parsed buffer,
+    otherwise it is copied once, length bytes included.
+
+    .. code-block:: python
+
+        @blockclass
+        class Image:
+            header: ImageDescriptor
+            lzw:    LZWMin
+            data:   subblocks
+
+        image.data.gather()  # the payload, in one bytearray
+        image.data.views()   # or one memoryview per chunk
+
+    :param data: the payload of a new chain, cut in chunks of 255
+        bytes
+    '''
+
+    __slots__ = ('_buf', '_span', '_offsets', '_lengths')
+
+    def __init__(self, data=b''):
+        with memoryview(data) as data:
+            data = data.cast('B')
+            full, rest = divmod(len(data), 255)
+            chain = bytearray()
+            for i in range(0, 255 * full, 255):
+                chain.append(255)
+                chain += data[i:i+255]
+            if rest:
+                chain.append(rest)
+                chain += data[255 * full:]
+            chain.append(0)
+        self._scan(memoryview(bytes(chain)), 0)
+
+    def _scan(self, buf, offset):
+        # `buf` is a memoryview of bytes. the offsets of the chunks
+        # are relative to the chain so that it can move
+        offsets, lengths = array('Q'), array('B')
+        off = offset
+        try:
+            size = buf[off]
+            while size:
+                offsets.append(off + 1 - offset)
+                lengths.append(size)
+                off += size + 1
+                size = buf[off]
+        except IndexError:
+            raise ValueError((
+                f'buffer ends {off - offset} bytes into a sub-block chain'
+            )) from None
+
+        self._buf = buf
+        self._span = (offset, off + 1)
+        self._offsets = offsets
+        self._lengths = lengths
+        return off + 1 - offset
+
+    @classmethod
+    def _measure(cls, buf, offset=0, view=False):
+        # hop from length byte to length byte, recording nothing
+        buf = memoryview(buf).cast('B')
+        off = offset
+        try:
+            size = buf[off]
+            while size:
+                off += size + 1
+                size = buf[off]
+        except IndexError:
+            raise ValueError((
+                f'buffer ends {off - offset} bytes into a sub-block chain'
+            )) from None
+        return off + 1 - offset
+
+    def _frombuffer(self, buf, offset=0, view=False, lazy=False, skip=()):
+        buf = memoryview(buf).cast('B')
+        size = self._scan(buf, offset)
+        if not view and lazy != 'measure':
+            # the chunks move with the copy
+            self._buf = memoryview(bytes(buf[offset:offset + size]))
+            self._span = (0, size)
+        return size
+
+    def _fromstream(self, emit=False, keep=True):
+        chain = bytearray((yield 1))
+        while chain[-1]:
+            chain += (yield chain[-1] + 1)
+        self._scan(memoryview(chain), 0)
+
+    def _tobuffer(self, buf, offset=0):
+        start, end = self._span
+        buf[offset:offset + end - start] = self._buf[start:end]
+        return end - start
+
+    def _packedsize(self):
+        start, end = self._span
+        return end - start
+
+    def _dump(self, out):
+        start, end = self._span
+        out.put(self._buf[start:end])
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def __eq__(self, other):
+        # chains are equal when they are chunked the same way
+        if not isinstance(other, subblocks):
+            return NotImplemented
+        (start, end), (ostart, oend) = self._span, other._span
+        return self._buf[start:end] == other._buf[ostart:oend]
+
+    def __iter__(self):
+        return iter(self.views())
+
+    @property
+    def size(self):
+        '''the size of the payload'''
+        return sum(self._lengths)
+
+    def views(self):
+        '''the chunks as memoryviews of the parsed buffer or copy'''
+        buf = self._buf[self._span[0]:]
+        return [buf[off:off + size]
+                for off, size in zip(self._offsets, self._lengths)]
+
+    def gather(self):
+        '''the payload in a new bytearray, copied in a single pass'''
+        buf = self._buf[self._span[0]:]
+        out = bytearray(self.size)
+        pos = 0
+        for off, size in zip(self._offsets, self._lengths):
+            out[pos:pos + size] = buf[off:off + size]
+            pos += size
+        return out
+
+
+def _names(source):
+    # every name an annotation expression refers to. this is
+    # conservative (lambda parameters are included) which is fine:
+    # at worst a field is evaluated at parse time for nothing
+    tree = ast.parse(source, mode='eval')
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
+
+def _read(atype, buf, offset, view=False, lazy=False, skip=()):
+    # parse a value whose type is only known at parse time
+    if view and _fixed(atype) and not issubclass(atype, _SimpleCData):
+        if view == 'ro':
+            atype = stc._readonly_type(atype)
+            return atype.from_buffer_copy(buf, offset), ctypes.sizeof(atype)
+        return atype.from_buffer(buf, offset), ctypes.sizeof(atype)
+
+    val = atype()
+    size = readfrom(val, buf, offset=offset, view=view, lazy=lazy, skip=skip)
+
+    # like structure fields, simple values are python values
+    if isinstance(val, _SimpleCData):
+        val = val.value
+    return val, size
+
+
+# stands for a field whose decoding is deferred, see `_defer`
+_pending = object()
+
+
+def _measure(atype, buf, offset, view=False):
+    # the size of a value of type `atype`, decoding as little as
+    # possible: parsers in the 'measure' mode only decode the fields
+    # later annotations refer to, typically length prefixes
+    if issubclass(atype, _Leaf):
+        return _leaf_size(atype)
+    if issubclass(atype, _BlockBase):
+        return atype._measure(buf, offset, view)
+    size = _static_size(atype) if hasattr(atype, '_blockfields_') else None
+    if size is not None:
+        return size
+    return readfrom(atype(), buf, offset, view=view, lazy='measure')
+
+
+def _defer(atype, buf, offset, view=False, skip=()):
+    # the lazy version of `_read`: ctypes fields and repeats are not
+    # decoded, only measured. blockclasses are cheap to parse lazily
+    # so they are
+    if _fixed(atype) or issubclass(atype, _BlockBase) or atype in skip:
+        return _pending, _measure(atype, buf, offset, view)
+    return _read(atype, buf, offset, view, lazy=True, skip=skip)
+
+
+def _decode(self, attr):
+    # `__getattr__` of blockclasses: decode a lazy field on first
+    # access and keep the result like any other field
+    try:
+        lazy = object.__getattribute__(self, '_blocklazy_')
+        buf, offset, atype, view = lazy.pop(attr)
+    except (AttributeError, KeyError):
+        raise AttributeError((
+            f'{type(self).__name__!r} object has no attribute {attr!r}'
+        )) from None
+
+    val, _ = _read(atype, buf, offset, view, lazy=True)
+    setattr(self, attr, val)
+    return val
+
+
+def _forget(self, attrs):
+    # values of deferred fields left by an earlier parse would
+    # shadow them: `_decode` is only called for unset fields
+    for attr in attrs:
+        try:
+            delattr(self, attr)
+        except AttributeError:
+            pass
+
+
+# `atype` is the evaluated annotation of a static field and None
+# for a field whose type depends on earlier fields
+_Field = collections.namedtuple('_Field', 'attr source atype')
+
+# consecutive fixed size fields read as a single packed structure
+_Run = collections.namedtuple('_Run', 'fields atype')
+
+_Layout = collections.namedtuple('_Layout', 'fields segments needed')
+
+
+def _fixed(atype):
+    # whether a type can be merged in a packed structure: reading
+    # the structure field must give the same thing as reading the
+    # type on its own, which is not true for char arrays (they are
+    # turned into bytes)
+    if not isinstance(atype, type) or not issubclass(atype, _CData):
+        return False
+    return not (issubclass(atype, ctypes.Array) and
+                atype._type_ in (ctypes.c_char, ctypes.c_wchar))
+
+
+def _layout(cls):
+    '''static layout analysis of a blockclass
+
+    annotations are split in static ones, which do not refer to
+    earlier fields and are evaluated once and for all, and dependent
+    ones. runs of consecutive static fields of fixed size ctypes
+    types are merged in a synthesized packed structclass so that
+    they are read with a single copy. the layout also records which
+    fields later annotations refer to: the generated functions keep
+    those in local variables.
+
+    the result is cached on the class. like the generated functions
+    it must not be computed before the class's module is complete.
+    '''
+
+    try:
+        return cls.__dict__['_blocklayout_']
+    except KeyError:
+        pass
+
+    globalns = sys.modules[cls.__module__].__dict__
+    names = [_names(source) for _, source in cls._blockfields_]
+
+    fields, needed, seen = [], set(), set()
+    for i, (attr, source) in enumerate(cls._blockfields_):
+        if any(attr in later for later in names[i+1:]):
+            needed.add(attr)
+        atype = None
+        if not names[i] & seen:
+            atype = eval(source, globalns, dict(_annotationns))
+        fields.append(_Field(attr, source, atype))
+        seen.add(attr)
+
+    segments, run = [], []
+    def flush():
+        if len(run) > 1:
+            annot = {field.attr: field.atype for field in run}
+            name = f'{cls.__name__}_{run[0].attr}_{run[-1].attr}'
+            atype = stc.structclass(type(name, (), {
+                '__annotations__': annot,
+                '__module__': cls.__module__,
+                '__qualname__': f'{cls.__qualname__}.{name}',
+            }))
+            segments.append(_Run(tuple(run), atype))
+        else:
+            segments.extend(run)
+        run.clear()
+
+    for field in fields:
+        if _fixed(field.atype):
+            run.append(field)
+            continue
+        flush()
+        segments.append(field)
+    flush()
+
+    layout = cls._blocklayout_ = _Layout(fields, segments, needed)
+    return layout
+
+
+def _leaf_size(atype):
+    if issubclass(atype, stc._Record):
+        return atype._struct_.size
+    return ctypes.sizeof(atype)
+
+
+def sizeof(bcls):
+    '''size in bytes of a blockclass with a fully static layout
+
+    a blockclass has a static size when none of its annotations
+    refer to earlier fields and every field type has a static size
+    itself. ctypes types and instances are also accepted, and so are
+    ``backend='struct'`` structclasses.
+
+    .. doctest::
+
+        >>> @blockclass
+        ... class pair:
+        ...     fst: ushort
+        ...     snd: ubyte * 3
+        ...
+        >>> sizeof(pair)
+        5
+
+    :param bcls: a blockclass or a ctypes type, or an instance
+    :returns: the size in bytes
+    :raises BlockClassError: when the size depends on the data
+    '''
+
+    cls = bcls if isinstance(bcls, type) else type(bcls)
+    if issubclass(cls, _Leaf):
+        return _leaf_size(cls)
+
+    if not hasattr(cls, '_blockfields_'):
+        raise BlockClassError(f'{cls.__name__} has no static size')
+
+    size = 0
+    for field in _layout(cls).fields:
+        if field.atype is None:
+            raise BlockClassError((
+                f'{cls.__name__}.{field.attr}\'s type depends on '
+                f'earlier fields: {field.source}'
+            ))
+        size += sizeof(field.atype)
+    return size
+
+
+def _make_fn(cls, name, params, lines, consts):
+    # the factory is built with the module's globals so that names
+    # in inlined annotations resolve at runtime, like with `eval`
+    body = '\n'.join(f'        {line}' for line in lines)
+    source = (
+        f'def __create_fn__({", ".join(consts)}):\n'
+        f'    def {name}({params}):\n'
+        f'{body}\n'
+        f'    return {name}\n'
+    )
+
+    globalns = sys.modules[cls.__module__].__dict__
+    code = compile(source, f'<blockclass {cls.__qualname__}>', 'exec')
+    factory = types.FunctionType(code.co_consts[0], globalns)
+    fn = factory(*consts.values())
+    fn.__qualname__ = f'{cls.__qualname__}.{name}'
+    return fn
+
+
+# streaming parsers are generators yielding what they need next:
+#   - an int n: the next n bytes, sent back as bytes or as a
+#     bytearray which then belongs to the parser (no copy is made)
+#   - a `_Peek`: everything buffered (at least `size` bytes unless
+#     the stream ended), sent back as a (memoryview, eof) pair. None
+#     is sent back when the driver will not buffer that much
+#   - a `_Skip`: consume bytes parsed from a peek
+#   - an `_Element`: a completed element of a top-level field
+# they return the parsed value. the drivers are in `streams`
+_Peek = collections.namedtuple('_Peek', 'size')
+_Skip = collections.namedtuple('_Skip', 'size')
+_Element = collections.namedtuple('_Element', 'value')
+
+
+def _frombytes(atype, data):
+    if isinstance(data, bytearray):
+        return atype.from_buffer(data)
+    return atype.from_buffer_copy(data)
+
+
+def _static_size(cls):
+    # the size of a blockclass with a static layout or None
+    try:
+        return cls.__dict__['_blocksize_']
+    except KeyError:
+        pass
+    try:
+        size = sizeof(cls)
+    except BlockClassError:
+        size = None
+    cls._blocksize_ = size
+    return size
+
+
+def _stream(atype):
+    # parse a value of type `atype`, asking for as few bytes as
+    # possible at a time: a static blockclass, a run of static
+    # fields or a field
+    if _fixed(atype):
+        val = _frombytes(atype, (yield ctypes.sizeof(atype)))
+        return val.value if isinstance(val, _SimpleCData) else val
+
+    val = atype()
+    if isinstance(val, _BlockBase):
+        yield from val._fromstream()
+    elif _static_size(atype) is not None:
+        readfrom(val, (yield _static_size(atype)))
+    else:
+        yield from _stream_fields(val)
+    return val
+
+
+def _stream_whole(atype):
+    # parse a value of type `atype` with the generated parser as
+    # soon as enough bytes are buffered. every failed attempt doubles
+    # the number of bytes to wait for so that a value is parsed at
+    # most twice on average. if the driver will not buffer that many
+    # bytes fall back on `_stream`
+    if _fixed(atype):
+        return (yield from _stream(atype))
+
+    size = 1
+    while True:
+        got = yield _Peek(size)
+        if got is None:
+            break
+
+        buf, eof = got
+        val = atype()
+        try:
+            size = readfrom(val, buf)
+        except ValueError:
+            if eof:
+                break
+            size = 2 * len(buf) + 1
+            continue
+
+        yield _Skip(size)
+        return val.value if isinstance(val, _SimpleCData) else val
+    return (yield from _stream(atype))
+
+
+def _stream_fields(bcls, emit=False, keep=True):
+    # the streaming counterpart of the interpreted parser
+    cls = type(bcls)
+    layout = _layout(cls)
+    globalns = sys.modules[cls.__module__].__dict__
+    localns = dict(_annotationns)
+
+    for segment in layout.segments:
+        if isinstance(segment, _Run):
+            run = _frombytes(segment.atype,
+                             (yield ctypes.sizeof(segment.atype)))
+            for field in segment.fields:
+                val = localns[field.attr] = getattr(run, field.attr)
+                setattr(bcls, field.attr, val)
+            continue
 
-def readfrom(bcls, buf, offset=0):
+        attr, _, atype = segment
+        if atype is None:
+            atype = eval(cls.__annotations__[attr], globalns, localns)
+
+        if emit and issubclass(atype, _BlockBase):
+            val = atype()
+            yield from val._fromstream(emit=True, keep=keep)
+        else:
+            val = yield from _stream(atype)
+        localns[attr] = val
+        setattr(bcls, attr, val)
+
+
+def _compile_parser(cls, view=False, lazy=False, probe=None, skip=()):
+    '''generate the parsing function of a blockclass
+
+    annotations which do not refer to earlier fields are evaluated
+    once, here, and their types are bound to the generated function.
+    the others are inlined in the function body where earlier fields
+    are plain local variables. for example
+
+    .. code-block:: python
+
+        @blockclass
+        class SubBlock:
+            header: SubBlockHeader
+            data:   ubyte * header.size
+
+    becomes (roughly)
+
+    .. code-block:: python
+
+        def parse(__self, __buf, __offset=0):
+            __off = __offset
+            header = __T_header.from_buffer_copy(__buf, __off)
+            __off += 1
+            __self.header = header
+            data, __n = __read((ubyte * header.size), __buf, __off)
+            __off += __n
+            __self.data = data
+            return __off - __offset
+
+    the function is created with the class's module as globals so
+    annotations resolve names exactly like the interpreted parser.
+
+    with `view` set to ``'rw'`` ctypes fields alias the buffer
+    instead of copying it (see :func:`structclasses.view`). with
+    ``'ro'`` the buffer is read-only and cannot be aliased: they are
+    read-only copies.
+
+    with `lazy` set, fields no later annotation refers to are not
+    decoded (see `_defer`): their offset and type are recorded in
+    the instance's ``_blocklazy_`` for `_decode` to use later. with
+    `lazy` set to ``'measure'`` they are skipped altogether: the
+    parser only finds out the size of the block (see `_measure`).
+
+    with a `probe` (see :mod:`formats.profiling`) every segment and
+    the whole block are timed, and annotations apart from the rest.
+
+    fields of a type in `skip`, or in the class's own skipped types,
+    are measured and deferred like lazy fields. the types of static
+    fields are known here, the others are looked up in `skip` when
+    they are parsed. nested values are parsed with the same `skip`.
+    without any skipped type the function is the same as without
+    `skip`.
+    '''
+
+    layout = _layout(cls)
+    needed = layout.needed
+
+    skip = frozenset(skip) | cls.__dict__.get('_blockskip_', frozenset())
+    skipped = {
+        field.attr for field in layout.fields
+        if field.attr not in needed
+        and (field.atype is None or field.atype in skip)
+    } if skip else set()
+
+    # the fields handed out by runs would not be read-only: in that
+    # mode fields are read one by one
+    segments = layout.segments
+    if view == 'ro':
+        segments = layout.fields
+
+    copy = 'from_buffer' if view == 'rw' else 'from_buffer_copy'
+    consts = {
+        '__read': _read,
+        '__readfrom': readfrom,
+        '__defer': _defer,
+        '__measure': _measure,
+        '__pending': _pending,
+        '__forget': _forget,
+        '__view': view,
+        # the fields annotations refer to must be complete
+        '__lazy': bool(lazy),
+        '__skip': skip,
+        **_annotationns,
+    }
+    lines = ['__off = __offset']
+    if lazy is True or skipped:
+        lines.append('__deferred = {}')
+
+    # nested values are parsed with the same skipped types
+    extra = ', __skip' if skip else ''
+
+    def defer(attr, atype, offset='__off'):
+        lines.append(f'__deferred[{attr!r}] = (__buf, {offset}, {atype}, __view)')
+
+    mark, timed, evaluate = _probe_lines(cls, 'read', probe, lines, consts)
+    for i, segment in enumerate(segments):
+        mark(segment)
+        if lazy == 'measure' and isinstance(segment, _Run) and \
+                not any(field.attr in needed for field in segment.fields):
+            lines.append(f'__off += {ctypes.sizeof(segment.atype)}')
+            continue
+
+        if lazy == 'measure' and not isinstance(segment, _Run) and \
+                segment.attr not in needed:
+            attr, source, atype = segment
+            if _fixed(atype):
+                lines.append(f'__off += {ctypes.sizeof(atype)}')
+                continue
+            if atype is None:
+                atype = evaluate(source)
+            else:
+                consts[f'__T_{attr}'] = atype
+                atype = f'__T_{attr}'
+            lines.append(f'__off += __measure({atype}, __buf, __off, __view)')
+            continue
+
+        if lazy != 'measure' and not isinstance(segment, _Run) and \
+                segment.attr in skipped and segment.atype is not None:
+            # skipped whatever the data
+            attr, source, atype = segment
+            consts[f'__T_{attr}'] = atype
+            defer(attr, f'__T_{attr}')
+            lines.append(f'__off += __measure(__T_{attr}, __buf, __off, __view)')
+            continue
+
+        if lazy != 'measure' and not isinstance(segment, _Run) and \
+                segment.attr in skipped:
+            # skipped depending on the type, and lazy or not otherwise
+            attr, source, _ = segment
+            lines.append(f'__t = ({source})')
+            timed()
+            lines.append('if __t in __skip:')
+            lines.append(f'    __deferred[{attr!r}] = (__buf, __off, __t, __view)')
+            lines.append('    __off += __measure(__t, __buf, __off, __view)')
+            lines.append('else:')
+            if lazy:
+                lines.append((
+                    '    __val, __n = '
+                    '__defer(__t, __buf, __off, __view, __skip)'
+                ))
+                lines.append('    if __val is __pending:')
+                lines.append((
+                    f'        __deferred[{attr!r}] = '
+                    f'(__buf, __off, __t, __view)'
+                ))
+                lines.append('    else:')
+                lines.append(f'        __self.{attr} = __val')
+            else:
+                lines.append((
+                    '    __val, __n = '
+                    '__read(__t, __buf, __off, __view, __lazy, __skip)'
+                ))
+                lines.append(f'    __self.{attr} = __val')
+            lines.append('    __off += __n')
+            continue
+
+        if lazy and isinstance(segment, _Run) and \
+                not any(field.attr in needed for field in segment.fields):
+            # nothing to decode in the run
+            for field in segment.fields:
+                consts[f'__T_{field.attr}'] = field.atype
+                offset = getattr(segment.atype, field.attr).offset
+                defer(field.attr, f'__T_{field.attr}', f'__off + {offset}')
+            lines.append(f'__off += {ctypes.sizeof(segment.atype)}')
+            continue
+
+        if lazy and not isinstance(segment, _Run) and \
+                segment.attr not in needed:
+            attr, source, atype = segment
+            if _fixed(atype):
+                consts[f'__T_{attr}'] = atype
+                defer(attr, f'__T_{attr}')
+                lines.append(f'__off += {ctypes.sizeof(atype)}')
+                continue
+
+            if atype is None:
+                lines.append(f'__t = ({source})')
+                timed()
+            else:
+                consts[f'__T_{attr}'] = atype
+                lines.append(f'__t = __T_{attr}')
+            lines.append(f'__val, __n = __defer(__t, __buf, __off, __view{extra})')
+            lines.append('if __val is __pending:')
+            lines.append(f'    __deferred[{attr!r}] = (__buf, __off, __t, __view)')
+            lines.append('else:')
+            lines.append(f'    __self.{attr} = __val')
+            lines.append('__off += __n')
+            continue
+
+        if isinstance(segment, _Run):
+            # a single copy for the whole run. the fields are views
+            # on the run structure, which they keep alive
+            consts[f'__R{i}'] = segment.atype
+            lines.append(f'__run = __R{i}.{copy}(__buf, __off)')
+            lines.append(f'__off += {ctypes.sizeof(segment.atype)}')
+            for field in segment.fields:
+                if field.attr in needed:
+                    lines.append(f'{field.attr} = __run.{field.attr}')
+                    lines.append(f'__self.{field.attr} = {field.attr}')
+                else:
+                    lines.append(f'__self.{field.attr} = __run.{field.attr}')
+            continue
+
+        attr, source, atype = segment
+        target = attr if attr in needed else '__val'
+        if atype is None:
+            # dependent type: inline the expression
+            lines.append((
+                f'{target}, __n = __read({evaluate(source)}, '
+                f'__buf, __off, __view, __lazy{extra})'
+            ))
+            lines.append('__off += __n')
+        elif _fixed(atype):
+            # python values do not alias anything, always copy them
+            if issubclass(atype, _SimpleCData):
+                read = f'__T_{attr}.from_buffer_copy(__buf, __off).value'
+            else:
+                read = f'__T_{attr}.{copy}(__buf, __off)'
+                if view == 'ro':
+                    atype = stc._readonly_type(atype)
+            consts[f'__T_{attr}'] = atype
+            lines.append(f'{target} = {read}')
+            lines.append(f'__off += {ctypes.sizeof(atype)}')
+        else:
+            consts[f'__T_{attr}'] = atype
+            lines.append(f'{target} = __T_{attr}()')
+            lines.append((
+                f'__off += __readfrom({target}, __buf, __off, '
+                f'view=__view, lazy=__lazy{extra and ", skip=__skip"})'
+            ))
+        lines.append(f'__self.{attr} = {target}')
+    mark(None)
+
+    if lazy is True:
+        lines.append('__forget(__self, __deferred)')
+        lines.append('__self._blocklazy_ = __deferred')
+    elif skipped:
+        # most of the time nothing was skipped
+        lines.append('if __deferred:')
+        lines.append('    __forget(__self, __deferred)')
+        lines.append('    __self._blocklazy_ = __deferred')
+    lines.append('return __off - __offset')
+
+    return _make_fn(cls, 'parse', '__self, __buf, __offset=0', lines, consts)
+
+
+def _probe_lines(cls, op, probe, lines, consts):
+    # code generation helpers for instrumented functions. `mark`
+    # starts timing a segment, after recording the previous one, and
+    # `mark(None)` records the last one and the whole block. `timed`
+    # notes the end of an annotation's evaluation and `evaluate`
+    # gives the expression of a dependent type
+    if probe is None:
+        return (lambda segment: None, lambda indent='': None,
+                lambda source: f'({source})')
+
+    consts.update({
+        '__clock': probe.clock,
+        '__mem': probe.mem,
+        '__record': probe.record,
+        '__K': (op, cls, None),
+    })
+    lines.append('__s0 = __clock()')
+    lines.append('__sm = __mem()')
+    keys = []
+
+    def mark(segment):
+        if keys:
+            lines.append((
+                f'__record({keys[-1]}, __off - __o0, __t0, __te, '
+                f'__clock(), __m0)'
+            ))
+        if segment is None:
+            lines.append((
+                '__record(__K, __off - __offset, __s0, __s0, '
+                '__clock(), __sm)'
+            ))
+            return
+        if isinstance(segment, _Run):
+            name = '+'.join(field.attr for field in segment.fields)
+        else:
+            name = segment.attr
+        key = f'__K{len(keys)}'
+        consts[key] = (op, cls, name)
+        keys.append(key)
+        lines.append('__o0 = __off')
+        lines.append('__m0 = __mem()')
+        lines.append('__t0 = __te = __clock()')
+
+    def timed(indent=''):
+        lines.append(f'{indent}__te = __clock()')
+
+    def evaluate(source):
+        lines.append(f'__t = ({source})')
+        timed()
+        return '__t'
+
+    return mark, timed, evaluate
+
+
+def _box(atype, val):
+    # simple values are stored as python values: get back a ctype
+    return val if isinstance(val, _CData) else atype(val)
+
+
+def _untyped(val):
+    return not isinstance(val, (*_Leaf, _BlockBase)) and \
+        not hasattr(type(val), '_blockfields_')
+
+
+def _compile_writer(cls, probe=None):
+    '''generate the serializing function of a blockclass
+
+    the counterpart of :func:`_compile_parser`. runs of consecutive
+    fields with a static ctypes type are gathered with a single
+    ``bytes.join`` (ctypes objects support the buffer protocol) and
+    written with a single slice assignment, which spares the
+    ``memoryview(...).cast('B')`` of every field. the output is the
+    same as the interpreted :func:`writeinto`. `probe` is the same
+    as for parsers.
+    '''
+
+    layout = _layout(cls)
+    needed = layout.needed
+
+    consts = {
+        '__join': b''.join,
+        '__box': _box,
+        '__untyped': _untyped,
+        '__writeinto': writeinto,
+        **_annotationns,
+    }
+    lines = ['__off = __offset']
+    mark, timed, _ = _probe_lines(cls, 'write', probe, lines, consts)
+
+    run, names = [], []
+    def flush():
+        if not run:
+            return
+        mark(_Run(names, None))
+        items = ''.join(f'{item}, ' for item in run)
+        lines.append(f'__chunk = __join(({items}))')
+        lines.append('__end = __off + len(__chunk)')
+        lines.append('__buf[__off:__end] = __chunk')
+        lines.append('__off = __end')
+        run.clear()
+        names.clear()
+
+    for attr, source, atype in layout.fields:
+        value = f'__self.{attr}'
+        if attr in needed:
+            lines.append(f'{attr} = {value}')
+            value = attr
+
+        if isinstance(atype, type) and issubclass(atype, _CData):
+            if issubclass(atype, _SimpleCData):
+                consts[f'__T_{attr}'] = atype
+                value = f'__box(__T_{attr}, {value})'
+            run.append(value)
+            names.append(_Field(attr, source, atype))
+            continue
+
+        flush()
+        mark(_Field(attr, source, atype))
+        if atype is None:
+            lines.append(f'__val = {value}')
+            lines.append(f'if __untyped(__val):')
+            lines.append(f'    __val = ({source})(__val)')
+            timed('    ')
+            value = '__val'
+        lines.append(f'__off += __writeinto({value}, __buf, __off)')
+
+    flush()
+    mark(None)
+    lines.append('return __off - __offset')
+
+    return _make_fn(cls, 'write', '__self, __buf, __offset=0', lines, consts)
+
+
+def _field_size(atype):
+    # the size of every value of the type `atype`, or None
+    if isinstance(atype, type) and issubclass(atype, _Leaf):
+        return _leaf_size(atype)
+    if hasattr(atype, '_blockfields_'):
+        return _static_size(atype)
+    return None
+
+
+def _compile_sizer(cls):
+    '''generate the function computing the serialized size of a
+    blockclass instance (see :func:`packed_size`)
+
+    the sizes of fields of static size are summed once and for all,
+    here. only the other fields are looked at, untyped values going
+    through their annotation like in :func:`_compile_writer`.
+    '''
+
+    layout = _layout(cls)
+    needed = layout.needed
+
+    consts = {
+        '__size': packed_size,
+        '__untyped': _untyped,
+        **_annotationns,
+    }
+    static, lines = 0, []
+    for attr, source, atype in layout.fields:
+        value = f'__self.{attr}'
+        if attr in needed:
+            lines.append(f'{attr} = {value}')
+            value = attr
+
+        size = _field_size(atype)
+        if size is not None:
+            static += size
+            continue
+
+        if atype is None:
+            lines.append(f'__val = {value}')
+            lines.append(f'if __untyped(__val):')
+            lines.append(f'    __val = ({source})(__val)')
+            value = '__val'
+        lines.append(f'__n += __size({value})')
+
+    lines.insert(0, f'__n = {static}')
+    lines.append('return __n')
+
+    return _make_fn(cls, 'size', '__self', lines, consts)
+
+
+def _sizer(cls):
+    try:
+        return cls.__dict__['_blocksizer_']
+    except KeyError:
+        size = cls._blocksizer_ = _compile_sizer(cls)
+        return size
+
+
+def _parser(cls, view=False, lazy=False, skip=()):
+    # generated lazily: at decoration time the module may not be
+    # completely evaluated and annotations could refer to names
+    # that do not exist yet. there is one parser per mode and set
+    # of skipped types
+    parsers = cls.__dict__.get('_blockparsers_')
+    if parsers is None:
+        parsers = cls._blockparsers_ = {}
+    try:
+        return parsers[view, lazy, skip]
+    except KeyError:
+        parse = _compile_parser(cls, view, lazy, skip=skip)
+        parsers[view, lazy, skip] = parse
+        return parse
+
+
+def _writer(cls):
+    try:
+        return cls.__dict__['_blockwrite_']
+    except KeyError:
+        write = cls._blockwrite_ = _compile_writer(cls)
+        return write
+
+
+def readfrom(bcls, buf, offset=0, view=False, lazy=False, skip=()):
+    '''parse `buf` from `offset` into the blockclass instance `bcls`
+
+    with `view` set, the ctypes objects the parser creates alias
+    `buf` rather than copying from it (see
+    :func:`structclasses.view` for lifetime and aliasing rules).
+    when `buf` is read-only they cannot alias it: they are
+    read-only copies instead. `bcls` itself and simple
+    values such as ``ubyte`` fields are still filled by copy.
+
+    with `lazy` set, only the fields later annotations refer to are
+    decoded (``header`` in ``data: ubyte * header.size``). the others
+    are measured, not decoded: their offset and type are recorded and
+    they are decoded, lazily as well, on first access. repeats are
+    measured by hopping from length prefix to length prefix. `buf`
+    is kept alive by the instance and must not change until every
+    field has been decoded. the interpreted parser is never lazy.
+
+    fields whose type is in `skip`, at any depth, are not parsed at
+    all. they are measured like lazy fields, by following length
+    prefixes only, and no object is made for their content: with
+
+    .. code-block:: python
+
+        readfrom(gif, buf, skip={CommentExtensionBlock, subblocks})
+
+    comments and the sub-blocks of images are only hopped over. a
+    skipped field is deferred like a lazy one: it is decoded on
+    first access, with the same requirements on `buf`. the fields
+    later annotations refer to are never skipped. blockclasses may
+    also skip types on every parse (see :func:`blockclass`). the
+    interpreted parser never skips.
+
+    :param bcls: a blockclass instance or a ctypes object
+    :param buf: an object supporting the buffer protocol
+    :param offset: where to start parsing in `buf`
+    :param view: whether to alias `buf`
+    :param lazy: whether to defer decoding fields
+    :param skip: types to skip
+    :returns: the number of bytes parsed
+    '''
+
+    # recursion leaf
+    if isinstance(bcls, _Leaf):
+        return stc.readfrom(bcls, buf, offset)
+
+    # internally the view mode is 'rw' or 'ro' once the buffer has
+    # been looked at. ctypes cannot alias read-only buffers
+    if view is True:
+        view = 'ro' if memoryview(buf).readonly else 'rw'
+
+    if skip:
+        skip = frozenset(skip)
+
+    if isinstance(bcls, _BlockBase):
+        return bcls._frombuffer(buf, offset=offset, view=view, lazy=lazy,
+                                skip=skip)
+
+    if interpreted:
+        return _interpret(bcls, buf, offset=offset, view=view)
+
+    return _parser(type(bcls), view, lazy, skip)(bcls, buf, offset)
+
+
+def _interpret(bcls, buf, offset=0, view=False):
     # the parsing main loop dances with the type evaluation
     # coroutine to produce the final object
 
     def _get_types(bcls):
         globalns = sys.modules[bcls.__module__].__dict__
-        localns = bcls.__dict__
+        localns = dict(_annotationns)
 
         for attr, code in bcls.__annotations__.items():
             atype = eval(code, globalns, localns)
-            val = yield attr, atype
+            val = localns[attr] = yield attr, atype
             setattr(bcls, attr, val)
 
-    # recursion leaf
-    if isinstance(bcls, _CData):
-        return stc.readfrom(bcls, buf, offset)
-
-    if isinstance(bcls, _BlockBase):
-        return bcls._frombuffer(buf, offset=offset)
-
     off = offset
     types = _get_types(bcls)
     val = None
@@ -119,19 +1444,318 @@ def readfrom(bcls, buf, offset=0):
         except StopIteration:
             break
 
-        val = atype()
-        off += readfrom(val, buf, offset=off)
+        val, size = _read(atype, buf, off, view)
+        off += size
     return off - offset
 
 
 def writeinto(bcls, buf, offset=0):
-    off = offset
-    if isinstance(bcls, _CData):
-        return stc.writeinto(bcls, buf, off)
+    if isinstance(bcls, _Leaf):
+        return stc.writeinto(bcls, buf, offset)
     
     if isinstance(bcls, _BlockBase):
-        return bcls._tobuffer(buf, off)
+        return bcls._tobuffer(buf, offset)
+
+    if interpreted:
+        return _interpret_write(bcls, buf, offset=offset)
 
-    for attr in bcls.__annotations__:
-        off += writeinto(getattr(bcls, attr), buf, off)
+    return _writer(type(bcls))(bcls, buf, offset)
+
+
+def _interpret_write(bcls, buf, offset=0):
+    off = offset
+    globalns = sys.modules[bcls.__module__].__dict__
+    localns = dict(_annotationns)
+    for attr, code in bcls.__annotations__.items():
+        val = localns[attr] = getattr(bcls, attr)
+
+        # simple values lost their type when they were read
+        if _untyped(val):
+            val = eval(code, globalns, localns)(val)
+        off += writeinto(val, buf, off)
     return off - offset
+
+
+def packed_size(bcls):
+    '''the number of bytes :func:`writeinto` writes for `bcls`
+
+    the sizes of fields with a static size are computed once per
+    class. only the sizes of the others, such as ``data`` in
+    ``data: ubyte * header.size``, are found out for every instance,
+    from their values: like :func:`writeinto`, this does not check
+    that ``data`` is ``header.size`` bytes long.
+
+    :param bcls: a blockclass instance or a ctypes object
+    :returns: the size in bytes
+    '''
+
+    if isinstance(bcls, _Leaf):
+        return _leaf_size(type(bcls))
+    if isinstance(bcls, _BlockBase):
+        return bcls._packedsize()
+    return _sizer(type(bcls))(bcls)
+
+
+def tobytes(bcls):
+    '''serialize `bcls` in a new bytearray, allocated once
+
+    :param bcls: a blockclass instance or a ctypes object
+    :returns: a bytearray of :func:`packed_size` bytes
+    :raises BlockClassError: when `bcls` writes more or less than its
+        size, which only a broken ``_BlockBase`` does
+    '''
+
+    size = packed_size(bcls)
+    out = bytearray(size)
+    if writeinto(bcls, out) != size or len(out) != size:
+        raise BlockClassError((
+            f'{type(bcls).__name__} did not write the {size} bytes '
+            f'of its size'
+        ))
+    return out
+
+
+# values of at least this many bytes are not copied by `dump`
+_GATHER = 512
+
+try:
+    _IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = 16
+
+
+class _Gather:
+    # the bounded write buffer of `dump`. small values are copied in
+    # it and large ones are kept as views, up to `bufsize` bytes
+    # which are then written in one go
+
+    def __init__(self, fileobj, bufsize):
+        self.file = fileobj
+        self.buf = bytearray(bufsize)
+        self.bufsize = bufsize
+        self.pos = self.mark = 0
+        self.pieces = []  # views, and (start, end) slices of `buf`
+        self.pending = 0
+        self.written = 0
+
+        # gathered writes bypass buffered files' own bookkeeping:
+        # they are only for unbuffered ones
+        self.fd = None
+        if hasattr(os, 'writev') and isinstance(fileobj, io.FileIO):
+            self.fd = fileobj.fileno()
+
+    def write(self, bcls, size):
+        # a value of a known size, written in place
+        if self.pos + size > self.bufsize:
+            self.flush()
+        writeinto(bcls, self.buf, self.pos)
+        self.pos += size
+        self.pending += size
+
+    def put(self, view):
+        # a byte memoryview
+        size = len(view)
+        if size < _GATHER and size <= self.bufsize:
+            if self.pos + size > self.bufsize:
+                self.flush()
+            self.buf[self.pos:self.pos + size] = view
+            self.pos += size
+            self.pending += size
+            return
+
+        if self.pos > self.mark:
+            self.pieces.append((self.mark, self.pos))
+            self.mark = self.pos
+        self.pieces.append(view)
+        self.pending += size
+        if self.pending >= self.bufsize or len(self.pieces) >= _IOV_MAX - 1:
+            self.flush()
+
+    def flush(self):
+        if self.pos > self.mark:
+            self.pieces.append((self.mark, self.pos))
+        buf = memoryview(self.buf)
+        views = [buf[piece[0]:piece[1]] if isinstance(piece, tuple)
+                 else piece for piece in self.pieces]
+        if self.fd is not None:
+            self._writev(views)
+        else:
+            for view in views:
+                while view:
+                    n = self.file.write(view)
+                    if n is None or n >= len(view):
+                        break
+                    view = view[n:]
+        del views, buf
+
+        self.written += self.pending
+        self.pieces.clear()
+        self.pos = self.mark = self.pending = 0
+
+    def _writev(self, views):
+        # writes may be partial
+        first = 0
+        while first < len(views):
+            n = os.writev(self.fd, views[first:first + _IOV_MAX])
+            while first < len(views) and n >= len(views[first]):
+                n -= len(views[first])
+                first += 1
+            if n:
+                views[first] = views[first][n:]
+
+
+def _fields(bcls):
+    # the values `writeinto` writes for the fields of a blockclass
+    # instance, simple and untyped ones turned into ctypes objects
+    cls = type(bcls)
+    globalns = sys.modules[cls.__module__].__dict__
+    localns = dict(_annotationns)
+    for attr, source, atype in _layout(cls).fields:
+        val = localns[attr] = getattr(bcls, attr)
+        if atype is None:
+            if _untyped(val):
+                val = eval(source, globalns, localns)(val)
+        elif issubclass(atype, _SimpleCData):
+            val = _box(atype, val)
+        yield val
+
+
+def _dump(bcls, out):
+    if isinstance(bcls, _CData):
+        out.put(memoryview(bcls).cast('B'))
+    elif isinstance(bcls, stc._Record):
+        out.put(bytes(bcls))
+    elif isinstance(bcls, _BlockBase):
+        bcls._dump(out)
+    else:
+        size = _static_size(type(bcls))
+        if size is not None and size <= out.bufsize:
+            out.write(bcls, size)
+            return
+        for val in _fields(bcls):
+            _dump(val, out)
+
+
+def dump(bcls, fileobj, bufsize=1 << 16):
+    '''serialize `bcls` to a binary file object
+
+    nothing like the whole output is ever in memory: small values
+    are copied in a buffer of `bufsize` bytes and large ones, such as
+    sub-block chains and color tables, are not copied at all. both
+    are written in the order of the fields when there are `bufsize`
+    bytes of them. when `fileobj` is an unbuffered file (opened with
+    ``buffering=0``) they are written with a single `os.writev` call,
+    otherwise with a call to its ``write`` method each.
+
+    .. code-block:: python
+
+        with open('out.gif', 'wb', buffering=0) as file:
+            dump(gif, file)
+
+    :param bcls: a blockclass instance or a ctypes object
+    :param fileobj: a binary file object
+    :param bufsize: the size of the buffer
+    :returns: the number of bytes written
+    '''
+
+    out = _Gather(fileobj, bufsize)
+    _dump(bcls, out)
+    out.flush()
+    return out.written
+
+
+def _map(path, access=mmap.ACCESS_READ):
+    # a mapping of the whole file, read-only by default. offsets and
+    # sizes are python ints: on 64 bit platforms files larger than
+    # 4GB are fine, on 32 bit ones they cannot be mapped at all
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size > sys.maxsize:
+            raise BlockClassError(f'{path} is too large to be mapped')
+        if size == 0:
+            # mmap refuses empty files
+            return b''
+        # the mapping outlives the file descriptor
+        return mmap.mmap(file.fileno(), 0, access=access)
+
+
+def _drop_frames(error):
+    # the frames of a failed parse, kept alive by the traceback, hold
+    # memoryviews of the buffer: a mapping could not be closed until
+    # the error is gone. their locals are dropped, the error chained
+    # to `error` included
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        traceback.clear_frames(error.__traceback__)
+        error = error.__context__
+
+
+def parse_file(path, bcls, offset=0, view=True):
+    '''parse a file through a memory mapping
+
+    the file is not read in memory: only the pages the parser
+    touches are. with `view` set (the default) ctypes fields are
+    views of the mapping, which stays alive for as long as any of
+    them does and is unmapped after that. the mapping is copy on
+    write: assigning to a field changes a private copy of its page,
+    never the file. without `view` the fields are copies and the
+    mapping is closed before returning.
+
+    .. code-block:: python
+
+        gif = parse_file('huge.gif', GIF)
+        gif.LSD.width
+
+    :param path: the file to parse
+    :param bcls: the blockclass (or ctypes type) to parse
+    :param offset: where to start in the file
+    :param view: whether fields alias the mapping
+    :returns: an instance of `bcls`
+    '''
+
+    if not view:
+        with open_mapped(path, bcls, offset=offset) as obj:
+            return obj
+
+    mapping = _map(path, mmap.ACCESS_COPY)
+    if issubclass(bcls, _CData):
+        return stc.view(bcls, mapping, offset=offset)
+
+    obj = bcls()
+    readfrom(obj, mapping, offset=offset, view=True)
+    return obj
+
+
+@contextlib.contextmanager
+def open_mapped(path, bcls, offset=0):
+    '''parse a file through a memory mapping, closed on exit
+
+    like :func:`parse_file` without views: the parsed object holds
+    copies of the bytes it needs so the mapping is closed when the
+    ``with`` block exits, whatever happens to the object.
+
+    .. code-block:: python
+
+        with open_mapped('huge.gif', GIF) as gif:
+            frames = list(gif)
+
+    :param path: the file to parse
+    :param bcls: the blockclass (or ctypes type) to parse
+    :param offset: where to start in the file
+    :returns: a context manager giving an instance of `bcls`
+    '''
+
+    mapping = _map(path)
+    try:
+        obj = bcls()
+        try:
+            readfrom(obj, mapping, offset=offset)
+        except Exception as error:
+            obj = None
+            _drop_frames(error)
+            raise
+        yield obj
+    finally:
+        if isinstance(mapping, mmap.mmap):
+            mapping.close()
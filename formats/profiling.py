@@ -0,0 +1,216 @@
+'''where parsing and serializing time goes
+
+.. code-block:: python
+
+    from formats.profiling import Profile
+
+    with Profile() as prof:
+        readfrom(gif, buf)
+    print(prof.report())
+    prof.stats()['read']['giraffes.gif.Image']['fields']['data']
+
+while a profile is active, blockclasses are parsed and written by
+instrumented versions of their generated functions, and
+:func:`structclasses.readfrom` and :func:`structclasses.writeinto`
+are wrapped. nothing is checked when no profile is active: the
+instrumented functions replace the regular ones for the duration of
+the ``with`` block only, and the regular ones are untouched.
+
+for every class and every field the profile records the number of
+calls, the bytes parsed or written and the time spent, nested
+blocks included. the time of fields whose annotation refers to
+earlier fields is split between evaluating the annotation and the
+rest (reading or writing the value, which is mostly copying). runs
+of consecutive fixed size fields are read with a single copy and
+are reported as one field named ``'first+second+...'``.
+
+with `memory` set, ``tracemalloc`` also records the memory every
+field allocates and keeps (its net allocation). this slows
+everything down a lot more.
+
+the wrappers of :mod:`structclasses` replace the module's functions:
+names imported with ``from formats.structclasses import readfrom``
+before the profile started are not instrumented. the interpreted
+parser (see :data:`blockclasses.interpreted`) and the streaming
+parsers are not instrumented either.
+'''
+
+import time
+import tracemalloc
+
+from . import blockclasses as bc
+from . import structclasses as stc
+from .exceptions import FormatsError
+
+
+# the active profile, there can be only one
+_active = None
+
+
+def _name(cls):
+    return f'{cls.__module__}.{cls.__qualname__}'
+
+
+class Profile:
+    '''a context manager recording the cost of every class and field
+
+    :param memory: whether to record allocations with ``tracemalloc``
+    '''
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.clock = time.perf_counter
+        self.mem = self._traced if memory else int
+        # (op, cls, field) -> [calls, bytes, time, eval, allocated]
+        self._stats = {}
+        self._parsers = {}
+        self._writers = {}
+        self._saved = None
+        self._tracing = False
+
+    @staticmethod
+    def _traced():
+        return tracemalloc.get_traced_memory()[0]
+
+    def record(self, key, nbytes, t0, te, t1, m0):
+        # called by the instrumented functions, see `bc._probe_lines`
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = [0, 0, 0.0, 0.0, 0]
+        stats[0] += 1
+        stats[1] += nbytes
+        stats[2] += t1 - t0
+        stats[3] += te - t0
+        stats[4] += self.mem() - m0
+
+    def _parser(self, cls, view=False, lazy=False, skip=()):
+        try:
+            return self._parsers[cls, view, lazy, skip]
+        except KeyError:
+            parse = bc._compile_parser(cls, view, lazy, self, skip)
+            self._parsers[cls, view, lazy, skip] = parse
+            return parse
+
+    def _writer(self, cls):
+        try:
+            return self._writers[cls]
+        except KeyError:
+            write = self._writers[cls] = bc._compile_writer(cls, probe=self)
+            return write
+
+    def _wrap(self, op, func):
+        clock, mem, record = self.clock, self.mem, self.record
+        def wrapper(struct, buffer, offset=0):
+            m0 = mem()
+            t0 = clock()
+            nbytes = func(struct, buffer, offset)
+            record((op, type(struct), None), nbytes, t0, t0, clock(), m0)
+            return nbytes
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def __enter__(self):
+        global _active
+        if _active is not None:
+            raise FormatsError('a profile is already active')
+        _active = self
+
+        self._saved = (bc._parser, bc._writer, stc.readfrom, stc.writeinto)
+        bc._parser, bc._writer = self._parser, self._writer
+        stc.readfrom = self._wrap('read', stc.readfrom)
+        stc.writeinto = self._wrap('write', stc.writeinto)
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        bc._parser, bc._writer, stc.readfrom, stc.writeinto = self._saved
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        _active = None
+
+    def reset(self):
+        '''forget what was recorded so far'''
+        self._stats.clear()
+
+    def stats(self):
+        '''what was recorded, as a dict of plain python values
+
+        .. code-block:: python
+
+            {'read': {'giraffes.gif.Image': {
+                'calls': 2, 'bytes': 1200, 'time': 0.0001,
+                'eval': 0.0, 'copy': 0.0001, 'allocated': 0,
+                'fields': {'header': {...}, 'LCT': {...}, ...},
+            }}, 'write': {...}}
+
+        times are in seconds and `allocated` in bytes. the `eval`
+        time of a class is the one of its fields.
+        '''
+
+        out = {'read': {}, 'write': {}}
+        for (op, cls, field), stats in self._stats.items():
+            calls, nbytes, elapsed, evaluated, allocated = stats
+            entry = {
+                'calls': calls,
+                'bytes': nbytes,
+                'time': elapsed,
+                'eval': evaluated,
+                'copy': elapsed - evaluated,
+                'allocated': allocated,
+            }
+            block = out[op].setdefault(_name(cls), {'fields': {}})
+            if field is None:
+                block.update(entry)
+            else:
+                block['fields'][field] = entry
+
+        for blocks in out.values():
+            for block in blocks.values():
+                if block['fields'] and 'time' in block:
+                    block['eval'] = sum(
+                        field['eval'] for field in block['fields'].values())
+                    block['copy'] = block['time'] - block['eval']
+        return out
+
+    def report(self, limit=None):
+        '''a table of the classes, most expensive first, each followed
+        by its fields
+
+        :param limit: the number of classes per operation, all of them
+            by default
+        '''
+
+        header = (f'{"":<40} {"calls":>8} {"MB":>8} {"ms":>9} '
+                  f'{"eval ms":>9} {"copy ms":>9} {"alloc kB":>9}')
+
+        def row(name, entry):
+            return (
+                f'{name:<40.40} {entry["calls"]:>8} '
+                f'{entry["bytes"] / 1e6:>8.2f} '
+                f'{entry["time"] * 1e3:>9.2f} {entry["eval"] * 1e3:>9.2f} '
+                f'{entry["copy"] * 1e3:>9.2f} '
+                f'{entry["allocated"] / 1e3:>9.1f}'
+            )
+
+        out = []
+        for op, blocks in self.stats().items():
+            if not blocks:
+                continue
+            out.append(f'{op:<40}' + header[40:])
+            ranked = sorted(blocks.items(),
+                            key=lambda item: -item[1].get('time', 0))
+            for name, block in ranked[:limit]:
+                if 'time' in block:
+                    out.append(row(name, block))
+                else:
+                    out.append(name)
+                fields = sorted(block['fields'].items(),
+                                key=lambda item: -item[1]['time'])
+                for field, entry in fields:
+                    out.append(row(f'  .{field}', entry))
+        return '\n'.join(out)
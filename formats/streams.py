@@ -0,0 +1,266 @@
+import asyncio
+
+from . import blockclasses as bc
+from .exceptions import BlockClassError
+
+
+class StreamParser:
+    '''a push parser for blockclasses
+
+    bytes are fed in chunks of any size as they arrive. the parser
+    suspends when it runs out of data in the middle of a block and
+    resumes when more is fed. the elements of top-level
+    :func:`blockclasses.repeat` fields (for example each ``Block`` of
+    ``GIF.blocks``) are handed out as soon as they are complete.
+
+    .. code-block:: python
+
+        parser = StreamParser(GIF)
+        for chunk in chunks:
+            for block in parser.feed(chunk):
+                ...
+        for block in parser.close():
+            ...
+        gif = parser.result
+
+    elements are parsed with the generated parsers once they are
+    completely buffered. an element larger than `maxbuffer` is
+    parsed field by field instead so that only about one field at a
+    time is buffered.
+
+    :param bcls: the blockclass to parse
+    :param maxbuffer: the largest element to buffer completely
+    :param keep: whether top-level repeat fields keep the elements
+        they handed out. without it a long stream is parsed in
+        bounded memory
+    '''
+
+    def __init__(self, bcls, maxbuffer=1 << 20, keep=True):
+        self.result = bcls()
+        self.maxbuffer = maxbuffer
+        self.done = False
+
+        self._buf = bytearray()
+        self._pos = 0
+        self._parser = bc._stream_fields(self.result, emit=True, keep=keep)
+        self._send(None)
+
+    def _send(self, val):
+        try:
+            self._request = self._parser.send(val)
+        except StopIteration:
+            self.done = True
+
+    def _run(self, eof=False):
+        # answer the parser's requests for as long as possible
+        while not self.done:
+            request = self._request
+            available = len(self._buf) - self._pos
+
+            if type(request) is int:
+                if available < request:
+                    if eof:
+                        name = type(self.result).__name__
+                        raise BlockClassError((
+                            f'stream ended {request - available} bytes '
+                            f'short of a complete {name}'
+                        ))
+                    return
+                end = self._pos + request
+                data = self._buf[self._pos:end]
+                self._pos = end
+                self._send(data)
+
+            elif type(request) is bc._Peek:
+                if request.size > self.maxbuffer:
+                    self._send(None)
+                    continue
+                if available < request.size and not eof:
+                    return
+                with memoryview(self._buf) as whole:
+                    with whole[self._pos:] as buf:
+                        self._send((buf, eof))
+
+            elif type(request) is bc._Skip:
+                self._pos += request.size
+                self._send(None)
+
+            else:
+                self._send(None)
+                yield request.value
+
+    def _compact(self):
+        # forget consumed bytes, not too often
+        if self._pos > len(self._buf) // 2:
+            del self._buf[:self._pos]
+            self._pos = 0
+
+    def feed(self, data):
+        '''feed the next chunk of the stream
+
+        :param data: a bytes-like object
+        :returns: the list of the top-level elements completed
+        '''
+
+        if self.done and data:
+            raise BlockClassError('data after the end of the stream')
+        self._buf += data
+        elements = list(self._run())
+        self._compact()
+        return elements
+
+    def close(self):
+        '''signal the end of the stream
+
+        the parsed object is then :attr:`result`.
+
+        :returns: the list of the last top-level elements completed
+        :raises BlockClassError: if the stream ended too early
+        '''
+
+        elements = list(self._run(eof=True))
+        if not self.done:
+            raise BlockClassError((
+                f'stream ended before a complete '
+                f'{type(self.result).__name__}'
+            ))
+        return elements
+
+
+def iterparse(file, bcls, chunksize=1 << 16, maxbuffer=1 << 20, keep=True):
+    '''a pull parser for blockclasses over a file-like object
+
+    the elements of top-level repeat fields are yielded as they are
+    completed, see :class:`StreamParser`. `file` only needs a
+    ``read`` method: pipes and sockets (through ``makefile('rb')``)
+    work as well as files.
+
+    .. code-block:: python
+
+        with open('animated.gif', 'rb') as file:
+            for block in iterparse(file, GIF):
+                ...
+
+    :param file: an object with a ``read(size)`` method
+    :param bcls: the blockclass to parse
+    :param chunksize: how much to read at a time
+    :param maxbuffer: see :class:`StreamParser`
+    :param keep: see :class:`StreamParser`
+    :returns: a generator of elements whose return value is the
+        parsed object
+    '''
+
+    parser = StreamParser(bcls, maxbuffer=maxbuffer, keep=keep)
+    while not parser.done:
+        chunk = file.read(chunksize)
+        if not chunk:
+            break
+        yield from parser.feed(chunk)
+    yield from parser.close()
+    return parser.result
+
+
+async def _areadexactly(reader, size, chunksize):
+    # small reads in one go. large ones in pieces so that other tasks
+    # run in between, into a bytearray the parser can alias
+    if size <= chunksize:
+        return await reader.readexactly(size)
+
+    data = bytearray()
+    while len(data) < size:
+        data += await reader.readexactly(min(chunksize, size - len(data)))
+    return data
+
+
+class _AsyncParser:
+    # answers a streaming parser's requests from a StreamReader.
+    # nothing is peeked at: every field (or run of static fields)
+    # is awaited with `readexactly`
+
+    def __init__(self, bcls, reader, emit, keep, chunksize):
+        self.result = bcls
+        self.size = 0
+        self._reader = reader
+        self._chunksize = chunksize
+        self._parser = bc._stream_fields(bcls, emit=emit, keep=keep)
+        self._val = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            try:
+                request = self._parser.send(self._val)
+            except StopIteration:
+                raise StopAsyncIteration
+
+            self._val = None
+            if type(request) is int:
+                try:
+                    self._val = await _areadexactly(
+                        self._reader, request, self._chunksize)
+                except asyncio.IncompleteReadError as err:
+                    name = type(self.result).__name__
+                    raise BlockClassError((
+                        f'stream ended {request - len(err.partial)} '
+                        f'bytes short of a complete {name}'
+                    )) from err
+                self.size += request
+            elif type(request) is bc._Element:
+                return request.value
+            # a `_Peek` is answered with None: parse field by field
+
+
+async def areadfrom(bcls, reader, chunksize=1 << 16):
+    '''parse from an :class:`asyncio.StreamReader`
+
+    the asynchronous counterpart of :func:`blockclasses.readfrom`.
+    exactly the bytes each field needs are awaited, with a single
+    ``readexactly`` for runs of static fields. fields larger than
+    `chunksize` are read in pieces so that the event loop is never
+    blocked on one large copy.
+
+    .. code-block:: python
+
+        async def handle(reader, writer):
+            gif = GIF()
+            await areadfrom(gif, reader)
+
+    :param bcls: a blockclass instance
+    :param reader: the stream to parse
+    :param chunksize: the largest single read
+    :returns: the number of bytes parsed
+    :raises BlockClassError: if the stream ends too early
+    '''
+
+    parser = _AsyncParser(bcls, reader, False, True, chunksize)
+    async for _ in parser:
+        pass
+    return parser.size
+
+
+class aiterparse(_AsyncParser):
+    '''iterate asynchronously over the top-level elements of a stream
+
+    the asynchronous counterpart of :func:`iterparse`: the elements
+    of top-level repeat fields are yielded as soon as they have been
+    read. once the iteration is over the parsed object is
+    :attr:`result` and its size :attr:`size`.
+
+    .. code-block:: python
+
+        blocks = aiterparse(reader, GIF)
+        async for block in blocks:
+            ...
+        gif = blocks.result
+
+    :param reader: an :class:`asyncio.StreamReader`
+    :param bcls: the blockclass to parse
+    :param keep: see :class:`StreamParser`
+    :param chunksize: see :func:`areadfrom`
+    :raises BlockClassError: if the stream ends too early
+    '''
+
+    def __init__(self, reader, bcls, keep=True, chunksize=1 << 16):
+        super().__init__(bcls(), reader, True, keep, chunksize)
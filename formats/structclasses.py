@@ -2,9 +2,15 @@ from dataclasses import make_dataclass, inspect
 from typing import no_type_check_decorator
 from ctypes import (BigEndianStructure, LittleEndianStructure, Structure,
                     Union, sizeof)
+from struct import Struct, error as _StructError
+import functools
+import itertools
+import operator
 import ctypes
 import sys
 
+from .exceptions import StructClassError
+
 
 # _CData = ctypes.c_ubyte.__mro__[2]
 
@@ -105,12 +111,30 @@ class bitfield:
 
     bit ordering for bit fields in structs is implementation
     defined (i.e. it depends on the compiler), so this is
-    unsafe to use.
-    '''
+    unsafe to use. unless the structclass has a `bitorder`:
+
+    - ``bitorder='lsb'``: a run of bitfields of the same type fills
+      an integer of that type from its least significant bit. the
+      first bitfield is the lowest bits
+    - ``bitorder='msb'``: from its most significant bit
 
-    # maybe we should implement this in terms of masks
-    # instead of C bitfields: i hear that bit ordering is
-    # implementation defined which is a real issue
+    a bitfield that does not fit in what is left of the integer, or
+    of another type, starts a new one. the integer is a member of
+    its own named after its bitfields (``'tag|index|offset'``) and
+    the bitfields are properties shifting and masking it. their
+    values are unsigned. see :func:`extract_bits` for arrays.
+
+    .. doctest::
+
+        >>> @structclass(byteorder='>', bitorder='msb')
+        ... class phaddr32:
+        ...     tag:    bitfield[uint:23]
+        ...     index:  bitfield[uint:4]
+        ...     offset: bitfield[uint:5]
+        ...
+        >>> bytes(phaddr32(tag=1, index=1, offset=1))
+        b'\\x00\\x00\\x02!'
+    '''
 
     def __init__(self, atype, width):
         self.type = atype
@@ -162,7 +186,52 @@ class anonymous:
         self.type = type
 
 
-def _structclass_inner(cls=None, byteorder=None, union=False, pack=True):
+def _masked_bitfield(unit, shift, mask, signed=False):
+    # a bitfield of a `bitorder` structclass, in the member `unit`:
+    # its name or, when the bitfield has the same, its descriptor.
+    # bitfields of signed types are sign extended, like ctypes does
+    if isinstance(unit, str):
+        get = operator.attrgetter(unit)
+        put = lambda self, value: setattr(self, unit, value)
+    else:
+        get, put = unit.__get__, unit.__set__
+    clear = ~(mask << shift)
+    sign = mask + 1 >> 1
+
+    def getter(self):
+        return get(self) >> shift & mask
+
+    if signed:
+        def getter(self):
+            return ((get(self) >> shift & mask) ^ sign) - sign
+
+    def setter(self, value):
+        put(self, get(self) & clear | (value & mask) << shift)
+
+    return property(getter, setter)
+
+
+def _signed(field):
+    # whether a bitfield's values are signed
+    return _struct_code(field.type).islower()
+
+
+def _masked_init(base, names):
+    # ctypes assigns positional arguments to the members: with
+    # masked bitfields they are not the annotations
+    def __init__(self, *args, **kwargs):
+        if len(args) > len(names):
+            raise TypeError('too many initializers')
+        base.__init__(self)
+        for name, value in zip(names, args):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+    return __init__
+
+
+def _structclass_inner(cls=None, byteorder=None, union=False, pack=True,
+                       bitorder=None):
     '''create a :func:`dataclass make_dataclass`
     :class:`structure ctypes.Structure` from a user class.
 
@@ -171,8 +240,13 @@ def _structclass_inner(cls=None, byteorder=None, union=False, pack=True):
 
     :param cls: the class to be made into a structure
     :param byteorder: a string specifying the byte order
+    :param bitorder: None for C bitfields, or how masked bitfields
+        fill their integers: ``'lsb'`` or ``'msb'`` first
     '''
 
+    if bitorder not in (None, 'lsb', 'msb'):
+        raise StructClassError(f'unknown bit order {bitorder!r}')
+
     # copy the guts of the user class
     dct = dict(cls.__dict__)
     bases = list(cls.__bases__)
@@ -191,8 +265,27 @@ def _structclass_inner(cls=None, byteorder=None, union=False, pack=True):
     # declare structure fields
     _fields = []
     _anonymous = []
+    _bits = {}    # masked bitfield -> (its integer in _fields, shift, mask)
+    unit = None   # (index in _fields, bits, bits used) of the last one
     annot = _get_hints(cls)
     for attr, ctype in annot.items():
+        if isinstance(ctype, bitfield) and bitorder is not None:
+            size = 8 * sizeof(ctype.type)
+            if unit is None or unit[1] != size \
+                    or unit[2] + ctype.width > size:
+                unit = (len(_fields), size, 0)
+                _fields.append((None, ctype.type))
+            index, size, used = unit
+            name = _fields[index][0]
+            name = attr if name is None else f'{name}|{attr}'
+            _fields[index] = (name, ctype.type)
+
+            shift = size - used - ctype.width if bitorder == 'msb' else used
+            _bits[attr] = (index, shift, (1 << ctype.width) - 1)
+            unit = (index, size, used + ctype.width)
+            continue
+
+        unit = None
         field = (attr, ctype)
         if isinstance(ctype, bitfield):
             field = (attr, ctype.type, ctype.width)
@@ -209,12 +302,23 @@ def _structclass_inner(cls=None, byteorder=None, union=False, pack=True):
     dct['_fields_'] = _fields
     dct['__annotations__'] = annot
 
+    if _bits:
+        dct['_bitfields_'] = {}
+        for attr, (index, shift, mask) in _bits.items():
+            unit = _fields[index][0]
+            dct['_bitfields_'][attr] = (unit, shift, mask)
+            if unit != attr:
+                dct[attr] = _masked_bitfield(unit, shift, mask,
+                                             _signed(annot[attr]))
+        if '__init__' not in dct:
+            dct['__init__'] = _masked_init(which, list(annot))
+
     # necesarry so that dataclasses doesn't complain
     dct['__signature__'] = inspect.Signature()
     if qualname is not None:
         dct['__qualname__'] = qualname
 
-    return make_dataclass(
+    struct = make_dataclass(
         cls.__name__,
         list(annot.items()),
         bases=tuple(bases),
@@ -222,15 +326,239 @@ def _structclass_inner(cls=None, byteorder=None, union=False, pack=True):
         init=False,
     )
 
+    # bitfields alone in their integer have its name: they replace
+    # the member's descriptor, kept in `_members_`
+    for attr, (unit, shift, mask) in dct.get('_bitfields_', {}).items():
+        if unit == attr:
+            member = struct.__dict__[unit]
+            struct._members_ = {**getattr(struct, '_members_', {}),
+                                unit: member}
+            setattr(struct, attr, _masked_bitfield(member, shift, mask,
+                                                   _signed(annot[attr])))
+    return struct
+
+
+class _Record:
+    # the base of the `backend='struct'` structclasses
+    __slots__ = ()
+
+
+# struct codes of the ctypes integers, by size
+_INTEGERS = {1: 'b', 2: 'h', 4: 'i', 8: 'q'}
+
+
+def _struct_code(ctype):
+    # the struct code of a simple ctype, in standard sizes
+    code = getattr(ctype, '_type_', None)
+    if isinstance(code, str) and code in 'bBhHiIlLqQ':
+        integer = _INTEGERS[sizeof(ctype)]
+        return integer.upper() if code.isupper() else integer
+    if isinstance(code, str) and code in 'fd?c':
+        return code
+    raise StructClassError(f'{ctype} has no struct equivalent')
+
+
+def _structclass_struct(cls, byteorder=None, pack=True, bitorder=None):
+    '''create a `__slots__` class packed by a :class:`struct.Struct`
+
+    the fields are compiled into a single struct format, unpacked
+    straight into the slots. arrays of bytes are ``bytes``, other
+    arrays tuples. bitfields are slots too: shifted and masked out
+    of their integer when unpacked, and back in when packed, in
+    ctypes' bit order: from the least significant bit, or the most
+    significant one in big endian structures, or `bitorder`.
+    '''
+
+    if not pack:
+        raise StructClassError('the struct backend has no padding')
+    if bitorder not in (None, 'lsb', 'msb'):
+        raise StructClassError(f'unknown bit order {bitorder!r}')
+    prefix = byteorder or '='
+    msb = byteorder == '>' or byteorder is None and sys.byteorder == 'big'
+    if bitorder is not None:
+        msb = bitorder == 'msb'
+
+    annot = _get_hints(cls)
+    fmt = [prefix]
+    fields = []   # (name, default) of the constructor, the slots
+    reads = []    # the value of every field from the unpacked `v`
+    packed = []   # what is packed, from the fields
+    unit = None   # (size, bits used) of the last bitfield
+    pos = 0       # in `v`
+
+    for attr, ctype in annot.items():
+        if isinstance(ctype, bitfield):
+            size = 8 * sizeof(ctype.type)
+            if unit is not None and unit[0] != size and bitorder is None:
+                # compilers (and ctypes) overlap them in their own ways
+                raise StructClassError((
+                    f'{cls.__name__}.{attr}: the struct backend cannot '
+                    f'follow a bitfield with one of another size'
+                ))
+            code = _struct_code(ctype.type)
+            if unit is None or unit[0] != size \
+                    or unit[1] + ctype.width > size:
+                unit = (size, 0)
+                # the bits of the integer, whatever the bitfields' sign
+                fmt.append(code.upper())
+                packed.append([])
+                pos += 1
+            size, used = unit
+            shift = size - used - ctype.width if msb else used
+            mask = (1 << ctype.width) - 1
+            read = f'v[{pos - 1}]'
+            if shift:
+                read += f' >> {shift}'
+            if code.islower():
+                # sign extended, like ctypes does
+                sign = 1 << ctype.width - 1
+                read = f'({read} & {mask} ^ {sign}) - {sign}'
+            elif shift + ctype.width < size:
+                read += f' & {mask}'
+            reads.append(read)
+            packed[-1].append(f'(self.{attr} & {mask}) << {shift}')
+            unit = (size, used + ctype.width)
+            fields.append((attr, 0))
+            continue
+
+        unit = None
+        if isinstance(ctype, type) and issubclass(ctype, ctypes.Array) \
+                and not issubclass(ctype._type_, (ctypes.Array, Structure,
+                                                  Union)):
+            length, code = ctype._length_, _struct_code(ctype._type_)
+            if code in 'Bc':
+                fmt.append(f'{length}s')
+                reads.append(f'v[{pos}]')
+                packed.append(f'self.{attr}')
+                default = bytes(length)
+                pos += 1
+            else:
+                fmt.append(f'{length}{code}')
+                reads.append(f'v[{pos}:{pos + length}]')
+                packed.append(f'*self.{attr}')
+                default = (0,) * length
+                pos += length
+            fields.append((attr, default))
+        elif isinstance(ctype, type) \
+                and issubclass(ctype, ctypes._SimpleCData):
+            fmt.append(_struct_code(ctype))
+            reads.append(f'v[{pos}]')
+            packed.append(f'self.{attr}')
+            fields.append((attr, b'\0' if ctype._type_ == 'c' else 0))
+            pos += 1
+        else:
+            raise StructClassError((
+                f'{cls.__name__}.{attr}: the struct backend only has '
+                f'scalars, arrays of scalars and bitfields, not {ctype}'
+            ))
+
+    packer = Struct(''.join(fmt))
+    names = [name for name, _ in fields]
+    packed = ', '.join(p if isinstance(p, str) else ' | '.join(p)
+                       for p in packed)
+    params = ''.join(f', {name}={default!r}' for name, default in fields)
+
+    # one statement per function: no call but the struct one
+    fill = ''.join(f'self.{name}, ' for name in names)
+    init = f'{fill}= {"".join(f"{name}, " for name in names)}'
+    if not fields:
+        # records without fields, such as a trailer, have nothing to set
+        fill = init = 'pass'
+    elif reads == [f'v[{i}]' for i in range(len(reads))]:
+        fill += f'= v'
+    else:
+        fill += f'= {", ".join(reads)},'
+
+    source = (
+        f'def __init__(self{params}):\n'
+        f'    {init}\n'
+        f'def _readfrom_(self, buffer, offset=0):\n'
+        f'    v = _unpack_from(buffer, offset)\n'
+        f'    {fill}\n'
+        f'    return {packer.size}\n'
+        f'def _writeinto_(self, buffer, offset=0):\n'
+        f'    _pack_into(buffer, offset, {packed})\n'
+        f'    return {packer.size}\n'
+        f'def __bytes__(self):\n'
+        f'    return _pack({packed})\n'
+        f'def _iter_unpack(cls, data):\n'
+        f'    new = _new\n'
+        f'    for v in _unpack_iter(data):\n'
+        f'        self = new(cls)\n'
+        f'        {fill}\n'
+        f'        yield self\n'
+    )
+    ns = {'_unpack_from': packer.unpack_from, '_pack': packer.pack,
+          '_pack_into': packer.pack_into, '_new': object.__new__,
+          '_unpack_iter': packer.iter_unpack}
+    exec(compile(source, f'<structclass {cls.__qualname__}>', 'exec'), ns)
+
+    dct = {k: v for k, v in cls.__dict__.items()
+           if k not in ('__dict__', '__weakref__')}
+    dct.update({
+        '__slots__': tuple(names),
+        '__annotations__': annot,
+        '_struct_': packer,
+        '_fields_': tuple(names),
+        '__init__': ns['__init__'],
+        '_readfrom_': ns['_readfrom_'],
+        '_writeinto_': ns['_writeinto_'],
+        '__bytes__': ns['__bytes__'],
+        '_iter_unpack': classmethod(ns['_iter_unpack']),
+        '__eq__': _record_eq,
+        '__hash__': None,
+        '__repr__': _record_repr,
+    })
+
+    bases = tuple(b for b in cls.__bases__ if b is not object) + (_Record,)
+    return type(cls.__name__, bases, dct)
+
+
+def _record_eq(self, other):
+    if type(other) is not type(self):
+        return NotImplemented
+    return all(getattr(self, slot) == getattr(other, slot)
+               for slot in self._fields_)
+
+
+def _record_repr(self):
+    fields = ', '.join(f'{name}={getattr(self, name)!r}'
+                       for name in self._fields_)
+    return f'{type(self).__qualname__}({fields})'
+
 
 # the people who created `no_type_check_decorator`
 # are really smart. i appreciate them
 @no_type_check_decorator
-def structclass(cls=None, *, byteorder=None, pack=True):
+def structclass(cls=None, *, byteorder=None, pack=True, bitorder=None,
+                backend='ctypes'):
+    '''make a class with annotated fields a binary structure
+
+    the default `backend` makes a :class:`ctypes.Structure`. with
+    ``backend='struct'`` the class is a plain `__slots__` class
+    read and written by a :class:`struct.Struct`: faster to read,
+    write and access, but without views, nested structures, unions,
+    ``anonymous`` members, padding or, without a `bitorder`,
+    consecutive bitfields of different sizes. it is not a ctypes
+    type: use ``cls._struct_.size`` instead of ``sizeof``. :func:`readfrom`,
+    :func:`writeinto`, ``bytes()`` and the bulk functions take both.
+
+    :param byteorder: ``'<'``, ``'>'`` or None for the native one
+    :param pack: no padding between the fields
+    :param bitorder: the order of the bits of the bitfields, see
+        :class:`bitfield`. by default the compiler's
+    :param backend: ``'ctypes'`` or ``'struct'``
+    '''
+
+    if backend not in ('ctypes', 'struct'):
+        raise StructClassError(f'unknown structclass backend {backend!r}')
+    inner = _structclass_struct if backend == 'struct' else \
+        _structclass_inner
+
     def decorator(cls):
-        return _structclass_inner(cls, byteorder=byteorder, pack=pack)
+        return inner(cls, byteorder=byteorder, pack=pack, bitorder=bitorder)
     if cls is not None:
-        return _structclass_inner(cls)
+        return decorator(cls)
     return decorator
 
 
@@ -241,10 +569,44 @@ def union(cls):
     return _structclass_inner(cls, union=True)
 
 
+@functools.lru_cache(maxsize=1024)
+def array_type(atype, length):
+    '''the ctypes array type ``atype * length``, memoized
+
+    formats with length prefixes (``ubyte * header.size``) need a
+    new array type for every length they meet. building a type is
+    much more expensive than building an instance so the most
+    recently used array types are kept in a bounded LRU cache. it
+    is a :func:`functools.lru_cache` so it is thread-safe and
+    ``array_type.cache_info()`` gives the hit and miss counters.
+
+    .. doctest::
+
+        >>> array_type(ubyte, 3) is array_type(ubyte, 3)
+        True
+        >>> sizeof(array_type(ushort, 3))
+        6
+
+    :param atype: the element type
+    :param length: the number of elements
+    :returns: the array type
+    '''
+    return atype * length
+
+
 def readfrom(struct, buffer, offset=0):
     # you just know you're on another level when you
     # use memoryviews. as a python coder you're not even
     # supposed to know memory exists :)
+    if isinstance(struct, _Record):
+        try:
+            return struct._readfrom_(buffer, offset)
+        except _StructError:
+            size = type(struct)._struct_.size
+            msg = (f'{type(struct)} size: {size}, buffer '
+                   f'section size: {len(buffer[offset:offset+size])}')
+            raise ValueError(msg) from None
+
     ret = sizeof(struct)
     smem = memoryview(struct).cast('B')
 
@@ -258,12 +620,416 @@ def readfrom(struct, buffer, offset=0):
 
 
 def writeinto(struct, buffer, offset=0):
+    if isinstance(struct, _Record):
+        try:
+            return struct._writeinto_(buffer, offset)
+        except _StructError as e:
+            raise ValueError(str(e)) from None
     ret = sizeof(struct)
     smem = memoryview(struct).cast('B')
     buffer[offset:offset+ret] = smem
     return ret
 
 
+def readmany(cls, buffer, count, offset=0):
+    '''read `count` consecutive records of `cls` in a single copy
+
+    where a loop of :func:`readfrom` makes a memoryview and a copy
+    per record, the records are copied at once in a ctypes array.
+
+    .. doctest::
+
+        >>> @structclass(byteorder='>')
+        ... class point:
+        ...     x: ubyte
+        ...     y: ubyte
+        ...
+        >>> points = readmany(point, b'\\x01\\x02\\x03\\x04', 2)
+        >>> points[1]
+        point(x=3, y=4)
+
+    :param cls: a structclass or any ctypes type
+    :param buffer: an object supporting the buffer protocol
+    :param count: the number of records
+    :param offset: where the first record starts in `buffer`
+    :returns: an array of type ``cls * count``, a list for the
+        ``backend='struct'`` structclasses
+    :raises ValueError: if `buffer` is too short
+    '''
+
+    if issubclass(cls, _Record):
+        records = list(iter_records(cls, buffer, offset, count))
+        if len(records) < count:
+            raise ValueError((
+                f'{count} {cls.__name__} are {cls._struct_.size * count} '
+                f'bytes, buffer section size: '
+                f'{memoryview(buffer).nbytes - offset}'
+            ))
+        return records
+
+    atype = array_type(cls, count)
+    try:
+        return atype.from_buffer_copy(buffer, offset)
+    except ValueError:
+        size = memoryview(buffer).nbytes - offset
+        raise ValueError((
+            f'{count} {cls.__name__} are {sizeof(atype)} bytes, buffer '
+            f'section size: {size}'
+        )) from None
+
+
+def iter_records(cls, buffer, offset=0, count=None):
+    '''iterate over the records of `cls` in `buffer`, without copies
+
+    the records are views (see :func:`view`) of the buffer, which
+    stays exported until the iteration ends. over read-only buffers
+    they are read-only copies. the records of the
+    ``backend='struct'`` structclasses are unpacked copies.
+
+    :param cls: a structclass or any ctypes type
+    :param buffer: an object supporting the buffer protocol
+    :param offset: where the first record starts in `buffer`
+    :param count: the number of records, by default as many as fit
+        after `offset`
+    '''
+
+    if issubclass(cls, _Record):
+        size = cls._struct_.size
+        with memoryview(buffer).cast('B') as mem:
+            if count is None:
+                count = (mem.nbytes - offset) // size
+            # whole records only
+            count = min(count, (mem.nbytes - offset) // size)
+            data = mem[offset:offset + size * count]
+        yield from cls._iter_unpack(data)
+        return
+
+    if count is None:
+        count = (memoryview(buffer).nbytes - offset) // sizeof(cls)
+    yield from view(array_type(cls, count), buffer, offset)
+
+
+# records gathered at once by `writemany`
+_BATCH = 1024
+
+
+def writemany(seq, buffer, offset=0):
+    '''write the records of `seq` one after the other in `buffer`
+
+    a ctypes array is copied in the buffer at once and the records
+    of ``backend='struct'`` structclasses, all of the same class, are
+    packed straight into it. other records are gathered in C a batch
+    at a time, and every batch is copied in the buffer: unlike the
+    whole output, a batch stays in cache. preallocate the buffer
+    with the size of the records:
+
+    .. code-block:: python
+
+        buf = bytearray(sizeof(IndexEntry) * len(entries))
+        writemany(entries, buf)
+
+    :param seq: a sequence of structclasses, or a ctypes array
+    :param buffer: a writable object supporting the buffer protocol
+    :param offset: where the first record goes in `buffer`
+    :returns: the number of bytes written
+    :raises ValueError: if `buffer` is too short
+    '''
+
+    with memoryview(buffer).cast('B') as mem:
+        if isinstance(seq, ctypes.Array):
+            batches = [memoryview(seq).cast('B')]
+        elif seq and isinstance(seq[0], _Record):
+            size = type(seq[0])._struct_.size * len(seq)
+            if mem.nbytes < offset + size:
+                raise ValueError((
+                    f'records size: {size}, buffer section size: '
+                    f'{mem.nbytes - offset}'
+                ))
+            off = offset
+            for record in seq:
+                off += record._writeinto_(mem, off)
+            return off - offset
+        else:
+            # takes any buffer
+            records, join = iter(seq), b''.join
+            batches = iter(lambda: join(itertools.islice(records, _BATCH)),
+                           b'')
+
+        off = offset
+        for data in batches:
+            end = off + len(data)
+            if mem.nbytes < end:
+                raise ValueError((
+                    f'records size: at least {end - offset}, buffer '
+                    f'section size: {mem.nbytes - offset}'
+                ))
+            mem[off:end] = data
+            off = end
+    return off - offset
+
+
+_COMPOSITES = (Structure, Union, ctypes.Array)
+
+
+def _guard(value):
+    # the read-only version of a nested structure or array
+    if isinstance(value, _COMPOSITES):
+        return _readonly_type(type(value)).from_buffer(value)
+    return value
+
+
+def _composites(cls, base=0):
+    # the members of `cls` holding structures or arrays, with their
+    # offsets. the members of anonymous ones are attributes as well
+    for field in getattr(cls, '_fields_', ()):
+        name, ctype = field[:2]
+        if not isinstance(ctype, type) or not issubclass(ctype, _COMPOSITES):
+            continue
+        offset = base + getattr(cls, name).offset
+        yield name, ctype, offset
+        if name in getattr(cls, '_anonymous_', ()):
+            yield from _composites(ctype, offset)
+
+
+def _guarded_member(ctype, offset):
+    return property(
+        lambda self: _readonly_type(ctype).from_buffer(self, offset))
+
+
+@functools.lru_cache(maxsize=None)
+def _readonly_type(cls):
+    # a subclass of `cls` refusing assignments. the layout is
+    # inherited so instances are the same bytes with a guard on top.
+    # nested structures and arrays are handed out guarded as well
+    def _refuse(self, *args):
+        raise StructClassError(f'{cls.__name__} is a read-only view')
+
+    dct = {
+        '__setattr__': _refuse,
+        '__qualname__': cls.__qualname__,
+        '__module__': cls.__module__,
+    }
+    if issubclass(cls, ctypes.Array):
+        dct['__setitem__'] = _refuse
+        if issubclass(cls._type_, _COMPOSITES):
+            getitem = cls.__getitem__
+
+            def __getitem__(self, key):
+                if isinstance(key, slice):
+                    return [_guard(item) for item in getitem(self, key)]
+                return _guard(getitem(self, key))
+
+            dct['__getitem__'] = __getitem__
+    elif issubclass(cls, (Structure, Union)):
+        for name, ctype, offset in _composites(cls):
+            dct[name] = _guarded_member(ctype, offset)
+    return type(cls.__name__, (cls,), dct)
+
+
+def view(cls, buffer, offset=0, readonly=None):
+    '''an instance of `cls` aliasing `buffer` at `offset`
+
+    unlike :func:`readfrom` nothing is copied: the instance *is*
+    the bytes of the buffer. changing the buffer changes the
+    instance and, unless it is read-only, the other way around.
+
+    the instance keeps the buffer exported for as long as it lives:
+    a `bytearray` cannot be resized and an `mmap` cannot be closed
+    until every view over it is gone (a `BufferError` is raised).
+
+    read-only views refuse assignments: assigning to their
+    attributes or items, or to those of the structures and arrays
+    they hold, raises :class:`StructClassError`. memoryviews of a
+    read-only view must not be written to. ctypes cannot alias
+    read-only buffers (`bytes`, read-only memoryviews, `mmap`
+    opened with `ACCESS_READ`): over those the instance is a
+    read-only *copy* of the bytes.
+
+    .. doctest::
+
+        >>> @structclass(byteorder='>')
+        ... class point:
+        ...     x: ushort
+        ...     y: ushort
+        ...
+        >>> buf = bytearray(b'\\x00\\x01\\x00\\x02')
+        >>> p = view(point, buf)
+        >>> p.x = 3
+        >>> buf
+        bytearray(b'\\x00\\x03\\x00\\x02')
+
+    :param cls: a structclass or any ctypes type
+    :param buffer: an object supporting the buffer protocol
+    :param offset: where the instance starts in `buffer`
+    :param readonly: make a read-only view of a writable buffer if
+        True. defaults to the buffer's own mutability
+    :returns: an instance of `cls` (or of a read-only subclass)
+    '''
+
+    if memoryview(buffer).readonly:
+        return _readonly_type(cls).from_buffer_copy(buffer, offset)
+    if readonly:
+        cls = _readonly_type(cls)
+    return cls.from_buffer(buffer, offset)
+
+
+def _byteorder(cls):
+    # ctypes swaps the members of the non native structures only
+    if sys.byteorder == 'little':
+        return '>' if issubclass(cls, BigEndianStructure) else '<'
+    return '<' if issubclass(cls, LittleEndianStructure) else '>'
+
+
+def _member_dtype(ctype, byteorder):
+    import numpy as np
+
+    if issubclass(ctype, (Structure, Union)):
+        return dtype(ctype)
+    if issubclass(ctype, ctypes.Array):
+        if ctype._type_ is ctypes.c_char:
+            # a single bytes value for ctypes, and for numpy
+            return np.dtype(f'S{ctype._length_}')
+        item = _member_dtype(ctype._type_, byteorder)
+        shape = (ctype._length_,)
+        if item.subdtype is not None:  # arrays of arrays
+            item, inner = item.subdtype
+            shape += inner
+        return np.dtype((item, shape))
+    return np.dtype(ctype).newbyteorder(byteorder)
+
+
+@functools.lru_cache(maxsize=None)
+def dtype(cls):
+    '''the numpy structured dtype with the layout of `cls`
+
+    members keep their offsets, byte order and array shapes, nested
+    structures are nested dtypes. the members of an ``anonymous``
+    one are also fields of their own, as they are attributes of
+    `cls`. numpy has no bitfields: the bitfields sharing an integer
+    are that integer, a field named after all of them.
+
+    .. doctest::
+
+        >>> @structclass(byteorder='>')
+        ... class header:
+        ...     magic: ubyte * 2
+        ...     flags: bitfield[ubyte:4]
+        ...     kind:  bitfield[ubyte:4]
+        ...     size:  uint
+        ...
+        >>> dtype(header)
+        dtype([('magic', 'u1', (2,)), ('flags|kind', 'u1'), ('size', '>u4')])
+
+    numpy is only imported when this is called.
+
+    :param cls: a structclass or union
+    :returns: a :class:`numpy.dtype` of ``sizeof(cls)`` bytes
+    '''
+
+    import numpy as np
+
+    byteorder = _byteorder(cls)
+    names, formats, offsets = [], [], []
+    units = {}  # the field of the bitfields at an offset
+    for field in cls._fields_:
+        name, ctype = field[:2]
+        members = getattr(cls, '_members_', {})
+        offset = members.get(name, getattr(cls, name)).offset
+        if len(field) == 3:
+            if offset in units:
+                names[units[offset]] += '|' + name
+                continue
+            units[offset] = len(names)
+
+        names.append(name)
+        formats.append(_member_dtype(ctype, byteorder))
+        offsets.append(offset)
+
+        if name in getattr(cls, '_anonymous_', ()):
+            for sub, (subtype, suboffset) in dtype(ctype).fields.items():
+                names.append(sub)
+                formats.append(subtype)
+                offsets.append(offset + suboffset)
+
+    return np.dtype({
+        'names': names,
+        'formats': formats,
+        'offsets': offsets,
+        'itemsize': sizeof(cls),
+    })
+
+
+def view_array(cls, buffer, count=None, offset=0):
+    '''`count` records of `cls` in `buffer`, as a numpy array
+
+    nothing is copied: the array is a structured view of the
+    buffer (see :func:`dtype`), read-only if the buffer is. where
+    a ctypes array holds a python object per record a field of the
+    view is a single vector:
+
+    .. code-block:: python
+
+        table = view_array(ColorTableEntry, gif.GCT)
+        dark = table['red'] < 32
+
+    :param cls: a structclass or union
+    :param buffer: an object supporting the buffer protocol
+    :param count: the number of records, by default as many as fit
+        after `offset`
+    :param offset: where the first record starts in `buffer`
+    :returns: a :class:`numpy.ndarray` of `count` records
+    :raises ValueError: if `buffer` is too short
+    '''
+
+    import numpy as np
+
+    records = dtype(cls)
+    if count is None:
+        count = (memoryview(buffer).nbytes - offset) // records.itemsize
+    return np.frombuffer(buffer, records, count, offset)
+
+
+def extract_bits(cls, records, name):
+    '''the bitfield `name` of every record, as a numpy array
+
+    one shift and one mask over the integers holding the bitfield,
+    for C bitfields as laid out by ctypes as well as masked ones.
+
+    .. code-block:: python
+
+        images = readmany(ImageDescriptor, buf, count)
+        interlaced = extract_bits(ImageDescriptor, images, 'interlace')
+
+    :param cls: a structclass
+    :param records: a :func:`view_array` of `cls`, or a buffer of
+        records of `cls` such as a :func:`readmany` array
+    :param name: the bitfield
+    :returns: a :class:`numpy.ndarray` of unsigned integers
+    :raises StructClassError: if `name` is not a bitfield
+    '''
+
+    import numpy as np
+
+    if not isinstance(records, np.ndarray) or records.dtype != dtype(cls):
+        records = view_array(cls, records)
+
+    masked = getattr(cls, '_bitfields_', {})
+    if name in masked:
+        unit, shift, mask = masked[name]
+    else:
+        # ctypes packs the position of bitfields in their size
+        member = getattr(cls, name, None)
+        width = getattr(member, 'size', 0) >> 16
+        if not width:
+            raise StructClassError(f'{cls.__name__}.{name} is not a bitfield')
+        shift, mask = member.size & 0xffff, (1 << width) - 1
+        unit = next(field for field in dtype(cls).names
+                    if name in field.split('|'))
+
+    values = records[unit]
+    return values >> shift & mask
+
+
 # what kind of shit interface does ctypes provide. for the
 # love of god this is supposed to be python
 char = ctypes.c_char
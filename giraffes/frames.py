@@ -0,0 +1,115 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import itertools
+import os
+
+from giraffes.gif import Image
+from giraffes.lzw import lzw_decode
+
+
+def _images(gif):
+    return [block.block for block in gif.blocks
+            if isinstance(block.block, Image)]
+
+
+def _decode_batch(inname, outname, batch):
+    # runs in the workers: decode some frames from a shared segment
+    # into another. only names and offsets went through pickle
+    src = shared_memory.SharedMemory(inname)
+    dst = shared_memory.SharedMemory(outname)
+    try:
+        for inoff, insize, minsize, outoff, outsize in batch:
+            with src.buf[inoff:inoff + insize] as data, \
+                    dst.buf[outoff:outoff + outsize] as out:
+                lzw_decode(data, minsize, out)
+    finally:
+        src.close()
+        dst.close()
+
+
+def _batches(frames, count):
+    # about `count` runs of consecutive frames of similar total size
+    total = sum(frame[-1] for frame in frames)
+    batches, batch, size = [], [], 0
+    for frame in frames:
+        batch.append(frame)
+        size += frame[-1]
+        if size * count >= total * (len(batches) + 1):
+            batches.append(batch)
+            batch = []
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def decode_frames(gif, executor=None, workers=None):
+    '''decode the color indices of every frame of a parsed gif
+
+    the lzw streams of the frames are independent: they are decoded
+    by a pool of processes. the compressed frames are copied once in
+    a shared memory segment that the workers read from and they
+    write the indices in another one. only offsets are pickled.
+
+    .. code-block:: python
+
+        with ProcessPoolExecutor() as executor:
+            frames = decode_frames(gif, executor)
+
+    starting a pool takes time: when decoding many gifs pass the same
+    `executor` to every call. without one a pool of `workers`
+    processes is started and shut down for the call, and with a
+    single worker the frames are decoded in this process.
+
+    :param gif: a parsed ``GIF``
+    :param executor: a :class:`concurrent.futures.Executor`
+    :param workers: the number of processes of the pool to start
+        without an `executor`, all the cpus by default
+    :returns: a list of bytearrays of ``width * height`` indices, in
+        the order of the frames
+    '''
+
+    images = _images(gif)
+    if executor is None and workers == 1:
+        return [image.decode() for image in images]
+    if not images:
+        return []
+
+    payloads = [image.data.gather() for image in images]
+
+    # where every frame is in both segments
+    frames = []
+    insize = outsize = 0
+    for image, payload in zip(images, payloads):
+        size = image.header.width * image.header.height
+        minsize = image.lzw.minimum_code_size
+        frames.append((insize, len(payload), minsize, outsize, size))
+        insize += len(payload)
+        outsize += size
+
+    # segments cannot be empty
+    src = shared_memory.SharedMemory(create=True, size=max(1, insize))
+    dst = shared_memory.SharedMemory(create=True, size=max(1, outsize))
+    try:
+        for payload, (offset, size, *_) in zip(payloads, frames):
+            src.buf[offset:offset + size] = payload
+        del payloads
+
+        # a few batches per worker so that they finish together
+        count = 4 * (workers or os.cpu_count() or 1)
+        batches = _batches(frames, count)
+        pool = executor or ProcessPoolExecutor(workers)
+        try:
+            for _ in pool.map(_decode_batch, itertools.repeat(src.name),
+                              itertools.repeat(dst.name), batches):
+                pass
+        finally:
+            if executor is None:
+                pool.shutdown()
+
+        return [bytearray(dst.buf[offset:offset + size])
+                for *_, offset, size in frames]
+    finally:
+        src.close()
+        src.unlink()
+        dst.close()
+        dst.unlink()
@@ -2,7 +2,8 @@ from __future__ import annotations
 from formats.structclasses import (structclass, ubyte, ushort, sizeof,
                                    bitfield)
 from formats.blockclasses import (blockclass, readfrom, writeinto, optional,
-                                  repeat, dispatch)
+                                  repeat, dispatch, subblocks)
+from giraffes.lzw import lzw_decode
 
 
 ## BEGINNING OF FILE ##
@@ -12,7 +13,7 @@ class GIFSignature:
     version:   ubyte * 3
 
 
-@structclass(byteorder='<')
+@structclass(byteorder='<', bitorder='lsb')
 class LogicalScreenDescriptor:
     width:      ushort
     height:     ushort
@@ -48,7 +49,7 @@ class SubBlock:  # useful for many
 ### Image ###
 
 
-@structclass(byteorder='<')
+@structclass(byteorder='<', bitorder='lsb')
 class ImageDescriptor:
     # separator: ubyte  # match 0x2C # in Block
     left:      ushort
@@ -77,7 +78,20 @@ class Image:
     )
 
     lzw:    LZWMin
-    data:   repeat(SubBlock, until=lambda sub: sub.header.size == 0)
+    data:   subblocks
+
+    def decode(self):
+        '''the color indices of the image
+
+        rows are in the order they are stored: interlaced images are
+        not reordered.
+
+        :returns: a bytearray of ``width * height`` indices
+        '''
+
+        out = bytearray(self.header.width * self.header.height)
+        lzw_decode(self.data.gather(), self.lzw.minimum_code_size, out)
+        return out
 
 
 ### Extension Blocks ###
@@ -92,7 +106,7 @@ class GenericBlock:
     data: ubyte * header.size
 
 
-@structclass(byteorder='<')
+@structclass(byteorder='<', bitorder='lsb')
 class GraphicsControlExtension:
     # introducer: ubyte  # 0x21 # in Block
     # GCL:        ubyte  # 0xF9 # in ExtensionBlock
@@ -110,10 +124,7 @@ class GraphicsControlExtension:
 
 @blockclass
 class CommentExtensionBlock:
-    comment: repeat(
-        SubBlock,
-        until=lambda sub: sub.header.size == 0,
-    )
+    comment: subblocks
 
 
 @structclass(byteorder='<')
@@ -133,10 +144,7 @@ class PlainTextExtensionHeader:
 @blockclass
 class PlainTextExtensionBlock:
     header: PlainTextExtensionHeader
-    text:   repeat(
-        SubBlock,
-        until=lambda sub: sub.header.size == 0,
-    )
+    text:   subblocks
 
 
 @structclass(byteorder='<')
@@ -149,10 +157,7 @@ class ApplicationExtensionHeader:
 @blockclass
 class ApplicationExtensionBlock:
     header: ApplicationExtensionHeader
-    appdata: repeat(
-        SubBlock,
-        until=lambda sub: sub.header.size == 0,
-    )
+    appdata: subblocks
 
 ### General Block ###
 
@@ -209,8 +214,18 @@ class GIF:
         until=lambda b: b.introducer.value == 0x3B,
     )
 
+    @classmethod
+    def seek_frame(cls, path, n, index=None):
+        '''parse only the `n`-th ``Image`` of the gif file at `path`
+
+        the offsets of the blocks are kept in an index next to the
+        file, see :mod:`giraffes.index`.
+        '''
+
+        from giraffes.index import seek_frame
+        return seek_frame(path, n, index)
+
     def __iter__(self):
         for block in (b.block for b in self.blocks):
             if isinstance(block, Image):
-                data = b''.join(bytes(sub.data) for sub in block.data)
-                yield data
+                yield block.data.gather()
@@ -0,0 +1,289 @@
+from __future__ import annotations
+import hashlib
+import mmap
+import os
+
+from formats.structclasses import (structclass, ubyte, uint, ulonglong,
+                                   sizeof, array_type, view)
+from formats.blockclasses import (blockclass, readfrom, optional,
+                                  open_mapped, _map, _drop_frames)
+from formats.exceptions import BlockClassError
+
+from giraffes.gif import (GIFSignature, LogicalScreenDescriptor,
+                          ColorTableEntry, Block, Image)
+
+
+MAGIC = b'GIDX'
+VERSION = 1
+
+# files are hashed by chunks of this size
+_CHUNK = 1 << 20
+
+
+@structclass(byteorder='<')
+class IndexHeader:
+    magic:   ubyte * 4
+    version: ubyte
+
+    # what the index was built from
+    size:    ulonglong
+    mtime:   ulonglong  # in nanoseconds
+    digest:  ubyte * 16  # blake2b, zeros if not hashed
+
+    count:   uint  # top-level blocks
+    frames:  uint  # images
+
+
+@structclass(byteorder='<')
+class IndexEntry:
+    offset:     ulonglong  # of the introducer
+    length:     uint  # introducer included
+    introducer: ubyte  # 0x21, 0x2C or 0x3B
+    label:      ubyte  # of extensions, 0 otherwise
+
+
+@blockclass
+class _Head:
+    # what comes before the blocks in `GIF`
+    signature: GIFSignature
+    LSD: LogicalScreenDescriptor
+    GCT: optional(
+        on=LSD.GCTF,
+        atype=ColorTableEntry * (1 << LSD.size + 1)
+    )
+
+
+def _digest(file):
+    digest = hashlib.blake2b(digest_size=16)
+    chunk = bytearray(_CHUNK)
+    with memoryview(chunk) as mem:
+        while True:
+            size = file.readinto(mem)
+            if not size:
+                return digest.digest()
+            digest.update(mem[:size])
+
+
+def sidecar(path):
+    '''the default path of the index of the gif file at `path`'''
+    return os.fspath(path) + '.idx'
+
+
+class BlockIndex:
+    '''where the top-level blocks of a gif file are
+
+    one :class:`IndexEntry` per block of ``GIF.blocks`` and, for
+    every frame, the position of its ``Image`` among them. both are
+    ctypes arrays: a saved index is loaded by mapping the sidecar
+    file, nothing is parsed.
+
+    .. code-block:: python
+
+        index = BlockIndex.build('animated.gif')
+        index.save(sidecar('animated.gif'))
+
+        index = BlockIndex.load(sidecar('animated.gif'))
+        if index.valid('animated.gif'):
+            entry = index.frame(10)
+
+    :param header: an :class:`IndexHeader`
+    :param entries: an array of :class:`IndexEntry`
+    :param frames: an array of ``uint``
+    '''
+
+    def __init__(self, header, entries, frames):
+        self.header = header
+        self.entries = entries
+        self.frames = frames
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        return self.entries[i]
+
+    @property
+    def nframes(self):
+        return len(self.frames)
+
+    def frame(self, n):
+        '''the entry of the `n`-th ``Image`` block
+
+        :raises IndexError: if there is no such frame
+        '''
+
+        if not -len(self.frames) <= n < len(self.frames):
+            raise IndexError(f'frame {n} out of {len(self.frames)}')
+        return self.entries[self.frames[n]]
+
+    @classmethod
+    def build(cls, path, hash=False):
+        '''index the gif file at `path`
+
+        the file is parsed through a memory mapping, lazily: apart
+        from their introducer and label blocks are only measured.
+        with `hash` set the file's content is hashed as well, by
+        chunks, for :meth:`valid` to compare it later.
+
+        :raises BlockClassError: if the file is truncated
+        '''
+
+        with open(path, 'rb', buffering=0) as file:
+            stat = os.fstat(file.fileno())
+            digest = _digest(file) if hash else bytes(16)
+
+        data = _map(path)
+        try:
+            offset = readfrom(_Head(), data)
+            entries, frames = [], []
+            while True:
+                block = Block()
+                length = readfrom(block, data, offset, lazy=True)
+                introducer = block.introducer.value
+                label = data[offset + 1] if introducer == 0x21 else 0
+
+                if introducer == 0x2C:
+                    frames.append(len(entries))
+                entries.append((offset, length, introducer, label))
+
+                offset += length
+                if introducer == 0x3B:
+                    break
+        except ValueError as error:
+            # the mapping cannot be closed while the frames are alive
+            _drop_frames(error)
+            raise BlockClassError(f'{path} is truncated: {error}') from None
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+        header = IndexHeader()
+        header.magic[:] = MAGIC
+        header.version = VERSION
+        header.size = stat.st_size
+        header.mtime = stat.st_mtime_ns
+        header.digest[:] = digest
+        header.count = len(entries)
+        header.frames = len(frames)
+
+        entries = array_type(IndexEntry, len(entries))(*entries)
+        frames = array_type(uint, len(frames))(*frames)
+        return cls(header, entries, frames)
+
+    def save(self, path):
+        '''write the index to `path`, atomically'''
+
+        temp = f'{os.fspath(path)}.{os.getpid()}.tmp'
+        try:
+            with open(temp, 'wb') as file:
+                file.write(self.header)
+                file.write(self.entries)
+                file.write(self.frames)
+            os.replace(temp, path)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        '''map an index saved with :meth:`save`
+
+        the arrays are read-only views of the mapping: nothing is
+        copied. the mapping is copy on write, as ctypes cannot alias
+        read-only memory, but nothing writes to it.
+
+        :raises BlockClassError: if `path` is not an index
+        '''
+
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size < sizeof(IndexHeader):
+                raise BlockClassError(f'{path} is not a gif index')
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        header = view(IndexHeader, mapping, readonly=True)
+        if bytes(header.magic) != MAGIC or header.version != VERSION:
+            raise BlockClassError(f'{path} is not a gif index')
+
+        offset = sizeof(IndexHeader)
+        count = sizeof(IndexEntry) * header.count
+        if len(mapping) != offset + count + sizeof(uint) * header.frames:
+            raise BlockClassError(f'{path} is truncated')
+
+        entries = view(array_type(IndexEntry, header.count), mapping, offset,
+                       readonly=True)
+        frames = view(array_type(uint, header.frames), mapping,
+                      offset + count, readonly=True)
+        return cls(header, entries, frames)
+
+    def valid(self, path, hash=False):
+        '''whether the index is up to date with the gif file at `path`
+
+        by default the file's size and modification time are
+        compared to the ones the index was built from. with `hash`
+        set its content is, which does not trust timestamps but
+        reads the whole file. an index built without `hash` has no
+        digest to compare to and is never valid then.
+        '''
+
+        stat = os.stat(path)
+        if stat.st_size != self.header.size:
+            return False
+        if not hash:
+            return stat.st_mtime_ns == self.header.mtime
+        digest = bytes(self.header.digest)
+        if digest == bytes(16):
+            return False
+        with open(path, 'rb', buffering=0) as file:
+            return _digest(file) == digest
+
+
+def index(path, sidecar_path=None, hash=False):
+    '''the index of the gif file at `path`, built if need be
+
+    the sidecar file is loaded when it is valid (see
+    :meth:`BlockIndex.valid`), otherwise the index is built and
+    saved there. failing to save it is not an error.
+
+    :param path: the gif file
+    :param sidecar_path: where the index is kept, :func:`sidecar`
+        by default
+    :param hash: how the sidecar is validated, and whether a new
+        index hashes the file
+    :returns: a :class:`BlockIndex`
+    '''
+
+    if sidecar_path is None:
+        sidecar_path = sidecar(path)
+
+    try:
+        idx = BlockIndex.load(sidecar_path)
+        if idx.valid(path, hash=hash):
+            return idx
+    except (OSError, BlockClassError):
+        pass
+
+    idx = BlockIndex.build(path, hash=hash)
+    try:
+        idx.save(sidecar_path)
+    except OSError:
+        pass
+    return idx
+
+
+def seek_frame(path, n, idx=None):
+    '''parse only the `n`-th ``Image`` of the gif file at `path`
+
+    :param path: the gif file
+    :param n: the frame, negative ones count from the end
+    :param idx: a :class:`BlockIndex` of the file, by default the
+        one :func:`index` gives
+    :returns: an ``Image``
+    '''
+
+    if idx is None:
+        idx = index(path)
+    entry = idx.frame(n)
+    # skip the introducer: that is `Block`'s
+    with open_mapped(path, Image, offset=entry.offset + 1) as image:
+        return image
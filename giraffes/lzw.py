@@ -1,87 +1,462 @@
-from bitstring import BitStream
+from array import array
+import functools
 
+import numpy as np
 
-def lzw_encode(it, minsize, maxsize):
-    def codes():
-        def _code(num, size):
-            return '0b' + bin(num)[2:].rjust(size, '0')[::-1]
-        init = lambda: {chr(i).encode(): i for i in range(1 << minsize)}
+from formats.exceptions import FormatsError
 
-        cc, eoi = 1 << minsize, 1 << minsize + 1
-        pref = bytearray()
-        tab = init()
-        maxx = 1 << minsize
-        size = minsize
 
-        for char in it:
-            pref.append(char)
-            bp = bytes(pref)
-            if bp in tab:
-                continue
+class LZWError(FormatsError):
+    ...
+
+
+def _decode_loop(data, minsize, out):
+    '''decode a gif lzw stream into `out`, one code at a time
+
+    the code table is flat: every code is the offset and the length
+    of its string in the output, which is where the string was
+    decoded the first time. decoding a code is then a single slice
+    copy within `out`. codes are read from an integer bit
+    accumulator.
+
+    decoding stops at the end of information code, at the end of
+    `data` or when `out` is full, whichever comes first. what
+    remains of `out` is left untouched.
+
+    see :func:`lzw_decode` for the parameters.
+    '''
+
+    if not isinstance(out, bytearray):
+        out = memoryview(out).cast('B')
+
+    clear = 1 << minsize
+    eoi = clear + 1
+    start = array('L', [0]) * 4096
+    length = array('H', [0]) * 4096
+
+    end = len(out)
+    nbytes = len(data)
+    i = acc = nbits = 0
+    size = minsize + 1
+    mask = (1 << size) - 1
+    avail = eoi + 1
+    pos = prevpos = 0
+    prev = 0  # the length of the previous string, 0 after a clear
 
-            yield _code(tab[bp[:-1]], size)
-            tab[bp] = maxx
-            maxx += 1
+    while True:
+        if nbits < size:
+            # at most two refills for 12 bit codes
+            if i + 1 < nbytes:
+                acc |= (data[i] | data[i + 1] << 8) << nbits
+                i += 2
+                nbits += 16
+            elif i < nbytes:
+                acc |= data[i] << nbits
+                i += 1
+                nbits += 8
+                if nbits < size:
+                    break
+            else:
+                break
+        code = acc & mask
+        acc >>= size
+        nbits -= size
 
-            if maxx == 1 << size:
+        if code < clear:
+            if pos == end:
+                break
+            out[pos] = code
+            n = 1
+        elif code == clear:
+            size = minsize + 1
+            mask = (1 << size) - 1
+            avail = eoi + 1
+            prev = 0
+            continue
+        elif code == eoi:
+            break
+        elif code < avail:
+            n = length[code]
+            s = start[code]
+            if pos + n > end:
+                out[pos:end] = out[s:s + end - pos]
+                pos = end
+                break
+            out[pos:pos + n] = out[s:s + n]
+        elif code == avail and prev:
+            # the string being defined: the previous one and its own
+            # first byte
+            n = prev + 1
+            if pos + n > end:
+                out[pos:end] = out[prevpos:prevpos + end - pos]
+                pos = end
+                break
+            out[pos:pos + prev] = out[prevpos:prevpos + prev]
+            out[pos + prev] = out[prevpos]
+        else:
+            raise LZWError(f'code {code} is not in the table')
+
+        # the previous string followed by the first byte of this one
+        # is right there in the output
+        if prev and avail < 4096:
+            start[avail] = prevpos
+            length[avail] = prev + 1
+            avail += 1
+            if avail > mask and size < 12:
                 size += 1
+                mask = (1 << size) - 1
+        prev = n
+        prevpos = pos
+        pos += n
+
+    return pos
+
+
+# codes are extracted this many at a time
+_CHUNK = 4096
+
+
+@functools.lru_cache(maxsize=None)
+def _widths(minsize):
+    # the width of the k-th code after a clear code. from the second
+    # code on every code adds an entry to the table, until it is full
+    k = np.arange(4096 + _CHUNK)
+    avail = np.minimum(4096, (1 << minsize) + 1 + np.maximum(k, 1))
+    return np.minimum(12, np.log2(avail).astype(np.int32) + 1)
+
+
+def _codes(data, minsize):
+    # all the codes up to the end of information code, without the
+    # clear codes, and the index of every code since the last clear.
+    # the widths of the codes only depend on that index so a chunk
+    # of codes is extracted at once, up to the next clear code
+    clear = 1 << minsize
+    eoi = clear + 1
+    widths = _widths(minsize)
+
+    buf = np.zeros(len(data) + 3, dtype=np.uint32)
+    buf[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+    nbits = 8 * len(data)
+
+    codes, index = [], []
+    bit = k = 0
+    while True:
+        width = widths[min(k, 4096):][:_CHUNK]
+        ends = bit + np.cumsum(width, dtype=np.int64)
+        n = int(np.searchsorted(ends, nbits, side='right'))
+        if n == 0:
+            break
+
+        starts = ends[:n] - width[:n]
+        byte = starts >> 3
+        word = buf[byte] | buf[byte + 1] << 8 | buf[byte + 2] << 16
+        chunk = word >> (starts & 7).astype(np.uint32)
+        chunk &= (1 << width[:n].astype(np.uint32)) - 1
+
+        special = np.flatnonzero((chunk == clear) | (chunk == eoi))
+        if len(special):
+            j = special[0]
+            codes.append(chunk[:j])
+            index.append(np.arange(k, k + j, dtype=np.int32))
+            if chunk[j] == eoi:
+                break
+            bit, k = int(ends[j]), 0
+            continue
+
+        codes.append(chunk)
+        index.append(np.arange(k, k + n, dtype=np.int32))
+        if n < _CHUNK:
+            break
+        bit, k = int(ends[-1]), k + n
+
+    if not codes:
+        return np.zeros(0, np.int32), np.zeros(0, np.int32)
+    return np.concatenate(codes).astype(np.int32), np.concatenate(index)
+
+
+def _decode_vector(data, minsize, out):
+    '''decode a gif lzw stream into `out`, with array operations
+
+    the same table as :func:`_decode_loop`, built for all codes at
+    once. the k-th code since a clear defines the string of the
+    (k - 1)-th plus one byte, so a code refers to the index of its
+    prefix string, which is earlier in the output. the lengths of
+    the strings are the depths in that forest and every byte of the
+    output is a literal or a copy of an earlier byte. both are
+    resolved by pointer jumping, in a logarithmic number of passes.
+
+    see :func:`lzw_decode` for the parameters.
+    '''
+
+    clear = 1 << minsize
+    codes, index = _codes(data, minsize)
+    n = len(codes)
+    if n == 0:
+        return 0
+
+    literal = codes < clear
+    prefix = codes - (clear + 2)
+    invalid = ~literal & ((prefix < 0) | (prefix >= index))
+    if invalid.any():
+        code = codes[np.argmax(invalid)]
+        raise LZWError(f'code {code} is not in the table')
+    # literals are roots
+    here = np.arange(n, dtype=np.int32)
+    parent = np.where(literal, here, here - index + prefix)
+
+    depth = (~literal).astype(np.int32)
+    up = parent
+    while True:
+        depth += depth[up]
+        upper = up[up]
+        if np.array_equal(upper, up):
+            break
+        up = upper
+    length = depth + 1
+
+    # the string of a code is a copy of its prefix and the byte after
+    pos = np.cumsum(length, dtype=np.int64) - length
+    total = int(pos[-1]) + int(length[-1])
+    shift = np.where(literal, 0, pos[parent] - pos)
+    source = np.arange(total) + np.repeat(shift, length)
+    while True:
+        upper = source[source]
+        if np.array_equal(upper, source):
+            break
+        source = upper
+
+    values = np.zeros(total, dtype=np.uint8)
+    values[pos[literal]] = codes[literal]
+    size = min(total, len(out))
+    memoryview(out).cast('B')[:size] = values[source[:size]]
+    return size
+
 
-            if maxx == 1 << maxsize:
-                yield _code(cc, size)  # reinitialize table
-                size = minsize
-                tab = init()
-
-            pref.clear()
-            pref.append(char)
-
-        if pref:
-            yield _code(tab[bytes(pref)], size)
-        yield _code(eoi, size)
-
-    bits = BitStream()
-    for c in codes():
-        print(c)
-        bits.append(c)
-        while len(bits) >= bits.pos + 8:
-            yield bits.read('bytes:1')
-
-def lzw_decode(it, minsize, maxsize):
-    def codes(it):
-        size = minsize
-        bits = BitStream()
-        for byte in it:
-            bits.append(byte)
-            while len(bits) > bits.pos + size:
-                binn = bits.read(f'bits:{size}').bin[::-1]
-                print(binn)
-                size = yield int(binn, 2)
-
-    init = lambda: {i: chr(i).encode() for i in range(1 << minsize)}
-    cc, eoi = 1 << minsize, 1 << minsize + 1
-    tab = init()
-    size = minsize
-    maxx = 1 << minsize + 2
-
-    it = codes(it)
-    code = old = next(it)
-    yield tab[old]
-
-    while code != eoi:
-        if code == cc:
-            tab = init()
-            code = it.send(size)
+def lzw_decode(data, minsize, out):
+    '''decode a gif lzw stream into `out`
+
+    decoding stops at the end of information code, at the end of
+    `data` or when `out` is full, whichever comes first. what
+    remains of `out` is left untouched. codes grow up to 12 bits
+    and the table is reset on clear codes.
+
+    .. code-block:: python
+
+        indices = bytearray(width * height)
+        lzw_decode(data, image.lzw.minimum_code_size, indices)
+
+    streams are decoded with array operations (see
+    :func:`_decode_vector`) unless they are short or compress so well
+    that decoding code by code is faster.
+
+    :param data: the concatenated sub-blocks of an ``Image``
+    :param minsize: the minimum code size, at most 11
+    :param out: a writable buffer, ``width * height`` bytes
+    :returns: the number of bytes decoded
+    :raises LZWError: on a code that is not in the table yet
+    '''
+
+    if not 1 <= minsize <= 11:
+        raise LZWError(f'invalid minimum code size {minsize}')
+    # per byte of `data` decoding code by code costs about 13 times
+    # more than decoding with arrays per byte of `out`, which also
+    # has a fixed cost
+    if 13 * len(data) < len(out) + 2700:
+        return _decode_loop(data, minsize, out)
+    return _decode_vector(data, minsize, out)
+
+
+# the dense trie of the encoder: the code of the string of code `c`
+# followed by byte `b` is at ``c << 8 | b``, 0 when there is none
+_EMPTY = array('H', [0]) * (4096 << 8)
+
+
+def _encode_bytes(data, minsize):
+    # greedy lzw, byte by byte
+    clear = 1 << minsize
+    trie = array('H', _EMPTY)
+    codes = []
+    emit = codes.append
+    # the first string is the clear code: it extends to nothing, is
+    # emitted first and the entry it adds is never looked up
+    code, avail = clear, clear + 1
+
+    for byte in data:
+        key = code << 8 | byte
+        nxt = trie[key]
+        if nxt:
+            code = nxt
             continue
-        if code == 1 << minsize - 1:
-            size += 1
 
-        if code in tab: tab[maxx] = tab[old] + chr(tab[code][0]).encode()
-        else: tab[code] = tab[maxx-1] + chr(tab[maxx-1][0]).encode()
+        emit(code)
+        trie[key] = avail
+        avail += 1
+        if avail == 4096:
+            emit(clear)
+            trie[:] = _EMPTY
+            avail = clear + 2
+        code = byte
+
+    return codes, code
+
+
+def _encode_runs(values, lengths, minsize):
+    # greedy lzw, run by run. the strings of a single byte value
+    # repeated are kept in order in `runs`: the longest match from
+    # the start of a run is taken at once
+    clear = 1 << minsize
+    trie = array('H', _EMPTY)
+    runs = [[byte] for byte in range(clear)]
+    codes = []
+    emit = codes.append
+    # see `_encode_bytes`
+    code, avail = clear, clear + 1
+
+    for byte, length in zip(values, lengths):
+        # extend the current string with the run
+        key = code << 8 | byte
+        nxt = trie[key]
+        if nxt:
+            if length == 1:
+                code = nxt
+                continue
+            while nxt:
+                code = nxt
+                length -= 1
+                if not length:
+                    break
+                key = code << 8 | byte
+                nxt = trie[key]
+            if not length:
+                continue
+
+        emit(code)
+        trie[key] = avail
+        avail += 1
+        if avail == 4096:
+            emit(clear)
+            trie[:] = _EMPTY
+            runs = [[byte] for byte in range(clear)]
+            avail = clear + 2
+
+        # what is left of the run starts a string
+        run = runs[byte]
+        while length > len(run):
+            length -= len(run)
+            code = run[-1]
+            emit(code)
+            trie[code << 8 | byte] = avail
+            run.append(avail)
+            avail += 1
+            if avail == 4096:
+                emit(clear)
+                trie[:] = _EMPTY
+                runs = [[byte] for byte in range(clear)]
+                run = runs[byte]
+                avail = clear + 2
+        code = run[length - 1]
+
+    return codes, code
+
+
+def _pack(codes, minsize):
+    # the bytes of a sequence of codes, least significant bit first.
+    # the width of a code only depends on its index since the last
+    # clear code, see `_widths`
+    clear = 1 << minsize
+    codes = np.asarray(codes, dtype=np.uint32)
+    n = len(codes)
+
+    # every code after a clear restarts the index
+    restart = np.flatnonzero(codes == clear) + 1
+    last = np.zeros(n, dtype=np.int64)
+    last[restart[restart < n]] = restart[restart < n]
+    index = np.arange(n) - np.maximum.accumulate(last)
+    widths = _widths(minsize)
+    width = widths[np.minimum(index, len(widths) - 1)]
+
+    ends = np.cumsum(width, dtype=np.int64)
+    starts = ends - width
+    byte = starts >> 3
+    value = codes << (starts & 7).astype(np.uint32)
+
+    # codes do not overlap: summing their bits is or-ing them
+    size = (int(ends[-1]) + 7) // 8
+    out = np.zeros(size + 2, dtype=np.int64)
+    for shift in (0, 8, 16):
+        out += np.bincount(byte + shift // 8,
+                           weights=value >> shift & 0xFF,
+                           minlength=size + 2).astype(np.int64)
+    return out[:size].astype(np.uint8)
+
+
+def _frame(data):
+    # cut into sub-blocks: length prefixed chunks of at most 255
+    # bytes and an empty one
+    full, rest = divmod(len(data), 255)
+    out = np.empty(len(data) + full + (rest > 0) + 1, dtype=np.uint8)
+    blocks = out[:256 * full].reshape(full, 256)
+    blocks[:, 0] = 255
+    blocks[:, 1:] = data[:255 * full].reshape(full, 255)
+    if rest:
+        out[256 * full] = rest
+        out[256 * full + 1:-1] = data[255 * full:]
+    out[-1] = 0
+    return out
+
+
+def lzw_encode(data, minsize, subblocks=True):
+    '''encode color indices as a gif lzw stream
+
+    the greedy encoding every gif encoder does, with a clear code
+    when the table is full. the table is a dense trie of codes, keyed
+    on the code of a string and the byte that extends it. runs of a
+    single index are matched at once rather than byte by byte, which
+    makes images with flat areas much faster to encode than noisy
+    ones. the codes are then packed and cut into sub-blocks with
+    array operations.
+
+    .. code-block:: python
+
+        image.lzw.minimum_code_size = 8
+        chain = lzw_encode(indices, 8)
+
+    :param data: the color indices, a bytes-like object such as
+        ``bytes`` or a numpy array of ``uint8``
+    :param minsize: the minimum code size: every index must be below
+        ``1 << minsize``
+    :param subblocks: whether to cut the stream into the sub-blocks
+        of an ``Image``, terminator included
+    :returns: the encoded bytes
+    :raises LZWError: on an index or a minimum code size out of range
+    '''
+
+    if not 2 <= minsize <= 8:
+        raise LZWError(f'invalid minimum code size {minsize}')
+    clear = 1 << minsize
+
+    pixels = np.frombuffer(data, dtype=np.uint8)
+    if len(pixels) == 0:
+        codes = [clear]
+    else:
+        if int(pixels.max()) >= clear:
+            raise LZWError(f'index {pixels.max()} is too large for '
+                           f'a minimum code size of {minsize}')
 
-        yield tab[code]
-        old = code
-        code = it.send(size)
+        # matching runs at once only pays when they are long enough,
+        # about 4 bytes on average
+        starts = np.flatnonzero(pixels[1:] != pixels[:-1]) + 1
+        if 4 * len(starts) > len(pixels):
+            codes, code = _encode_bytes(memoryview(pixels), minsize)
+        else:
+            starts = np.concatenate(([0], starts))
+            lengths = np.diff(starts, append=len(pixels))
+            codes, code = _encode_runs(
+                pixels[starts].tolist(), lengths.tolist(), minsize)
+        codes.append(code)
+    codes.append(clear + 1)
 
-inp = iter(bytes([0, 1, 2, 1, 2, 1, 2] * 4))
-inr = lzw_encode(inp, 4, 16)
-out = lzw_decode(inr, 4, 16)
-print(list(out))
+    stream = _pack(codes, minsize)
+    if subblocks:
+        stream = _frame(stream)
+    return stream.tobytes()
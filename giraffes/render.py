@@ -0,0 +1,236 @@
+from __future__ import annotations
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from giraffes.gif import Image, ExtensionBlock, GraphicsControlExtension
+
+
+# disposal methods of the graphics control extension
+NONE, KEEP, BACKGROUND, PREVIOUS = range(4)
+
+# (first row, step) of the 4 passes of interlaced images
+PASSES = ((0, 8), (4, 8), (2, 4), (1, 2))
+
+
+CacheInfo = namedtuple('CacheInfo', [
+    'hits',      # frames returned from the cache
+    'misses',    # frames that had to be replayed
+    'replayed',  # images decoded and drawn for the misses
+    'frames',    # composited frames in the cache
+    'keyframes',  # canvases in the cache
+    'nbytes',    # memory of the arrays in the cache
+    'maxbytes',
+])
+
+
+def deinterlace(indices):
+    '''the rows of an interlaced image in display order
+
+    :param indices: a ``(height, width)`` array of the rows in the
+        order they are stored
+    '''
+
+    out = np.empty_like(indices)
+    pos = 0
+    for first, step in PASSES:
+        rows = out[first::step]
+        rows[...] = indices[pos:pos + len(rows)]
+        pos += len(rows)
+    return out
+
+
+def palette(table, transparent=None):
+    '''a color table as a ``(256, 4)`` RGBA lookup table
+
+    indices past the end of the table are transparent black.
+
+    :param table: a ctypes array of ``ColorTableEntry``, or None
+    :param transparent: an index made transparent
+    '''
+
+    out = np.zeros((256, 4), np.uint8)
+    if table is not None:
+        rgb = np.frombuffer(bytes(table), np.uint8).reshape(-1, 3)[:256]
+        out[:len(rgb), :3] = rgb
+        out[:len(rgb), 3] = 255
+    if transparent is not None:
+        out[transparent] = 0
+    return out
+
+
+class Renderer:
+    '''the frames of a gif as they are displayed, in RGBA
+
+    every ``Image`` is drawn on a canvas of the logical screen with
+    the palette, transparency and disposal of its graphics control
+    extension. frames come out as read only ``(height, width, 4)``
+    arrays of ``uint8``.
+
+    .. code-block:: python
+
+        frames = Renderer(gif)
+        thumbnail = frames[10][::4, ::4]
+        for frame in frames:
+            ...
+
+    drawing frame `n` needs the canvas left by frame ``n - 1``. the
+    composited frames and, every `keyframes` frames, the canvases
+    they are drawn on are kept in an LRU cache of at most `maxbytes`:
+    random access replays from the nearest of them instead of the
+    first frame. see :meth:`cache_info`.
+
+    the background is transparent: the background color of the
+    logical screen is ignored, as browsers do.
+
+    :param gif: a parsed ``GIF``
+    :param maxbytes: the size of the cache, 0 to disable it
+    :param keyframes: canvases are cached every `keyframes` frames
+    '''
+
+    def __init__(self, gif, maxbytes=64 << 20, keyframes=16):
+        self.width = gif.LSD.width
+        self.height = gif.LSD.height
+        self.maxbytes = maxbytes
+        self.keyframes = keyframes
+
+        # every image with the extension that comes before it
+        self.images, self.controls = [], []
+        control = None
+        for block in (b.block for b in gif.blocks):
+            if isinstance(block, ExtensionBlock):
+                block = block.block
+            if isinstance(block, GraphicsControlExtension):
+                control = block
+            elif isinstance(block, Image):
+                self.images.append(block)
+                self.controls.append(control)
+                control = None
+
+        self._gct = gif.GCT if gif.LSD.GCTF else None
+        self._cache = OrderedDict()
+        self._nbytes = 0
+        self._hits = self._misses = self._replayed = 0
+
+    def __len__(self):
+        return len(self.images)
+
+    def __iter__(self):
+        for n in range(len(self)):
+            yield self[n]
+
+    def __getitem__(self, n):
+        if n < 0:
+            n += len(self)
+        if not 0 <= n < len(self):
+            raise IndexError(f'frame {n} of a gif of {len(self)} frames')
+
+        frame = self._get(('frame', n))
+        if frame is not None:
+            self._hits += 1
+            return frame
+        self._misses += 1
+
+        start, canvas = self._start(n)
+        for i in range(start, n + 1):
+            if i > start and i % self.keyframes == 0:
+                self._put(('canvas', i), canvas.copy())
+            saved = self._draw(i, canvas)
+            if i < n:
+                self._dispose(i, canvas, saved)
+        frame = canvas
+        frame.flags.writeable = False
+        self._put(('frame', n), frame)
+        return frame
+
+    def cache_info(self):
+        '''the statistics of the cache, as a ``CacheInfo``'''
+        kinds = [kind for kind, _ in self._cache]
+        return CacheInfo(
+            self._hits, self._misses, self._replayed,
+            kinds.count('frame'), kinds.count('canvas'),
+            self._nbytes, self.maxbytes,
+        )
+
+    def cache_clear(self):
+        '''empty the cache and reset its statistics'''
+        self._cache.clear()
+        self._nbytes = 0
+        self._hits = self._misses = self._replayed = 0
+
+    def _start(self, n):
+        # the nearest frame before `n` and the canvas it is drawn on
+        for i in range(n, 0, -1):
+            canvas = self._get(('canvas', i))
+            if canvas is not None:
+                return i, canvas.copy()
+
+            # a previous frame, unless it has to be undone
+            frame = self._get(('frame', i - 1))
+            if frame is not None and self._disposal(i - 1) != PREVIOUS:
+                canvas = frame.copy()
+                self._dispose(i - 1, canvas, None)
+                return i, canvas
+        return 0, np.zeros((self.height, self.width, 4), np.uint8)
+
+    def _disposal(self, i):
+        control = self.controls[i]
+        return control.disposal if control is not None else NONE
+
+    def _area(self, i, canvas):
+        # the part of the canvas under image `i`
+        header = self.images[i].header
+        return canvas[header.top:header.top + header.height,
+                      header.left:header.left + header.width]
+
+    def _draw(self, i, canvas):
+        # draw image `i`, returns what it covered if it is to be undone
+        image, control = self.images[i], self.controls[i]
+        header = image.header
+        self._replayed += 1
+
+        table = image.LCT if header.LCTF else self._gct
+        transparent = None
+        if control is not None and control.transparency:
+            transparent = control.TCI
+        colors = palette(table, transparent)
+
+        indices = np.frombuffer(image.decode(), np.uint8)
+        indices = indices.reshape(header.height, header.width)
+        if header.interlace:
+            indices = deinterlace(indices)
+
+        area = self._area(i, canvas)
+        saved = area.copy() if self._disposal(i) == PREVIOUS else None
+
+        # images may not fit the logical screen
+        rgba = colors[indices[:area.shape[0], :area.shape[1]]]
+        if transparent is None:
+            area[...] = rgba
+        else:
+            np.copyto(area, rgba, where=rgba[..., 3:] != 0)
+        return saved
+
+    def _dispose(self, i, canvas, saved):
+        disposal = self._disposal(i)
+        if disposal == BACKGROUND:
+            self._area(i, canvas)[...] = 0
+        elif disposal == PREVIOUS:
+            self._area(i, canvas)[...] = saved
+
+    def _get(self, key):
+        value = self._cache.get(key)
+        if value is not None:
+            self._cache.move_to_end(key)
+        return value
+
+    def _put(self, key, value):
+        if value.nbytes > self.maxbytes:
+            return
+        if key in self._cache:
+            self._nbytes -= self._cache.pop(key).nbytes
+        self._cache[key] = value
+        self._nbytes += value.nbytes
+        while self._nbytes > self.maxbytes:
+            _, old = self._cache.popitem(last=False)
+            self._nbytes -= old.nbytes
@@ -7,4 +7,5 @@ setup(
     author='Loan Tricot',
     author_email='ltricot@gmail.com',
     packages=['formats'],
+    python_requires='>=3.9',
 )
@@ -1,8 +1,88 @@
 from __future__ import annotations
 import unittest
+import tempfile
+import gc
+import io
+import os
 
-from formats.structclasses import structclass, ubyte
-from formats.blockclasses import blockclass, readfrom
+from formats.structclasses import (structclass, ubyte, ushort, array_type,
+                                   bitfield)
+from formats.blockclasses import (blockclass, readfrom, writeinto, sizeof,
+                                  packed_size, tobytes, dump, repeat,
+                                  array_of, dispatch, optional,
+                                  parse_file, open_mapped, subblocks)
+from formats.exceptions import BlockClassError, StructClassError
+from formats import blockclasses
+
+
+@blockclass
+class chunk:
+    size: ubyte
+    data: ubyte * size
+
+
+@blockclass
+class chained:
+    kind: ubyte
+    data: subblocks
+    tail: ubyte
+
+
+@blockclass
+class chunks:
+    head: chained
+    items: repeat(chunk, until=lambda c: c.size == 0)
+
+
+@blockclass
+class table:
+    count: ubyte
+    values: array_of(ushort, count)
+    rows: repeat(chunk, count=count)
+
+
+@blockclass
+class note:
+    text: subblocks
+
+
+@blockclass
+class record:
+    kind: ubyte
+    body: dispatch(on=kind, branches={1: note, 2: chunk})
+    tail: ubyte
+
+
+@blockclass(skip=(note,))
+class quiet:
+    records: repeat(record, count=2)
+
+
+@structclass
+class pair:
+    value: ubyte
+    other: ubyte
+
+
+@blockclass
+class nested:
+    count: ubyte
+    pairs: pair * count
+
+
+@structclass(backend='struct')
+class fast:
+    count: bitfield[ubyte:4]
+    flags: bitfield[ubyte:4]
+    size:  ubyte
+
+
+@blockclass
+class framed:
+    head:  fast
+    data:  ubyte * head.size
+    items: fast * head.count
+    tail:  fast
 
 
 class TestBlockclasses(unittest.TestCase):
@@ -19,6 +99,63 @@ class TestBlockclasses(unittest.TestCase):
         self.assertEqual(b.size, size)
         self.assertEqual(b.data, data)
 
+    def test_super(self):
+        class base:
+            def describe(self):
+                return 'base'
+
+            @classmethod
+            def make(cls):
+                return cls()
+
+        @blockclass
+        class block(base):
+            size: ubyte
+
+            def describe(self):
+                return f'block of {super().describe()}'
+
+            @classmethod
+            def make(cls):
+                b = super().make()
+                b.size = 1
+                return b
+
+            @property
+            def own(self):
+                return isinstance(self, __class__)
+
+        b = block.make()
+        self.assertEqual(b.size, 1)
+        self.assertEqual(b.describe(), 'block of base')
+        self.assertTrue(b.own)
+        self.assertEqual(readfrom(b, b'\x02'), 1)
+
+    def test_generated(self):
+        b = chunk(2, (ubyte * 2)(1, 2))
+        self.assertFalse(hasattr(b, '__dict__'))
+        with self.assertRaises(AttributeError):
+            b.other = 1
+        with self.assertRaises(AttributeError):
+            chunk().size
+
+        # ctypes fields compare by value
+        parsed = chunk()
+        readfrom(parsed, b'\x02\x01\x02')
+        self.assertEqual(parsed, b)
+        self.assertNotEqual(parsed, chunk(2, (ubyte * 2)(1, 3)))
+        self.assertNotEqual(parsed, chunk(2))
+        self.assertEqual(repr(chunk(size=2)), 'chunk(size=2)')
+
+        c = chained()
+        readfrom(c, b'\x01\x02ab\x00\x03')
+        self.assertEqual(c, chained(1, subblocks(b'ab'), 3))
+        self.assertNotEqual(c, chained(1, subblocks(b'ac'), 3))
+
+        # values from an earlier parse do not shadow lazy fields
+        readfrom(parsed, b'\x01\x07', lazy=True)
+        self.assertEqual(list(parsed.data), [7])
+
     def test_readfrom(self):
         @blockclass
         class block:
@@ -30,6 +167,175 @@ class TestBlockclasses(unittest.TestCase):
         self.assertEqual(b.size, 5)
         self.assertEqual(list(b.data), [1, 2, 3, 4, 5])
 
+    def test_readfrom_interpreted(self):
+        @blockclass
+        class block:
+            size: ubyte
+            data: ubyte * size
+            tail: ubyte
+
+        buf = b'\x03\x01\x02\x03\x04'
+        compiled = block()
+        self.assertEqual(readfrom(compiled, buf), 5)
+
+        blockclasses.interpreted = True
+        try:
+            interpreted = block()
+            self.assertEqual(readfrom(interpreted, buf), 5)
+        finally:
+            blockclasses.interpreted = False
+
+        for b in (compiled, interpreted):
+            self.assertEqual(b.size, 3)
+            self.assertEqual(list(b.data), [1, 2, 3])
+            self.assertEqual(b.tail, 4)
+
+    def test_readfrom_array_cache(self):
+        @blockclass
+        class block:
+            size: ubyte
+            data: ubyte * size
+
+        readfrom(block(), b'\x03\x01\x02\x03')
+        hits = array_type.cache_info().hits
+
+        b = block()
+        readfrom(b, b'\x03\x04\x05\x06')
+        self.assertIs(type(b.data), array_type(ubyte, 3))
+        self.assertGreater(array_type.cache_info().hits, hits)
+
+    def test_readfrom_static_run(self):
+        @blockclass
+        class block:
+            fst: ushort
+            snd: ubyte * 2
+            size: ubyte
+            data: ubyte * size
+
+        b = block()
+        self.assertEqual(readfrom(b, b'\x01\x01\x02\x03\x01\x04'), 6)
+        self.assertEqual(b.fst, 0x0101)
+        self.assertEqual(list(b.snd), [2, 3])
+        self.assertEqual(b.size, 1)
+        self.assertEqual(list(b.data), [4])
+
+    def test_sizeof(self):
+        @blockclass
+        class static:
+            fst: ushort
+            snd: ubyte * 2
+
+        @blockclass
+        class dynamic:
+            size: ubyte
+            data: ubyte * size
+
+        self.assertEqual(sizeof(static), 4)
+        self.assertEqual(sizeof(static()), 4)
+        with self.assertRaises(BlockClassError):
+            sizeof(dynamic)
+
+    def test_readfrom_view(self):
+        @blockclass
+        class block:
+            size: ubyte
+            data: ubyte * size
+
+        buf = bytearray(b'\x03\x01\x02\x03')
+        b = block()
+        readfrom(b, buf, view=True)
+        buf[1] = 9
+        self.assertEqual(list(b.data), [9, 2, 3])
+
+        b = block()
+        readfrom(b, bytes(buf), view=True)
+        self.assertEqual(list(b.data), [9, 2, 3])
+        with self.assertRaises(StructClassError):
+            b.data[0] = 1
+
+        # nested members of read-only fields are read-only copies
+        data = b'\x02\x01\x02\x03\x04'
+        b = nested()
+        readfrom(b, data, view=True)
+        self.assertIsInstance(b.pairs[0], pair)
+        with self.assertRaises(StructClassError):
+            b.pairs[1].value = 7
+        memoryview(b.pairs).cast('B')[2] = 7
+        self.assertEqual(data, b'\x02\x01\x02\x03\x04')
+
+    def test_readfrom_view_optional(self):
+        @blockclass
+        class block:
+            flag: ubyte
+            item: optional(on=flag, atype=pair)
+
+        # absent values are empty structures, read-only ones too
+        b = block()
+        self.assertEqual(readfrom(b, b'\x00', view=True), 1)
+        self.assertEqual(readfrom(b, b'\x01\x05\x06', view=True), 3)
+        self.assertEqual(b.item.other, 6)
+
+    def test_parse_file(self):
+        @blockclass
+        class block:
+            size: ubyte
+            data: ubyte * size
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'block')
+            with open(path, 'wb') as file:
+                file.write(b'\xff\x03\x01\x02\x03')
+
+            # the mapping lives as long as the views
+            b = parse_file(path, block, offset=1)
+            gc.collect()
+            self.assertEqual(b.size, 3)
+            self.assertEqual(list(b.data), [1, 2, 3])
+
+            # writes reach a private copy, not the file
+            b.data[0] = 9
+            self.assertEqual(list(b.data), [9, 2, 3])
+            with open(path, 'rb') as file:
+                self.assertEqual(file.read(), b'\xff\x03\x01\x02\x03')
+
+            other = os.path.join(tmp, 'nested')
+            with open(other, 'wb') as file:
+                file.write(b'\x01\x05\x06')
+            n = parse_file(other, nested)
+            n.pairs[0].value = 9
+            self.assertEqual(n.pairs[0].value, 9)
+            with open(other, 'rb') as file:
+                self.assertEqual(file.read(), b'\x01\x05\x06')
+            del n
+
+            b = parse_file(path, block, offset=1, view=False)
+            self.assertEqual(list(b.data), [1, 2, 3])
+
+            # parse errors are not hidden by the mapping's closing
+            truncated = os.path.join(tmp, 'truncated')
+            with open(truncated, 'wb') as file:
+                file.write(b'\x01\x03abc\x02d')
+            with self.assertRaises(ValueError):
+                parse_file(truncated, chained, view=False)
+            with self.assertRaises(ValueError):
+                with open_mapped(truncated, chained):
+                    pass
+
+            with open_mapped(path, block, offset=1) as b:
+                self.assertEqual(list(b.data), [1, 2, 3])
+            self.assertEqual(list(b.data), [1, 2, 3])
+            del b
+            gc.collect()
+
+    def test_readfrom_short(self):
+        @blockclass
+        class block:
+            size: ubyte
+            data: ubyte * size
+
+        with self.assertRaises(ValueError):
+            readfrom(block(), b'\x05\x01\x02')
+
     def test_writeinto(self):
         @blockclass
         class block:
@@ -43,3 +349,230 @@ class TestBlockclasses(unittest.TestCase):
         buf = bytearray(6)
         writeinto(b, buf)
         self.assertEqual(bytes(buf), b'\x05\x01\x02\x03\x04\x05')
+
+    def test_writeinto_roundtrip(self):
+        @blockclass
+        class block:
+            size: ubyte
+            data: ubyte * size
+            tail: ubyte * 2
+
+        buf = b'\x03\x01\x02\x03\x04\x05'
+        b = block()
+        readfrom(b, buf)
+
+        out = bytearray(6)
+        self.assertEqual(writeinto(b, out), 6)
+        self.assertEqual(bytes(out), buf)
+
+        out = memoryview(bytearray(6))
+        writeinto(b, out)
+        self.assertEqual(bytes(out), buf)
+
+        blockclasses.interpreted = True
+        try:
+            out = bytearray(6)
+            writeinto(b, out)
+            self.assertEqual(bytes(out), buf)
+        finally:
+            blockclasses.interpreted = False
+
+    def test_readfrom_lazy(self):
+        @blockclass
+        class block:
+            kind: ubyte
+            head: chunk
+            data: ubyte * kind
+            tail: ushort
+
+        buf = b'\x02\x01\x07\x08\x09\x05\x00'
+        eager, lazy = block(), block()
+        self.assertEqual(readfrom(lazy, buf, lazy=True), readfrom(eager, buf))
+        self.assertEqual(set(lazy._blocklazy_), {'data', 'tail'})
+        self.assertEqual(set(lazy.head._blocklazy_), {'data'})
+
+        self.assertEqual(lazy.tail, 5)
+        self.assertEqual(list(lazy.data), [8, 9])
+        self.assertEqual(list(lazy.head.data), [7])
+        self.assertEqual(lazy._blocklazy_, {})
+
+        lazy = block()
+        readfrom(lazy, buf, lazy=True)
+        out = bytearray(len(buf))
+        writeinto(lazy, out)
+        self.assertEqual(bytes(out), buf)
+
+    def test_subblocks(self):
+        payload = bytes(range(256)) * 3
+        chain = subblocks(payload)
+        self.assertEqual(len(chain), 4)
+        self.assertEqual(chain.size, len(payload))
+        self.assertEqual([len(v) for v in chain.views()], [255] * 3 + [3])
+        self.assertEqual(chain.gather(), payload)
+        self.assertEqual(len(subblocks()), 0)
+
+        buf = bytearray(b'\x07' + bytes(chain._buf) + b'\x09')
+        b = chained()
+        self.assertEqual(readfrom(b, buf), len(buf))
+        self.assertEqual((b.kind, b.tail), (7, 9))
+        self.assertEqual(b.data.gather(), payload)
+        self.assertEqual(bytes(b.data.views()[1]), payload[255:510])
+        # only the chain is copied
+        self.assertEqual(len(b.data._buf), len(buf) - 2)
+
+        out = bytearray(len(buf))
+        writeinto(b, out)
+        self.assertEqual(out, buf)
+
+        # copies unless viewing
+        buf[2] = 0xff
+        self.assertEqual(b.data.gather(), payload)
+        v = chained()
+        readfrom(v, buf, view=True)
+        self.assertEqual(v.data.gather()[0], 0xff)
+        self.assertEqual(bytes(v.data.views()[3]), payload[765:])
+
+        with self.assertRaises(ValueError):
+            readfrom(chained(), buf[:300])
+
+    def test_packed_size(self):
+        self.assertEqual(packed_size(chunk(5, (ubyte * 5)())), 6)
+        self.assertEqual(packed_size(ubyte()), 1)
+
+        buf = (b'\x01' + bytes(subblocks(bytes(600))._buf) + b'\x02'
+               + b'\x02ab\x01c\x00')
+        b = chunks()
+        readfrom(b, buf)
+        self.assertEqual(packed_size(b), len(buf))
+        self.assertEqual(tobytes(b), buf)
+
+        lazy = chunks()
+        readfrom(lazy, buf, lazy=True)
+        self.assertEqual(packed_size(lazy), len(buf))
+
+        # the size of the array, not the one its field says
+        self.assertEqual(tobytes(chunk(5, (ubyte * 2)(1, 2))),
+                         b'\x05\x01\x02')
+
+    def test_dump(self):
+        payload = bytes(range(256)) * 8
+        buf = (b'\x01' + bytes(subblocks(payload)._buf) + b'\x02'
+               + b'\x02ab\x01c\x00')
+        b = chunks()
+        readfrom(b, buf)
+
+        for bufsize in (1, 7, 1 << 16):
+            out = io.BytesIO()
+            self.assertEqual(dump(b, out, bufsize=bufsize), len(buf))
+            self.assertEqual(out.getvalue(), buf)
+
+        with tempfile.TemporaryFile(buffering=0) as file:
+            self.assertEqual(dump(b, file, bufsize=64), len(buf))
+            file.seek(0)
+            self.assertEqual(file.read(), buf)
+
+    def test_array_of(self):
+        buf = bytearray(b'\x02\x01\x00\x02\x00\x01a\x02bc')
+        self.assertIs(array_of(ushort, 2), ushort * 2)
+        self.assertIs(array_of(chunk, 2), repeat(chunk, count=2))
+        with self.assertRaises(BlockClassError):
+            repeat(chunk)
+
+        t = table()
+        self.assertEqual(readfrom(t, buf), len(buf))
+        self.assertEqual(list(t.values), [1, 2])
+        self.assertEqual([bytes(row.data) for row in t.rows], [b'a', b'bc'])
+        self.assertEqual(packed_size(t), len(buf))
+        self.assertEqual(tobytes(t), buf)
+
+        # the values are a single view
+        v = table()
+        readfrom(v, buf, view=True)
+        buf[1] = 9
+        self.assertEqual(v.values[0], 9)
+
+        lazy = table()
+        readfrom(lazy, buf, lazy=True)
+        self.assertEqual(set(lazy._blocklazy_), {'values', 'rows'})
+        self.assertEqual(bytes(tobytes(lazy)), buf)
+
+        blockclasses.interpreted = True
+        try:
+            interpreted = table()
+            self.assertEqual(readfrom(interpreted, buf), len(buf))
+        finally:
+            blockclasses.interpreted = False
+        self.assertEqual(interpreted, v)
+
+        empty = table()
+        self.assertEqual(readfrom(empty, b'\x00'), 1)
+        self.assertEqual((len(empty.values), len(empty.rows)), (0, 0))
+        with self.assertRaises(ValueError):
+            readfrom(table(), buf[:-1])
+
+    def test_struct_backend(self):
+        buf = bytearray(b'\x12\x03abc\x01\x02\x03\x04\x00\x09')
+        f = framed()
+        self.assertEqual(readfrom(f, buf), len(buf))
+        self.assertEqual((f.head.count, f.head.flags, f.head.size), (2, 1, 3))
+        self.assertEqual(bytes(f.data), b'abc')
+        self.assertEqual(f.items[1], fast(3, 0, 4))
+        self.assertEqual(f.tail, fast(size=9))
+        self.assertEqual(sizeof(fast), 2)
+        self.assertEqual(sizeof(f.tail), 2)
+
+        self.assertEqual(packed_size(f), len(buf))
+        self.assertEqual(tobytes(f), buf)
+        out = bytearray(len(buf) + 1)
+        self.assertEqual(writeinto(f, out, 1), len(buf))
+        self.assertEqual(out[1:], buf)
+        file = io.BytesIO()
+        self.assertEqual(dump(f, file), len(buf))
+        self.assertEqual(file.getvalue(), buf)
+
+        for kwargs in [{'view': True}, {'lazy': True},
+                       {'skip': {fast}, 'lazy': True}]:
+            other = framed()
+            self.assertEqual(readfrom(other, buf, **kwargs), len(buf))
+            self.assertEqual(other, f)
+
+        blockclasses.interpreted = True
+        try:
+            interpreted = framed()
+            self.assertEqual(readfrom(interpreted, buf), len(buf))
+            self.assertEqual(tobytes(interpreted), buf)
+        finally:
+            blockclasses.interpreted = False
+        self.assertEqual(interpreted, f)
+
+        with self.assertRaises(ValueError):
+            readfrom(framed(), buf[:-1])
+
+    def test_skip(self):
+        text = bytes(subblocks(b'hello' * 100)._buf)
+        buf = b'\x01' + text + b'\x07' + b'\x02\x02ab\x08'
+
+        r = record()
+        self.assertEqual(readfrom(r, buf, skip={note}), len(text) + 2)
+        self.assertEqual(set(r._blocklazy_), {'body'})
+        self.assertEqual(r.tail, 7)
+        self.assertEqual(r.body.text.gather(), b'hello' * 100)
+
+        # skipped by the class, at any depth
+        q = quiet()
+        readfrom(q, buf)
+        self.assertEqual(set(q.records[0]._blocklazy_), {'body'})
+        self.assertFalse(hasattr(q.records[1], '_blocklazy_'))
+        self.assertEqual(bytes(q.records[1].body.data), b'ab')
+        self.assertEqual(tobytes(q), buf)
+        self.assertEqual(q.records[0], r)
+
+        # static fields, lazily or not
+        for lazy in (False, True):
+            c = chained()
+            readfrom(c, b'\x01' + text + b'\x02', lazy=lazy,
+                     skip=[subblocks])
+            self.assertIn('data', c._blocklazy_)
+            self.assertEqual(c.data.size, 500)
+        with self.assertRaises(ValueError):
+            readfrom(chained(), b'\x01\x05ab', skip={subblocks})
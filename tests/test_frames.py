@@ -0,0 +1,45 @@
+import unittest
+import random
+import struct
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from formats.blockclasses import readfrom
+from giraffes.frames import decode_frames
+from giraffes.gif import GIF
+from giraffes.lzw import lzw_encode
+
+
+def animation(sizes):
+    # a gif with a frame of random indices for every (width, height)
+    rand = random.Random(0)
+    out = bytearray(b'GIF89a' + struct.pack('<HHBBB', 64, 64, 0xF1, 0, 0))
+    out += bytes(12)
+    frames = []
+    for width, height in sizes:
+        data = bytes(rand.randrange(4) for _ in range(width * height))
+        out += b'\x2c' + struct.pack('<HHHHB', 0, 0, width, height, 0)
+        out += b'\x02' + lzw_encode(data, 2)
+        frames.append(data)
+    out += b'\x3b'
+
+    gif = GIF()
+    readfrom(gif, out)
+    return gif, frames
+
+
+class TestDecodeFrames(unittest.TestCase):
+    def test_serial(self):
+        gif, frames = animation([(8, 8), (64, 64), (1, 3)])
+        self.assertEqual(decode_frames(gif, workers=1), frames)
+
+    def test_pool(self):
+        gif, frames = animation([(8, 8), (64, 64), (1, 3), (30, 20)] * 3)
+        with ProcessPoolExecutor(2) as executor:
+            self.assertEqual(decode_frames(gif, executor), frames)
+        with ThreadPoolExecutor(2) as executor:
+            self.assertEqual(decode_frames(gif, executor), frames)
+        self.assertEqual(decode_frames(gif, workers=2), frames)
+
+    def test_empty(self):
+        gif, _ = animation([])
+        self.assertEqual(decode_frames(gif, workers=2), [])
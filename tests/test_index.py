@@ -0,0 +1,95 @@
+import unittest
+import tempfile
+import os
+
+from formats.exceptions import BlockClassError, StructClassError
+from giraffes.gif import GIF
+from giraffes.index import BlockIndex, index, seek_frame, sidecar
+
+
+def image(pixel):
+    return (
+        b'\x2c' + b'\x00\x00\x00\x00\x01\x00\x01\x00\x00'  # descriptor
+        + b'\x02' + b'\x02' + bytes([pixel, 0x01]) + b'\x00'
+    )
+
+
+GCE = b'\x21\xf9\x04\x00\x00\x00\x00\x00'
+DATA = (
+    b'GIF89a' + b'\x01\x00\x01\x00\x80\x00\x00'  # 2 colors table
+    + b'\x00\x00\x00\xff\xff\xff'
+    + GCE + image(0x10) + GCE + image(0x20) + image(0x30)
+    + b'\x3b'
+)
+
+
+class TestIndex(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'test.gif')
+        with open(self.path, 'wb') as file:
+            file.write(DATA)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_build(self):
+        idx = BlockIndex.build(self.path)
+        self.assertEqual(len(idx), 6)
+        self.assertEqual(idx.nframes, 3)
+        self.assertEqual(
+            [(e.introducer, e.label) for e in idx.entries],
+            [(0x21, 0xf9), (0x2c, 0), (0x21, 0xf9), (0x2c, 0), (0x2c, 0),
+             (0x3b, 0)],
+        )
+        self.assertEqual(idx[0].offset, 19)
+        self.assertEqual(idx[-1].offset, len(DATA) - 1)
+        self.assertEqual(sum(e.length for e in idx.entries), len(DATA) - 19)
+        with self.assertRaises(IndexError):
+            idx.frame(3)
+
+    def test_sidecar(self):
+        built = index(self.path)
+        self.assertTrue(os.path.exists(sidecar(self.path)))
+
+        loaded = BlockIndex.load(sidecar(self.path))
+        with self.assertRaises(StructClassError):
+            loaded.entries[0].length = 0
+        self.assertTrue(loaded.valid(self.path))
+        self.assertEqual(bytes(loaded.entries), bytes(built.entries))
+        self.assertEqual(list(loaded.frames), [1, 3, 4])
+
+        os.utime(self.path, ns=(0, 0))
+        self.assertFalse(loaded.valid(self.path))
+        # not hashed unless asked to
+        self.assertEqual(bytes(loaded.header.digest), bytes(16))
+        self.assertFalse(loaded.valid(self.path, hash=True))
+
+        hashed = index(self.path, hash=True)
+        self.assertTrue(hashed.valid(self.path, hash=True))
+        os.utime(self.path, ns=(1, 1))
+        self.assertTrue(hashed.valid(self.path, hash=True))
+        with open(self.path, 'r+b') as file:
+            file.write(b'GIF87a')
+        self.assertFalse(hashed.valid(self.path, hash=True))
+        with open(self.path, 'wb') as file:
+            file.write(DATA)
+
+        with open(sidecar(self.path), 'r+b') as file:
+            file.truncate(20)
+        with self.assertRaises(BlockClassError):
+            BlockIndex.load(sidecar(self.path))
+        self.assertEqual(list(index(self.path).frames), [1, 3, 4])
+
+    def test_truncated(self):
+        for size in (len(DATA) - 1, len(DATA) - 3, 30):
+            with open(self.path, 'wb') as file:
+                file.write(DATA[:size])
+            with self.assertRaises(BlockClassError):
+                BlockIndex.build(self.path)
+
+    def test_seek_frame(self):
+        for n, pixel in enumerate([0x10, 0x20, 0x30]):
+            image = GIF.seek_frame(self.path, n)
+            self.assertEqual(image.data.gather()[0], pixel)
+        self.assertEqual(seek_frame(self.path, -1).data.gather()[0], 0x30)
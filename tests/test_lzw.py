@@ -0,0 +1,150 @@
+import unittest
+import random
+
+import numpy as np
+
+from formats.blockclasses import readfrom
+from giraffes.gif import Image
+from giraffes.lzw import (lzw_decode, _decode_loop, _decode_vector,
+                          lzw_encode, _encode_bytes, _encode_runs, LZWError)
+
+
+# the sample image of the gif specification, 10x10 with 4 colors
+SAMPLE = bytes.fromhex('8c2d99872a1cdc33a00275ec95faa8de608c04914c01')
+PIXELS = bytes(
+    [1] * 5 + [2] * 5
+    + [1] * 5 + [2] * 5
+    + [1] * 5 + [2] * 5
+    + [1] * 3 + [0] * 4 + [2] * 3
+    + [1] * 3 + [0] * 4 + [2] * 3
+    + [2] * 3 + [0] * 4 + [1] * 3
+    + [2] * 3 + [0] * 4 + [1] * 3
+    + [2] * 5 + [1] * 5
+    + [2] * 5 + [1] * 5
+    + [2] * 5 + [1] * 5
+)
+
+
+def encode(data, minsize, clear_when_full):
+    # a plain dictionary encoder
+    clear = 1 << minsize
+    codes = [(clear, minsize + 1)]
+    table = {bytes([i]): i for i in range(clear)}
+    size, avail = minsize + 1, clear + 2
+
+    prefix = b''
+    for byte in data:
+        if prefix + bytes([byte]) in table:
+            prefix += bytes([byte])
+            continue
+        codes.append((table[prefix], size))
+        if avail < 4096:
+            table[prefix + bytes([byte])] = avail
+            avail += 1
+            if avail > 1 << size and size < 12:
+                size += 1
+        elif clear_when_full:
+            codes.append((clear, size))
+            table = {bytes([i]): i for i in range(clear)}
+            size, avail = minsize + 1, clear + 2
+        prefix = bytes([byte])
+    codes.append((table[prefix], size))
+    codes.append((clear + 1, size))
+
+    bits = nbits = 0
+    for code, size in codes:
+        bits |= code << nbits
+        nbits += size
+    return bits.to_bytes((nbits + 7) // 8, 'little')
+
+
+class TestLZW(unittest.TestCase):
+    decoders = [lzw_decode, _decode_loop, _decode_vector]
+
+    def test_sample(self):
+        for decode in self.decoders:
+            out = bytearray(100)
+            self.assertEqual(decode(SAMPLE, 2, out), 100)
+            self.assertEqual(bytes(out), PIXELS)
+
+            out = memoryview(bytearray(100))
+            decode(SAMPLE, 2, out)
+            self.assertEqual(bytes(out), PIXELS)
+
+    def test_table(self):
+        # 12 bit codes, with and without clear codes when the table
+        # is full
+        rand = random.Random(0)
+        data = bytes(rand.choice([0, 0, 0, rand.randrange(64)])
+                     for _ in range(30000))
+        for clear in [True, False]:
+            stream = encode(data, 6, clear)
+            for decode in self.decoders:
+                out = bytearray(len(data))
+                self.assertEqual(decode(stream, 6, out), len(data))
+                self.assertEqual(out, data)
+
+    def test_truncated(self):
+        for decode in self.decoders:
+            # output full
+            out = bytearray(42)
+            self.assertEqual(decode(SAMPLE, 2, out), 42)
+            self.assertEqual(bytes(out), PIXELS[:42])
+
+            # data short
+            out = bytearray(b'\xff' * 100)
+            size = decode(SAMPLE[:10], 2, out)
+            self.assertEqual(out[:size], PIXELS[:size])
+            self.assertEqual(out[size:], b'\xff' * (100 - size))
+
+    def test_invalid(self):
+        for decode in self.decoders:
+            with self.assertRaises(LZWError):
+                decode(bytes([0b11111100, 0xff]), 2, bytearray(10))
+        with self.assertRaises(LZWError):
+            lzw_decode(SAMPLE, 12, bytearray(100))
+
+    def test_encode(self):
+        rand = random.Random(0)
+        noise = bytes(rand.randrange(16) for _ in range(20000))
+        runs = b''.join(bytes([rand.randrange(16)]) * rand.randint(1, 40)
+                        for _ in range(2000))
+        for data in [noise, runs, bytes(100000), PIXELS, b'\x03', b'']:
+            stream = lzw_encode(data, 4, subblocks=False)
+            for decode in self.decoders:
+                out = bytearray(len(data))
+                self.assertEqual(decode(stream, 4, out), len(data))
+                self.assertEqual(out, data)
+
+        # same output whatever the path
+        self.assertEqual(
+            _encode_bytes(runs, 4),
+            _encode_runs(*zip(*((b, 1) for b in runs)), 4),
+        )
+
+    def test_encode_subblocks(self):
+        rand = random.Random(0)
+        data = bytes(rand.randrange(256) for _ in range(5000))
+        chain = lzw_encode(data, 8)
+        stream = lzw_encode(data, 8, subblocks=False)
+
+        chunks, i = [], 0
+        while chain[i]:
+            chunks.append(chain[i + 1:i + 1 + chain[i]])
+            i += 1 + chain[i]
+        self.assertEqual(i, len(chain) - 1)
+        self.assertEqual({len(c) for c in chunks[:-1]}, {255})
+        self.assertEqual(b''.join(chunks), stream)
+
+        image = Image()
+        header = b'\x00\x00\x00\x00\x64\x00\x32\x00\x00\x08'
+        readfrom(image, header + chain)
+        self.assertEqual(image.decode(), data)
+
+    def test_encode_input(self):
+        data = np.arange(64, dtype=np.uint8).reshape(8, 8) % 4
+        self.assertEqual(lzw_encode(data, 2), lzw_encode(data.tobytes(), 2))
+        with self.assertRaises(LZWError):
+            lzw_encode(data, 1)
+        with self.assertRaises(LZWError):
+            lzw_encode(b'\x04', 2)
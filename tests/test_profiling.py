@@ -0,0 +1,74 @@
+from __future__ import annotations
+import unittest
+
+from formats import blockclasses, structclasses
+from formats.structclasses import structclass, ubyte
+from formats.blockclasses import blockclass, readfrom, writeinto
+from formats.exceptions import FormatsError
+from formats.profiling import Profile
+
+
+@structclass
+class head:
+    kind: ubyte
+    size: ubyte
+
+
+@blockclass
+class block:
+    head: head
+    data: ubyte * head.size
+    tail: ubyte
+
+
+NAME = f'{__name__}.block'
+
+
+class TestProfiling(unittest.TestCase):
+    def test_stats(self):
+        buf = b'\x01\x03abc\x02'
+        with Profile() as prof:
+            for _ in range(3):
+                b = block()
+                self.assertEqual(readfrom(b, buf), 6)
+            out = bytearray(6)
+            writeinto(b, out)
+            structclasses.readfrom(head(), buf)
+        self.assertEqual(bytes(out), buf)
+
+        stats = prof.stats()
+        read = stats['read'][NAME]
+        self.assertEqual((read['calls'], read['bytes']), (3, 18))
+        self.assertEqual(set(read['fields']), {'head', 'data', 'tail'})
+        self.assertEqual(read['fields']['data']['bytes'], 9)
+        self.assertGreater(read['fields']['data']['eval'], 0)
+        self.assertEqual(read['fields']['tail']['eval'], 0)
+        self.assertAlmostEqual(read['eval'] + read['copy'], read['time'])
+
+        write = stats['write'][NAME]
+        self.assertEqual((write['calls'], write['bytes']), (1, 6))
+        self.assertEqual(stats['read'][f'{__name__}.head']['calls'], 1)
+
+        report = prof.report()
+        self.assertIn(NAME, report)
+        self.assertIn('  .data', report)
+
+        prof.reset()
+        self.assertEqual(prof.stats(), {'read': {}, 'write': {}})
+
+    def test_restored(self):
+        saved = (blockclasses._parser, blockclasses._writer,
+                 structclasses.readfrom, structclasses.writeinto)
+        with Profile(memory=True) as prof:
+            with self.assertRaises(FormatsError):
+                with Profile():
+                    pass
+            readfrom(block(), b'\x01\x01a\x02', lazy=True)
+        self.assertEqual((blockclasses._parser, blockclasses._writer,
+                          structclasses.readfrom, structclasses.writeinto),
+                         saved)
+        self.assertIn(NAME, prof.stats()['read'])
+
+        # nothing recorded once the profile is over
+        readfrom(block(), b'\x01\x01a\x02')
+        self.assertEqual(prof.stats()['read'][NAME]['calls'], 1)
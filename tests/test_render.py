@@ -0,0 +1,137 @@
+import unittest
+import struct
+
+import numpy as np
+
+from formats.blockclasses import readfrom
+from giraffes.gif import GIF
+from giraffes.lzw import lzw_encode
+from giraffes.render import Renderer, deinterlace, palette
+
+
+# black, red, green, blue
+GCT = bytes([0, 0, 0, 255, 0, 0, 0, 255, 0, 0, 0, 255])
+
+
+def frame(indices, left=0, top=0, disposal=0, transparent=None,
+          interlace=False, lct=None):
+    height, width = indices.shape
+    out = bytearray()
+    flags = disposal << 2 | (transparent is not None)
+    out += b'\x21\xf9\x04' + bytes([flags]) + b'\x00\x00'
+    out += bytes([transparent or 0, 0])
+
+    if interlace:
+        indices = np.concatenate([indices[0::8], indices[4::8],
+                                  indices[2::4], indices[1::2]])
+    packed = interlace << 6
+    if lct is not None:
+        packed |= 0x80 | (len(lct) // 3).bit_length() - 2
+    out += b'\x2c' + struct.pack('<HHHHB', left, top, width, height, packed)
+    out += lct or b''
+    out += b'\x02' + lzw_encode(indices.astype(np.uint8).tobytes(), 2)
+    return bytes(out)
+
+
+def gif(*frames, width=4, height=4):
+    out = b'GIF89a' + struct.pack('<HHBBB', width, height, 0x81, 0, 0)
+    g = GIF()
+    readfrom(g, out + GCT + b''.join(frames) + b'\x3b')
+    return g
+
+
+def rgba(*colors):
+    return np.array(colors, np.uint8)
+
+
+class TestRender(unittest.TestCase):
+    def test_palette(self):
+        colors = palette(GCT, transparent=2)
+        self.assertEqual(colors.shape, (256, 4))
+        self.assertEqual(list(colors[1]), [255, 0, 0, 255])
+        self.assertEqual(list(colors[2]), [0, 0, 0, 0])
+        self.assertEqual(list(colors[4]), [0, 0, 0, 0])
+
+    def test_deinterlace(self):
+        for height in (1, 2, 5, 8, 13, 30):
+            rows = np.arange(height).reshape(height, 1)
+            stored = np.concatenate([rows[0::8], rows[4::8],
+                                     rows[2::4], rows[1::2]])
+            self.assertEqual(list(deinterlace(stored).ravel()),
+                             list(range(height)))
+
+    def test_compose(self):
+        red, blue = np.ones((4, 4)), np.full((2, 2), 3)
+        lct = bytes([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12])
+        frames = Renderer(gif(
+            frame(red),
+            # transparent where 0
+            frame(np.array([[0, 2], [2, 0]]), 1, 1, transparent=0),
+            frame(blue, 2, 2, disposal=2),
+            frame(np.zeros((1, 1)), 0, 0, disposal=3, lct=lct),
+            frame(np.zeros((1, 1)), 3, 0),
+        ))
+        self.assertEqual(len(frames), 5)
+
+        self.assertEqual(frames[0].shape, (4, 4, 4))
+        self.assertTrue((frames[0] == rgba(255, 0, 0, 255)).all())
+        self.assertEqual(list(frames[1][1, 1]), [255, 0, 0, 255])
+        self.assertEqual(list(frames[1][1, 2]), [0, 255, 0, 255])
+        self.assertEqual(list(frames[2][3, 3]), [0, 0, 255, 255])
+
+        # the blue square was cleared, the lct pixel is undone
+        self.assertEqual(list(frames[3][0, 0]), [1, 2, 3, 255])
+        self.assertEqual(list(frames[3][3, 3]), [0, 0, 0, 0])
+        self.assertEqual(list(frames[4][0, 0]), [255, 0, 0, 255])
+        self.assertEqual(list(frames[4][3, 3]), [0, 0, 0, 0])
+        self.assertEqual(list(frames[4][0, 3]), [0, 0, 0, 255])
+
+        with self.assertRaises(ValueError):
+            frames[0][0, 0] = 0
+        with self.assertRaises(IndexError):
+            frames[5]
+        self.assertTrue((frames[-1] == frames[4]).all())
+
+    def test_interlace(self):
+        indices = np.arange(30 * 3).reshape(30, 3) % 4
+        frames = Renderer(gif(frame(indices, interlace=True),
+                              width=3, height=30))
+        colors = palette(GCT)
+        self.assertTrue((frames[0] == colors[indices]).all())
+
+    def test_clipped(self):
+        frames = Renderer(gif(frame(np.ones((3, 3)), 2, 3)))
+        self.assertEqual(frames[0].shape, (4, 4, 4))
+        self.assertEqual(frames[0][..., 3].sum(), 2 * 255)
+
+    def test_cache(self):
+        rand = np.random.default_rng(0)
+        blocks = [
+            frame(rand.integers(0, 4, (2, 2)), *rand.integers(0, 3, 2),
+                  disposal=int(rand.integers(0, 4)),
+                  transparent=int(rand.integers(0, 4)))
+            for _ in range(40)
+        ]
+        reference = list(Renderer(gif(*blocks), maxbytes=0))
+        self.assertEqual(len(reference), 40)
+
+        frames = Renderer(gif(*blocks), keyframes=8)
+        for n in [39, 10, 38, 17, 39, 0, 25]:
+            self.assertTrue((frames[n] == reference[n]).all())
+
+        info = frames.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 6))
+        self.assertEqual(info.frames, 6)
+        self.assertEqual(info.keyframes, 4)  # 8, 16, 24 and 32
+        self.assertEqual(info.nbytes, 10 * 4 * 4 * 4)
+        # 40 for the first, then from the nearest canvas or frame
+        self.assertLess(info.replayed, 40 + 3 + 8 + 2 + 1 + 2)
+
+        # room for 3 arrays
+        frames = Renderer(gif(*blocks), maxbytes=3 * 64, keyframes=4)
+        for n in [39, 10, 38, 17, 39, 0, 25]:
+            self.assertTrue((frames[n] == reference[n]).all())
+            self.assertLessEqual(frames.cache_info().nbytes, 3 * 64)
+
+        frames.cache_clear()
+        self.assertEqual(frames.cache_info()[:6], (0, 0, 0, 0, 0, 0))
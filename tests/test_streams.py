@@ -0,0 +1,105 @@
+from __future__ import annotations
+import unittest
+import asyncio
+import io
+
+from formats.structclasses import ubyte
+from formats.blockclasses import blockclass, repeat, writeinto
+from formats.streams import StreamParser, iterparse, areadfrom, aiterparse
+from formats.exceptions import BlockClassError
+
+
+@blockclass
+class chunk:
+    size: ubyte
+    data: ubyte * size
+
+
+@blockclass
+class stream:
+    magic: ubyte * 2
+    chunks: repeat(chunk, until=lambda c: c.size == 0)
+
+
+DATA = b'ok' + b''.join(bytes([n] + [n] * n) for n in range(1, 40)) + b'\0'
+
+
+class TestStreamParser(unittest.TestCase):
+    def check(self, parser, elements):
+        self.assertEqual(len(elements), 40)
+        self.assertEqual([c.size for c in elements], list(range(1, 40)) + [0])
+        self.assertEqual(list(elements[3].data), [4] * 4)
+
+        buf = bytearray(len(DATA))
+        writeinto(parser.result, buf)
+        self.assertEqual(bytes(buf), DATA)
+
+    def test_chunks(self):
+        for size in (1, 3, 16, len(DATA)):
+            parser = StreamParser(stream)
+            elements = []
+            for i in range(0, len(DATA), size):
+                elements += parser.feed(DATA[i:i+size])
+            elements += parser.close()
+            self.check(parser, elements)
+
+    def test_maxbuffer(self):
+        # elements are parsed field by field
+        parser = StreamParser(stream, maxbuffer=2)
+        elements = []
+        for i in range(0, len(DATA), 5):
+            elements += parser.feed(DATA[i:i+5])
+        elements += parser.close()
+        self.check(parser, elements)
+
+    def test_keep(self):
+        parser = StreamParser(stream, keep=False)
+        elements = parser.feed(DATA) + parser.close()
+        self.assertEqual(len(elements), 40)
+        self.assertEqual(len(parser.result.chunks), 0)
+
+    def test_truncated(self):
+        parser = StreamParser(stream)
+        parser.feed(DATA[:-5])
+        with self.assertRaises(BlockClassError):
+            parser.close()
+
+    def test_iterparse(self):
+        elements = list(iterparse(io.BytesIO(DATA), stream, chunksize=7))
+        self.assertEqual([c.size for c in elements], list(range(1, 40)) + [0])
+
+
+class TestAsyncio(unittest.TestCase):
+    def reader(self, data):
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return reader
+
+    def test_areadfrom(self):
+        async def main():
+            s = stream()
+            size = await areadfrom(s, self.reader(DATA), chunksize=8)
+            return s, size
+
+        s, size = asyncio.run(main())
+        self.assertEqual(size, len(DATA))
+        self.assertEqual(bytes(s.magic), b'ok')
+        self.assertEqual(list(s.chunks[38].data), [39] * 39)
+
+    def test_aiterparse(self):
+        async def main():
+            elements = aiterparse(self.reader(DATA), stream)
+            return [c.size async for c in elements], elements
+
+        sizes, elements = asyncio.run(main())
+        self.assertEqual(sizes, list(range(1, 40)) + [0])
+        self.assertEqual(elements.size, len(DATA))
+        self.assertEqual(len(elements.result.chunks), 40)
+
+    def test_truncated(self):
+        async def main():
+            await areadfrom(stream(), self.reader(DATA[:-5]))
+
+        with self.assertRaises(BlockClassError):
+            asyncio.run(main())
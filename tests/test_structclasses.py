@@ -1,11 +1,19 @@
 from formats.structclasses import (structclass, union,
-    readfrom, writeinto, bitfield, anonymous, ubyte, ushort)
+    readfrom, writeinto, view, bitfield, anonymous, array_type, ubyte, ushort,
+    uint, byte, cint, char, dtype, view_array, readmany, iter_records, writemany, extract_bits)
+from formats.exceptions import StructClassError
 
 from functools import wraps
 from ctypes import sizeof
 import unittest
+import random
 import sys
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class TestStructclasses(unittest.TestCase):
     def setUp(self):
@@ -44,6 +52,71 @@ class TestStructclasses(unittest.TestCase):
         writeinto(s, buf)
         self.assertEqual(bytes(buf), b'\x00\x01\x02\x03\x04\x05\x06')
 
+    def test_view(self):
+        buf = bytearray(b'\xff\x00\x01\x02\x03\x04\x05\x06')
+        s = view(self.__struct, buf, offset=1)
+        self.assertEqual(s.signature, 1)
+
+        # both ways
+        buf[2] = 7
+        self.assertEqual(s.signature, 7)
+        s.data[0] = 8
+        self.assertEqual(buf[3], 8)
+
+        # the buffer is exported for as long as the view lives
+        with self.assertRaises(BufferError):
+            buf.append(0)
+        del s
+        buf.append(0)
+
+    def test_view_readonly(self):
+        s = view(self.__struct, b'\x00\x01\x02\x03\x04\x05\x06')
+        self.assertIsInstance(s, self.__struct)
+        self.assertEqual(s.signature, 1)
+        self.assertEqual(list(s.data), [2, 3, 4, 5, 6])
+
+        with self.assertRaises(StructClassError):
+            s.signature = 2
+
+        s = view(self.__struct, bytearray(7), readonly=True)
+        with self.assertRaises(StructClassError):
+            s.signature = 2
+
+        with self.assertRaises(ValueError):
+            view(self.__struct, b'\x00\x01')
+
+    def test_view_readonly_nested(self):
+        inner = self.__struct
+
+        @structclass
+        class outer:
+            head:  inner
+            items: inner * 2
+
+        # nested structures and arrays refuse assignments too
+        buf = bytearray(range(21))
+        o = view(outer, buf, readonly=True)
+        with self.assertRaises(StructClassError):
+            o.head.data[0] = 0
+        with self.assertRaises(StructClassError):
+            o.items[1].signature = 0
+        with self.assertRaises(StructClassError):
+            o.items[:][0].data[1] = 0
+        self.assertEqual(buf, bytearray(range(21)))
+
+        # ctypes cannot alias bytes: the view is a copy
+        data = bytes(range(21))
+        o = view(outer, data)
+        self.assertEqual(o.items[1].data[4], 20)
+        with self.assertRaises(StructClassError):
+            o.items[1].data[4] = 0
+        memoryview(o.items[1]).cast('B')[6] = 0
+        self.assertEqual(data, bytes(range(21)))
+
+        for s in iter_records(self.__struct, data):
+            with self.assertRaises(StructClassError):
+                s.data[0] = 0
+
 
 class TestUnion(unittest.TestCase):
     def setUp(self):
@@ -131,3 +204,383 @@ class TestExtensions(unittest.TestCase):
         readfrom(s, b'\x34')
         self.assertEqual(s.flag_1, 3)
         self.assertEqual(s.flag_2, 4)
+
+    def test_bitorder(self):
+        class struct:
+            a: bitfield[ubyte:3]
+            b: bitfield[ubyte:5]
+            c: bitfield[ushort:12]
+            d: ubyte
+
+        expected = {
+            ('<', 'lsb'): '11' '0300' '04',
+            ('<', 'msb'): '22' '3000' '04',
+            ('>', 'lsb'): '11' '0003' '04',
+            ('>', 'msb'): '22' '0030' '04',
+        }
+        for (order, bitorder), hexa in expected.items():
+            cls = structclass(struct, byteorder=order, bitorder=bitorder)
+            self.assertEqual([f[0] for f in cls._fields_], ['a|b', 'c', 'd'])
+            s = cls(1, 2, c=3, d=4)
+            self.assertEqual(bytes(s).hex(), hexa)
+            self.assertEqual((s.a, s.b, s.c, s.d), (1, 2, 3, 4))
+
+            s.b = 0xff  # masked
+            s.c = 0
+            self.assertEqual((s.a, s.b, s.c), (1, 31, 0))
+            readfrom(s, bytes.fromhex(hexa))
+            self.assertEqual((s.a, s.b, s.c), (1, 2, 3))
+
+            s = view(cls, bytes.fromhex(hexa))
+            self.assertEqual(s.c, 3)
+            with self.assertRaises(StructClassError):
+                s.c = 1
+
+        with self.assertRaises(StructClassError):
+            structclass(struct, bitorder='middle')
+
+    def test_readmany(self):
+        @structclass(byteorder='>')
+        class record:
+            key:   ushort
+            value: ubyte
+
+        buf = bytes(range(32))
+        records = readmany(record, buf, 4, offset=2)
+        self.assertEqual(len(records), 4)
+        self.assertEqual([r.key for r in records],
+                         [0x0203, 0x0506, 0x0809, 0x0b0c])
+        self.assertEqual(records[3].value, 13)
+        with self.assertRaises(ValueError):
+            readmany(record, buf, 11)
+
+        out = bytearray(14)
+        self.assertEqual(writemany(records, out, 2), 12)
+        self.assertEqual(bytes(out[2:]), buf[2:14])
+        self.assertEqual(writemany(list(records), out), 12)
+        self.assertEqual(bytes(out[:12]), buf[2:14])
+        with self.assertRaises(ValueError):
+            writemany(records, out, 3)
+
+        # lists are written a batch at a time
+        buf = bytes(range(256)) * 30
+        records = list(readmany(record, buf, len(buf) // 3))
+        out = bytearray(len(buf))
+        self.assertEqual(writemany(records, out), len(buf))
+        self.assertEqual(out, buf)
+        with self.assertRaises(ValueError):
+            writemany(records, out, 1)
+
+    def test_iter_records(self):
+        @structclass(byteorder='>')
+        class record:
+            key:   ushort
+            value: ubyte
+
+        buf = bytearray(range(10))
+        records = list(iter_records(record, buf, offset=1))
+        self.assertEqual([r.value for r in records], [3, 6, 9])
+        records[0].key = 0xffff
+        self.assertEqual(buf[1:3], b'\xff\xff')
+        self.assertEqual(len(list(iter_records(record, buf, count=2))), 2)
+
+        records = list(iter_records(record, bytes(buf)))
+        self.assertEqual(records[1].key, 0x0304)
+        with self.assertRaises(StructClassError):
+            records[1].key = 0
+
+    def test_array_type(self):
+        info = array_type.cache_info()
+        atype = array_type(ushort, 17)
+        self.assertIs(atype, ushort * 17)
+        self.assertIs(array_type(ushort, 17), atype)
+
+        after = array_type.cache_info()
+        self.assertEqual(after.misses, info.misses + 1)
+        self.assertEqual(after.hits, info.hits + 1)
+
+
+@structclass(byteorder='<')
+class pair:
+    a: ushort
+    b: uint * 2
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestNumpy(unittest.TestCase):
+    def test_dtype(self):
+        @structclass(byteorder='>')
+        class outer:
+            tag:   ubyte
+            inner: pair
+            value: ushort
+            flag:  bitfield[ubyte:1]
+            rest:  bitfield[ubyte:7]
+            grid:  ushort * 2 * 3
+            name:  char * 4
+            names: char * 2 * 3
+
+        dt = dtype(outer)
+        self.assertIs(dtype(outer), dt)
+        self.assertEqual(dt.itemsize, sizeof(outer))
+        self.assertEqual(dt.names,
+                         ('tag', 'inner', 'value', 'flag|rest', 'grid',
+                          'name', 'names'))
+        self.assertEqual(dt['inner']['b'], np.dtype(('<u4', (2,))))
+        self.assertEqual(dt['value'], np.dtype('>u2'))
+        self.assertEqual(dt['grid'], np.dtype(('>u2', (3, 2))))
+        self.assertEqual(dt['name'], np.dtype('S4'))
+        self.assertEqual(dt['names'], np.dtype(('S2', (3,))))
+        self.assertEqual(dt.fields['value'][1], 11)
+
+        o = outer(tag=1, value=0x0102, flag=1, rest=3, name=b'gif')
+        o.names[1].value = b'ab'
+        o.inner.b[1] = 7
+        o.grid[2][1] = 9
+        record = np.frombuffer(bytes(o), dt)[0]
+        self.assertEqual(record['value'], 0x0102)
+        self.assertEqual(record['inner']['b'][1], 7)
+        self.assertEqual(record['grid'][2, 1], 9)
+        self.assertEqual(record['flag|rest'], bytes(o)[13])
+        self.assertEqual(record['name'], o.name)
+        self.assertEqual(list(record['names']), [b'', b'ab', b''])
+
+    def test_dtype_layout(self):
+        @structclass(byteorder='<', pack=False)
+        class aligned:
+            a: ubyte
+            b: uint
+
+        @union
+        class either:
+            fst: ushort
+            snd: ubyte
+
+        @structclass(byteorder='<')
+        class struct:
+            which: ubyte
+            val:   anonymous(either)
+
+        self.assertEqual(dtype(aligned).fields['b'][1], 4)
+        self.assertEqual(dtype(aligned).itemsize, 8)
+        self.assertEqual(dtype(either).itemsize, 2)
+
+        dt = dtype(struct)
+        self.assertEqual(dt.names, ('which', 'val', 'fst', 'snd'))
+        self.assertEqual(dt.fields['fst'][1], 1)
+        record = np.frombuffer(b'\x01\x02\x03', dt)[0]
+        self.assertEqual(record['fst'], 0x0302)
+        self.assertEqual(record['val']['snd'], 2)
+
+    def test_extract_bits(self):
+        @structclass(byteorder='>')
+        class cbits:
+            flag:  bitfield[ubyte:1]
+            kind:  bitfield[ubyte:7]
+            value: ushort
+
+        @structclass(byteorder='>', bitorder='msb')
+        class masked:
+            flag:  bitfield[ubyte:1]
+            kind:  bitfield[ubyte:7]
+            value: bitfield[ushort:12]
+
+        buf = bytes(range(0, 256, 7))[:30]
+        for cls in (cbits, masked):
+            records = readmany(cls, buf, 10)
+            for name in ('flag', 'kind'):
+                self.assertEqual(list(extract_bits(cls, records, name)),
+                                 [getattr(r, name) for r in records])
+            self.assertEqual(list(extract_bits(cls, view_array(cls, buf),
+                                               'flag')),
+                             [b >> 7 for b in buf[::3]])
+        self.assertEqual(list(extract_bits(masked, buf, 'value')),
+                         [r.value for r in readmany(masked, buf, 10)])
+        with self.assertRaises(StructClassError):
+            extract_bits(cbits, buf, 'value')
+
+    def test_view_array(self):
+        @structclass(byteorder='>')
+        class record:
+            key:   ushort
+            value: ubyte * 2
+
+        buf = bytearray(b'..' + bytes(range(20)))
+        records = view_array(record, buf, offset=2)
+        self.assertEqual(len(records), 5)
+        self.assertEqual(list(records['key']), [0x0001, 0x0405, 0x0809,
+                                                0x0c0d, 0x1011])
+        records['value'][1] = 0xff
+        self.assertEqual(buf[2 + 4 + 2:2 + 8], b'\xff\xff')
+
+        self.assertEqual(len(view_array(record, buf, 2, offset=6)), 2)
+        self.assertFalse(view_array(record, bytes(buf)).flags.writeable)
+        with self.assertRaises(ValueError):
+            view_array(record, buf, 6)
+
+        table = (record * 3)(record(1), record(2), record(3))
+        self.assertEqual(view_array(record, table)['key'].sum(), 6)
+
+
+class TestStructBackend(unittest.TestCase):
+    def setUp(self):
+        class header:
+            magic: ubyte * 2
+            flag:  bitfield[ubyte:1]
+            kind:  bitfield[ubyte:7]
+            sizes: ushort * 2
+            count: uint
+
+        self.ctypes = structclass(header, byteorder='>')
+        self.struct = structclass(header, byteorder='>', backend='struct')
+
+    def test_layout(self):
+        self.assertEqual(self.struct._struct_.size, sizeof(self.ctypes))
+        self.assertEqual(self.struct._fields_,
+                         ('magic', 'flag', 'kind', 'sizes', 'count'))
+
+        h = self.struct(b'ok', 1, 5, (1, 2), count=7)
+        self.assertEqual(bytes(h), bytes(self.ctypes(tuple(b'ok'), 1, 5,
+                                                     (1, 2), 7)))
+        self.assertEqual(h, self.struct(b'ok', 1, 5, (1, 2), 7))
+        self.assertNotEqual(h, self.struct())
+        self.assertEqual(repr(self.struct(count=1)), (
+            "header(magic=b'\\x00\\x00', flag=0, kind=0, sizes=(0, 0), "
+            "count=1)"
+        ))
+        with self.assertRaises(AttributeError):
+            h.other = 1
+
+    def test_readfrom(self):
+        buf = bytes(range(1, 12))
+        c, s = self.ctypes(), self.struct()
+        self.assertEqual(readfrom(s, buf), readfrom(c, buf))
+        self.assertEqual(s.magic, bytes(c.magic))
+        self.assertEqual((s.flag, s.kind), (c.flag, c.kind))
+        self.assertEqual(s.sizes, tuple(c.sizes))
+        self.assertEqual(s.count, c.count)
+
+        s.kind = 0x7f
+        s.flag = 0
+        self.assertEqual(s.flag, 0)
+        out = bytearray(13)
+        self.assertEqual(writeinto(s, out, 2), 11)
+        self.assertEqual(out[2:], b'\x01\x02\x7f' + buf[3:])
+
+        with self.assertRaises(ValueError):
+            readfrom(s, buf[:10])
+        with self.assertRaises(ValueError):
+            writeinto(s, out, 3)
+
+    def test_many(self):
+        buf = bytes(range(33))
+        records = readmany(self.struct, buf, 3)
+        self.assertEqual([r.count for r in records],
+                         [c.count for c in readmany(self.ctypes, buf, 3)])
+        self.assertEqual(len(list(iter_records(self.struct, buf[:-1]))), 2)
+        with self.assertRaises(ValueError):
+            readmany(self.struct, buf, 4)
+
+        out = bytearray(33)
+        self.assertEqual(writemany(records, out), 33)
+        self.assertEqual(out, buf)
+
+    def test_bitorder(self):
+        class struct:
+            a: bitfield[ubyte:3]
+            b: bitfield[ushort:12]
+            c: bitfield[ushort:4]
+
+        for order in '<>':
+            for bitorder in ('lsb', 'msb'):
+                c = structclass(struct, byteorder=order, bitorder=bitorder)
+                s = structclass(struct, byteorder=order, bitorder=bitorder,
+                                backend='struct')
+                self.assertEqual(bytes(s(5, 100, 7)), bytes(c(5, 100, 7)))
+                record = s()
+                readfrom(record, bytes(c(5, 100, 7)))
+                self.assertEqual((record.a, record.b, record.c), (5, 100, 7))
+
+    def test_signed_bitfields(self):
+        class nibbles:
+            a: bitfield[byte:4]
+            b: bitfield[byte:4]
+
+        class flags:
+            a: bitfield[cint:3]
+            c: bitfield[cint:28]
+            b: bitfield[cint:1]
+
+        for cls, buf in [(nibbles, b'\xff'), (nibbles, b'\x78'),
+                         (flags, b'\xfd\xff\xff\xff'),
+                         (flags, b'\x05\x00\x00\x80')]:
+            for order in '<>':
+                c = structclass(cls, byteorder=order)()
+                s = structclass(cls, byteorder=order, backend='struct')()
+                readfrom(c, buf)
+                readfrom(s, buf)
+                names = list(cls.__annotations__)
+                self.assertEqual([getattr(s, name) for name in names],
+                                 [getattr(c, name) for name in names])
+                self.assertEqual(bytes(s), buf)
+
+        # the sign bit of the integer is an ordinary bit
+        record = structclass(flags, byteorder='<', backend='struct')
+        self.assertEqual(bytes(record(a=5, b=1, c=3)), b'\x1d\x00\x00\x80')
+        self.assertEqual(bytes(record(a=-1, b=-1)), b'\x07\x00\x00\x80')
+
+    def test_bitorder_signed(self):
+        class mixed:
+            a: bitfield[cint:5]
+            b: bitfield[uint:7]
+            c: bitfield[cint:20]
+            d: bitfield[byte:3]
+            e: bitfield[ubyte:5]
+
+        rng = random.Random(0)
+        names = list(mixed.__annotations__)
+        for order in '<>':
+            for bitorder in ('lsb', 'msb'):
+                c = structclass(mixed, byteorder=order, bitorder=bitorder)
+                s = structclass(mixed, byteorder=order, bitorder=bitorder,
+                                backend='struct')
+                for _ in range(50):
+                    buf = bytes(rng.randrange(256) for _ in range(5))
+                    cr, sr = c(), s()
+                    readfrom(cr, buf)
+                    readfrom(sr, buf)
+                    values = [getattr(cr, name) for name in names]
+                    self.assertEqual([getattr(sr, name) for name in names],
+                                     values)
+                    self.assertEqual(bytes(c(*values)), buf)
+                    self.assertEqual(bytes(s(*values)), buf)
+                self.assertEqual(c(a=-3).a, -3)
+                self.assertEqual(c(d=3).d, 3)
+
+    def test_empty(self):
+        class trailer:
+            pass
+
+        empty = structclass(trailer, backend='struct')
+        record = empty()
+        self.assertEqual(readfrom(record, b'\x3b'), 0)
+        self.assertEqual(writeinto(record, bytearray()), 0)
+        self.assertEqual(bytes(record), b'')
+        self.assertEqual(record, empty())
+        self.assertEqual(repr(record), 'trailer()')
+
+    def test_unsupported(self):
+        class nested:
+            head: pair
+
+        class mixed:
+            a: bitfield[ubyte:4]
+            b: bitfield[ushort:4]
+
+        for cls in (nested, mixed):
+            with self.assertRaises(StructClassError):
+                structclass(cls, backend='struct')
+        with self.assertRaises(StructClassError):
+            structclass(nested, pack=False, backend='struct')
+        with self.assertRaises(StructClassError):
+            structclass(nested, backend='cffi')